@@ -1,20 +1,26 @@
+import argparse
+import bisect
+import queue
 import random
-import pyvisa
-import serial
-from serial import *
+import threading
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 import qdarkstyle
 from QSwitchControl import SwitchControl
 import time
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+from matplotlib.figure import Figure
 import csv
 from datetime import datetime
 
+from discovery import DeviceDiscovery, DiscoveryCache, probe_serial
 from multimeter_HMC8012 import DigitalMultimeterHMC8012
-from powersupply_HMC804x import PowerSupplyHMC804x
+from powersupply_HMC804x import ARB_MAX_DWELL, ARB_MAX_POINTS, ARB_MIN_DWELL, PowerSupplyHMC804x
 from powersupply_lowNoise import PowerSupplyLowNoise
+from sweep import AdaptiveSweep, CsvRecorder, MultiChannelSweepEngine, Settling, SweepEngine
+from sweep_plan import LinearPlan, load_plan, save_plan
+from telemetry import RingBuffer, multimeter_sampler, power_supply_sampler
+from traffic import TrafficLog, capture
 
 available_power_supplies = {
     "HMC8043": PowerSupplyHMC804x,
@@ -79,6 +85,284 @@ class ComboBoxWithLast(QComboBox):
         self.lastSelected = text
 
 
+class DiscoveryThread(QThread):
+    deviceFound = pyqtSignal(str, str, float)
+    deviceLost = pyqtSignal(str)
+
+    def __init__(self, discovery, known_resources=(), known_serial_ports=(), parent=None):
+        super(DiscoveryThread, self).__init__(parent)
+        self.discovery = discovery
+        self.known_resources = tuple(known_resources)
+        self.known_serial_ports = tuple(known_serial_ports)
+
+    def run(self):
+        for port in self.known_serial_ports:
+            if not probe_serial(port):
+                self.deviceLost.emit(port)
+        self.discovery.run(self.emit_result, known_resources=self.known_resources)
+
+    def emit_result(self, result):
+        if result.model is not None:
+            self.deviceFound.emit(result.model, result.resource, result.elapsed)
+        elif result.resource in self.known_resources:
+            self.deviceLost.emit(result.resource)
+
+
+class TelemetryPoller(QThread):
+    # Samples an instrument every interval seconds (0: as fast as it answers) into a ring buffer and
+    # publishes the new samples at most every publish_interval seconds, so the GUI is not flooded
+    samplesReady = pyqtSignal(object, object)
+    samplingFailed = pyqtSignal(str)
+
+    def __init__(self, sample, width, interval=0.1, capacity=100000, publish_interval=0.1, parent=None):
+        super(TelemetryPoller, self).__init__(parent)
+        self.sample = sample
+        self.interval = interval
+        self.publish_interval = publish_interval
+        self.buffer = RingBuffer(capacity, width)
+
+    def run(self):
+        published = 0
+        last_publish = next_sample = time.monotonic()
+        while not self.isInterruptionRequested():
+            success, row = self.sample()
+            if not success:
+                self.samplingFailed.emit(row)
+                return
+            self.buffer.append(time.time(), row)
+            now = time.monotonic()
+            if now - last_publish >= self.publish_interval:
+                timestamps, values = self.buffer.since(published)
+                published = self.buffer.count
+                last_publish = now
+                self.samplesReady.emit(timestamps, values)
+            next_sample = max(next_sample + self.interval, now)
+            while not self.isInterruptionRequested():
+                remaining = next_sample - time.monotonic()
+                if remaining <= 0:
+                    break
+                time.sleep(min(remaining, 0.1))
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
+
+
+class ProtectionMonitor(QThread):
+    # Watches an HMC804x for OVP, OPP and fuse trips through its status registers. On INSTR resources
+    # (USB, VXI-11) the trips raise a service request, which is waited for without any bus traffic;
+    # raw sockets have no SRQ line, there only *STB? is polled every poll_interval seconds. The
+    # channel registers are read once the questionable bit of the status byte is set
+    protectionTripped = pyqtSignal(object)
+    monitoringFailed = pyqtSignal(str)
+
+    def __init__(self, power_supply, poll_interval=1.0, wait_interval=0.2, parent=None):
+        # wait_interval: longest wait for a service request, the time stop() may take
+        super(ProtectionMonitor, self).__init__(parent)
+        self.power_supply = power_supply
+        self.poll_interval = poll_interval
+        self.wait_interval = wait_interval
+
+    def run(self):
+        res = self.power_supply.enable_protection_events()
+        service_requests = res[0] is True and self.power_supply.enable_service_requests()
+        while res[0] is True and not self.isInterruptionRequested():
+            if service_requests and not self.power_supply.wait_for_service_request(self.wait_interval):
+                continue
+            res = self.power_supply.protection_events()
+            if res[0] is True and res.value:
+                self.protectionTripped.emit(res.value)
+            if not service_requests:
+                # Slept in wait_interval slices, so stop() does not wait for a whole poll interval
+                polled = time.monotonic()
+                while time.monotonic() - polled < self.poll_interval and not self.isInterruptionRequested():
+                    self.msleep(int(self.wait_interval * 1000))
+        if service_requests:
+            self.power_supply.disable_service_requests()
+        if res[0] is not True:
+            self.monitoringFailed.emit(res[2])
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
+
+
+class CharacteristicPlot(FigureCanvasQTAgg):
+    # Characteristic curves embedded in the measurement tab, one line per sweep and swept channel. The
+    # lines of the running sweep are animated: a new point only blits them over the cached background
+    # holding the finished sweeps, so its cost does not depend on how many sweeps are overlaid. The whole
+    # figure is redrawn only when a point falls outside the axis limits, which then double their range
+
+    def __init__(self, parent=None):
+        figure = Figure(tight_layout=True)
+        super(CharacteristicPlot, self).__init__(figure)
+        self.setParent(parent)
+        self.axes = figure.add_subplot()
+        self.axes.set_title('VACH', fontsize=18)
+        self.axes.set_ylabel('Current (mA)', fontsize=16)
+        self.axes.set_xlabel('Voltage (V)', fontsize=16)
+        self.background = None
+        # Series key (the swept channel) -> line, voltages and currents of the running sweep
+        self.series = {}
+        self.mpl_connect('draw_event', self.cache_background)
+
+    def cache_background(self, event):
+        self.background = self.copy_from_bbox(self.axes.bbox)
+        self.draw_series()
+
+    def draw_series(self):
+        for line, xs, ys in self.series.values():
+            self.axes.draw_artist(line)
+
+    def start_sweep(self, colors, x_from=None, x_to=None):
+        # colors: series key -> line color, the keys label the lines if there are several; without
+        # x_from and x_to the voltage axis grows with the points
+        self.finish_sweep()
+        for key, color in colors.items():
+            self.add_series(key, color, len(colors) > 1)
+        if x_from is not None:
+            low, high = self.axes.get_xlim() if len(self.axes.lines) > len(colors) else (x_from, x_to)
+            self.axes.set_xlim(min(low, x_from), max(high, x_to))
+        self.draw_idle()
+
+    def add_series(self, key, color, labeled=True):
+        # Adds a line to the running sweep, e.g. for each outer setpoint of a sweep plan
+        line, = self.axes.plot([], [], color=color, marker='o', animated=True, label=key if labeled else None)
+        self.series[key] = line, [], []
+        if labeled:
+            self.axes.legend()
+            self.draw_idle()
+
+    def set_quantities(self, x_label, y_label):
+        self.axes.set_xlabel(x_label, fontsize=16)
+        self.axes.set_ylabel(y_label, fontsize=16)
+
+    def add_point(self, x, y, key=None, ordered=True):
+        # Points of adaptive sweeps come out of order, they are inserted by their voltage; unordered
+        # series (sweep plans, e.g. hysteresis loops) are drawn in the order they are measured
+        line, xs, ys = self.series[key]
+        index = bisect.bisect(xs, x) if ordered else len(xs)
+        xs.insert(index, x)
+        ys.insert(index, y)
+        line.set_data(xs, ys)
+        low, high = self.axes.get_ylim()
+        x_low, x_high = self.axes.get_xlim()
+        if not x_low <= x <= x_high:
+            self.axes.set_xlim(min(x_low, x), max(x_high, x))
+        if self.background is None or not low <= y <= high or not x_low <= x <= x_high:
+            if not low <= y <= high:
+                self.rescale(y > high)
+            self.draw_idle()
+        else:
+            self.restore_region(self.background)
+            self.draw_series()
+            self.blit(self.axes.bbox)
+
+    def rescale(self, growing):
+        # Range of all lines with the span of the data added in the direction the curve grows
+        values = [value for line in self.axes.lines for value in line.get_ydata()]
+        low, high = min(values), max(values)
+        span = max(high - low, abs(high) * 0.1, 1e-6)
+        if growing:
+            self.axes.set_ylim(low - span * 0.05, high + span)
+        else:
+            self.axes.set_ylim(low - span, high + span * 0.05)
+
+    def finish_sweep(self):
+        # Bakes the lines of the finished sweep into the background
+        if self.series:
+            for line, xs, ys in self.series.values():
+                line.set_animated(False)
+            self.series = {}
+            self.draw_idle()
+
+    def clear(self):
+        # Removes the finished sweeps, the running one keeps being plotted
+        running = [line for line, xs, ys in self.series.values()]
+        for line in list(self.axes.lines):
+            if line not in running:
+                line.remove()
+        if self.axes.get_legend() is not None:
+            self.axes.get_legend().remove()
+        self.draw_idle()
+
+
+class SweepThread(QThread):
+    # Runs a sweep engine, its points are passed to the GUI thread by pointMeasured
+    pointMeasured = pyqtSignal(object)
+    sweepFailed = pyqtSignal(str)
+
+    def __init__(self, engine, parent=None):
+        super(SweepThread, self).__init__(parent)
+        self.engine = engine
+        engine.subscribe(self.pointMeasured.emit)
+
+    def run(self):
+        if not self.engine.run() and self.engine.error is not None:
+            self.sweepFailed.emit(self.engine.error)
+
+    def stop(self):
+        self.engine.cancel()
+        self.wait()
+
+
+class DeviceWorker(QThread):
+    # Runs the driver calls of one device in order on its own thread, so a slow instrument or a VISA
+    # timeout never blocks the GUI. The result of a call is passed to its done callback on the GUI
+    # thread; an exception raised by the call (e.g. opening a missing instrument) is passed instead.
+    # A call submitted with a key (a setpoint, e.g. ("voltage", "OUT1")) replaces the call of the
+    # same key still waiting in the queue, so only the latest value is sent once the bus is free
+    callFinished = pyqtSignal(object, object)
+
+    def __init__(self, parent=None):
+        super(DeviceWorker, self).__init__(parent)
+        self.calls = queue.Queue()
+        self.waiting = {}
+        self.waiting_lock = threading.Lock()
+        self.setpoints = 0
+        self.elided = 0
+        self.callFinished.connect(lambda done, result: done(result))
+
+    def submit(self, call, done=None, key=None):
+        entry = [call, done, key]
+        if key is not None:
+            with self.waiting_lock:
+                self.setpoints += 1
+                waiting = self.waiting.get(key)
+                if waiting is not None:
+                    waiting[0], waiting[1] = call, done
+                    self.elided += 1
+                    return
+                self.waiting[key] = entry
+        self.calls.put(entry)
+
+    def reset_counters(self):
+        with self.waiting_lock:
+            self.setpoints = 0
+            self.elided = 0
+
+    def run(self):
+        while True:
+            entry = self.calls.get()
+            with self.waiting_lock:
+                call, done, key = entry
+                if key is not None:
+                    del self.waiting[key]
+            if call is None:
+                return
+            try:
+                result = call()
+            except Exception as error:
+                result = error
+            if done is not None:
+                self.callFinished.emit(done, result)
+
+    def stop(self):
+        # Finishes the calls submitted so far
+        self.calls.put([None, None, None])
+        self.wait()
+
+
 class ButtonWithSwitch(QPushButton):
 
     def __init__(self, parent=None):
@@ -91,7 +375,7 @@ class Application(QWidget):
         super().__init__(parent=None)
         self.powersupply_output_area = None
         self.multimeter_output_area = None
-        self.measuring_loop = None
+        self.sweep_thread = None
         self.power_supply_tab = None
         self.multimeter_tab = None
         self.measurement_tab = None
@@ -101,13 +385,19 @@ class Application(QWidget):
         self.is_multimeter_connected = False
         self.characteristics_button = None
         self.is_measurement_opened = False
-        self.measured_multimeter = None
+        self.diagnostics_button = None
+        self.diagnostics_tab = None
+        self.diagnostics_table = None
+        self.diagnostics_summary = None
+        self.diagnostics_timer = None
+        self.measured_multimeters = {}
         self.measured_power_supply = None
-        self.file_writer = None
-        self.output_file = None
-        self.x_axes = []
-        self.y_axes = []
-        self.plot_colors = []
+        self.opening_measured_devices = set()
+        self.pollers = {}
+        self.workers = {}
+        self.protection_monitor = None
+        self.telemetry_labels = {}
+        self.characteristic_plot = None
 
         self.setStyleSheet(qdarkstyle.load_stylesheet_pyqt5() + "QLabel, QPushButton, QComboBox, QTabWidget, "
                                                                 "QDoubleSpinBox, QLineEdit, QSpinBox"
@@ -116,13 +406,17 @@ class Application(QWidget):
                                                                 "font-family: Arial;}" +
                            "QGroupBox{font-size: 10pt;}")
 
+        self.discovery_cache = DiscoveryCache()
         self.device_options = self.get_device_options()
+        self.probe_times = {}
+        self.discovery_thread = None
 
         self.powersupply_button = None
         self.powersupply_menu = None
         self.multimeter_button = None
         self.multimeter_menu = None
         self.connect_section = self.make_connect_tab()
+        self.start_device_discovery()
         self.tab_bar = self.make_tab_bar()
 
         self.setWindowTitle("Measure it")
@@ -134,6 +428,15 @@ class Application(QWidget):
 
         self.setLayout(layout)
 
+    def closeEvent(self, event):
+        for caller in list(self.pollers):
+            self.stop_polling(caller)
+        self.stop_protection_monitor()
+        self.stop_sweep()
+        for caller in list(self.workers):
+            self.stop_worker(caller)
+        super().closeEvent(event)
+
     def handle_error(self, error):
         errmsg = QMessageBox()
         errmsg.setStyleSheet(qdarkstyle.load_stylesheet_pyqt5() + "QMessageBox {font-size: 11pt;"
@@ -178,6 +481,13 @@ class Application(QWidget):
         self.characteristics_button.clicked.connect(self.add_measurement_tab)
         device_layout.addWidget(self.characteristics_button, 2, 2)
 
+        device_layout.addWidget(QLabel("Diagnostics"), 3, 0, 1, 2)
+
+        self.diagnostics_button = QPushButton()
+        self.diagnostics_button.setText("Open")
+        self.diagnostics_button.clicked.connect(self.add_diagnostics_tab)
+        device_layout.addWidget(self.diagnostics_button, 3, 2)
+
         device_box.setLayout(device_layout)
         return device_box
 
@@ -193,17 +503,15 @@ class Application(QWidget):
             if available_power_supplies.get(device_chosen) is not None:
                 address = self.device_options.get(device_chosen)
                 if address is not None:
-                    self.power_supply = available_power_supplies[device_chosen](address)
-                    self.add_device_tab(device_chosen)
-                    self.is_power_supply_connected = True
-                    self.powersupply_button.setText("Disconnect")
-                    self.powersupply_menu.setDisabled(True)
-                    self.characteristics_button.setDisabled(True)
-                    self.switch_tab_bar()
+                    self.powersupply_button.setDisabled(True)
+                    self.start_worker("ps").submit(lambda: available_power_supplies[device_chosen](address),
+                                                   lambda device: self.power_supply_opened(device_chosen, device))
             else:
                 self.handle_error("No such power supply available!")
         else:
-            self.power_supply.close()
+            self.stop_polling("ps")
+            self.stop_protection_monitor()
+            self.stop_worker("ps", self.power_supply.close)
             self.power_supply = None
             self.is_power_supply_connected = False
             self.powersupply_button.setText("Connect")
@@ -220,17 +528,14 @@ class Application(QWidget):
             if available_multimeters.get(device_chosen) is not None:
                 address = self.device_options.get(device_chosen)
                 if address is not None:
-                    self.multimeter = available_multimeters[device_chosen](address)
-                    self.add_device_tab(device_chosen)
-                    self.is_multimeter_connected = True
-                    self.multimeter_button.setText("Disconnect")
-                    self.multimeter_menu.setDisabled(True)
-                    self.characteristics_button.setDisabled(True)
-                    self.switch_tab_bar()
+                    self.multimeter_button.setDisabled(True)
+                    self.start_worker("m").submit(lambda: available_multimeters[device_chosen](address),
+                                                  lambda device: self.multimeter_opened(device_chosen, device))
             else:
                 self.handle_error("No such multimeter available!")
         else:
-            self.multimeter.close()
+            self.stop_polling("m")
+            self.stop_worker("m", self.multimeter.close)
             self.multimeter = None
             self.is_multimeter_connected = False
             self.multimeter_button.setText("Connect")
@@ -241,171 +546,491 @@ class Application(QWidget):
                 self.characteristics_button.setDisabled(False)
             self.switch_tab_bar()
 
+    def power_supply_opened(self, device_chosen, device):
+        self.powersupply_button.setDisabled(False)
+        if isinstance(device, Exception):
+            self.stop_worker("ps")
+            self.handle_error("Could not connect " + device_chosen + ": " + str(device))
+            return
+        self.power_supply = device
+        if isinstance(device, PowerSupplyHMC804x):
+            self.protection_monitor = ProtectionMonitor(device, parent=self)
+            self.protection_monitor.protectionTripped.connect(self.show_protection_trips)
+            self.protection_monitor.monitoringFailed.connect(self.handle_error)
+            self.protection_monitor.start()
+        self.add_device_tab(device_chosen)
+        self.is_power_supply_connected = True
+        self.powersupply_button.setText("Disconnect")
+        self.powersupply_menu.setDisabled(True)
+        self.characteristics_button.setDisabled(True)
+        self.switch_tab_bar()
+
+    def multimeter_opened(self, device_chosen, device):
+        self.multimeter_button.setDisabled(False)
+        if isinstance(device, Exception):
+            self.stop_worker("m")
+            self.handle_error("Could not connect " + device_chosen + ": " + str(device))
+            return
+        self.multimeter = device
+        self.add_device_tab(device_chosen)
+        self.is_multimeter_connected = True
+        self.multimeter_button.setText("Disconnect")
+        self.multimeter_menu.setDisabled(True)
+        self.characteristics_button.setDisabled(True)
+        self.switch_tab_bar()
+
+    def stop_protection_monitor(self):
+        if self.protection_monitor is not None:
+            self.protection_monitor.stop()
+            self.protection_monitor = None
+
+    def show_protection_trips(self, events):
+        names = {"ovp": "OVP", "opp": "OPP", "fuse": "Fuse"}
+        message = ", ".join(names[event] + " tripped on " + channel for channel, event in events)
+        if self.powersupply_output_area is not None:
+            self.powersupply_output_area.setText(message)
+        self.handle_error(message)
+
+    def start_worker(self, caller):
+        worker = self.workers[caller] = DeviceWorker(self)
+        worker.start()
+        return worker
+
+    def stop_worker(self, caller, last_call=None):
+        worker = self.workers.pop(caller, None)
+        if worker is not None:
+            if last_call is not None:
+                worker.submit(last_call)
+            worker.stop()
+
     def add_measurement_tab(self):
         if self.is_measurement_opened is False:
-            multimeter_address = self.device_options.get("HMC8012")
-            if multimeter_address is None:
-                self.handle_error("Multimeter not available!")
-                return
             powersupply_address = self.device_options.get("HMC8043")
             if powersupply_address is None:
                 self.handle_error("Power supply not available!")
                 return
-            self.measured_multimeter = available_multimeters["HMC8012"](multimeter_address)
-            self.measured_power_supply = available_power_supplies["HMC8043"](powersupply_address)
-
-            self.characteristics_button.setText("Close")
-            self.measurement_tab = QWidget()
-            self.measurement_tab.setAttribute(Qt.WA_DeleteOnClose)
-            measurement_tab_layout = QGridLayout()
-
-            measurement_box = QGroupBox("Measurement")
-            measurement_box_layout = QGridLayout()
-            channel_menu = QComboBox()
-            channel_menu_options = ["Channel 1", "Channel 2", "Channel 3"]
-            channel_menu.addItems(channel_menu_options)
-            channel_menu.setItemData(0, "OUT1")
-            channel_menu.setItemData(1, "OUT2")
-            channel_menu.setItemData(2, "OUT3")
-            measurement_box_layout.addWidget(channel_menu, 0, 0)
-
-            measurement_box_layout.addWidget(QLabel("Voltage"), 1, 0)
-            measurement_box_layout.addWidget(QLabel("From"), 1, 1)
-            voltage_from_input = QDoubleSpinBox()
-            voltage_from_input.setSuffix(" V")
-            voltage_from_input.setMaximum(3.2050E+01)
-            voltage_from_input.setDecimals(3)
-            measurement_box_layout.addWidget(voltage_from_input, 1, 2)
-            measurement_box_layout.addWidget(QLabel("To"), 1, 3)
-            voltage_to_input = QDoubleSpinBox()
-            voltage_to_input.setSuffix(" V")
-            voltage_to_input.setMaximum(3.2050E+01)
-            voltage_to_input.setDecimals(3)
-            measurement_box_layout.addWidget(voltage_to_input, 1, 4)
-
-            measurement_box_layout.addWidget(QLabel("Step"), 2, 0)
-            step_input = QDoubleSpinBox()
-            step_input.setSuffix(" V")
-            step_input.setMaximum(3.2050E+01)
-            step_input.setDecimals(3)
-            measurement_box_layout.addWidget(step_input, 2, 2)
-            measurement_box.setLayout(measurement_box_layout)
-            measurement_tab_layout.addWidget(measurement_box, 0, 0, 1, 5)
-
-            measurement_tab_layout.addWidget(QLabel("Time delay"), 1, 0)
-            time_delay_input = QDoubleSpinBox()
-            time_delay_input.setMinimum(1.2)
-            time_delay_input.setSuffix(" s")
-            measurement_tab_layout.addWidget(time_delay_input, 1, 1)
-
-            start_button = QPushButton("Start")
-            start_button.clicked.connect(lambda: self.measure_characteristic(channel_menu.currentData(),
-                                                                             voltage_from_input.value(),
-                                                                             voltage_to_input.value(),
-                                                                             step_input.value(),
-                                                                             time_delay_input.value()))
-            measurement_tab_layout.addWidget(start_button, 1, 3)
-
-            stop_button = QPushButton("Stop && Save")
-            stop_button.clicked.connect(lambda: self.finish_measure_characteristic())
-            measurement_tab_layout.addWidget(stop_button, 1, 4)
-
-            reset_button = QPushButton("Clear")
-            reset_button.clicked.connect(lambda: self.reset_plots())
-            measurement_tab_layout.addWidget(reset_button, 1, 2)
-
-            self.measurement_tab.setLayout(measurement_tab_layout)
-            self.tab_bar.addTab(self.measurement_tab, "Characteristic measurement")
-            self.is_measurement_opened = True
-            self.powersupply_button.setDisabled(True)
-            self.multimeter_button.setDisabled(True)
+            # The drivers are opened on a worker per device, the tab is built once all of them answered.
+            # Every known HMC8012 can read one swept channel, channels without one use the readback
+            # of the power supply; they are kept in the order of the discovery cache
+            self.characteristics_button.setDisabled(True)
+            self.measured_multimeters = {address: None for address, model in self.discovery_cache.resources.items()
+                                         if model == "HMC8012"}
+            self.opening_measured_devices = {powersupply_address, *self.measured_multimeters}
+            self.start_worker("measured " + powersupply_address).submit(
+                lambda: available_power_supplies["HMC8043"](powersupply_address),
+                lambda device: self.measured_device_opened("HMC8043", powersupply_address, device))
+            for address in self.measured_multimeters:
+                self.start_worker("measured " + address).submit(
+                    lambda address=address: available_multimeters["HMC8012"](address),
+                    lambda device, address=address: self.measured_device_opened("HMC8012", address, device))
         else:
-            self.measured_multimeter.close()
-            self.measured_power_supply.close()
-            self.measured_multimeter = None
+            self.stop_sweep()
+            for address, multimeter in self.measured_multimeters.items():
+                self.stop_worker("measured " + address, multimeter.close)
+            self.stop_worker("measured " + self.measured_power_supply.address, self.measured_power_supply.close)
+            self.measured_multimeters = {}
             self.measured_power_supply = None
             self.characteristics_button.setText("Open")
             self.tab_bar.removeTab(self.tab_bar.indexOf(self.measurement_tab))
             self.measurement_tab.close()
+            self.characteristic_plot = None
             self.is_measurement_opened = False
             self.powersupply_button.setDisabled(False)
             self.multimeter_button.setDisabled(False)
+            self.switch_tab_bar()
+
+    def measured_device_opened(self, model, address, device):
+        self.opening_measured_devices.discard(address)
+        if isinstance(device, Exception):
+            self.stop_worker("measured " + address)
+            self.measured_multimeters.pop(address, None)
+            self.handle_error("Could not connect " + model + " at " + address + ": " + str(device))
+        elif model == "HMC8043":
+            self.measured_power_supply = device
+        else:
+            self.measured_multimeters[address] = device
+        if not self.opening_measured_devices:
+            self.open_measurement_tab()
+
+    def open_measurement_tab(self):
+        self.characteristics_button.setDisabled(False)
+        if self.measured_power_supply is None:
+            # Without the power supply there is nothing to sweep, the multimeters opened are closed again
+            for address, multimeter in self.measured_multimeters.items():
+                self.stop_worker("measured " + address, multimeter.close)
+            self.measured_multimeters = {}
+            return
+        self.characteristics_button.setText("Close")
+        self.measurement_tab = QWidget()
+        self.measurement_tab.setAttribute(Qt.WA_DeleteOnClose)
+        measurement_tab_layout = QGridLayout()
+
+        measurement_box = QGroupBox("Measurement")
+        measurement_box_layout = QGridLayout()
+        # A checkbox per channel with the instrument reading its current, checked channels are swept at once
+        channel_checkboxes = []
+        readback_menus = []
+        for number in range(1, self.measured_power_supply.channels + 1):
+            channel_checkbox = QCheckBox("Channel " + str(number))
+            channel_checkbox.setChecked(number == 1)
+            measurement_box_layout.addWidget(channel_checkbox, 0, (number - 1) * 2)
+            channel_checkboxes.append(channel_checkbox)
+            readback_menu = QComboBox()
+            readback_menu.addItem("Power supply readback", None)
+            for address, multimeter in self.measured_multimeters.items():
+                readback_menu.addItem("HMC8012 " + multimeter.idn, multimeter)
+                readback_menu.setItemData(readback_menu.count() - 1, address, Qt.ToolTipRole)
+            if readback_menu.count() > number:
+                readback_menu.setCurrentIndex(number)
+            measurement_box_layout.addWidget(readback_menu, 0, (number - 1) * 2 + 1)
+            readback_menus.append(readback_menu)
+
+        measurement_box_layout.addWidget(QLabel("Voltage"), 1, 0)
+        measurement_box_layout.addWidget(QLabel("From"), 1, 1)
+        voltage_from_input = QDoubleSpinBox()
+        voltage_from_input.setSuffix(" V")
+        voltage_from_input.setMaximum(3.2050E+01)
+        voltage_from_input.setDecimals(3)
+        measurement_box_layout.addWidget(voltage_from_input, 1, 2)
+        measurement_box_layout.addWidget(QLabel("To"), 1, 3)
+        voltage_to_input = QDoubleSpinBox()
+        voltage_to_input.setSuffix(" V")
+        voltage_to_input.setMaximum(3.2050E+01)
+        voltage_to_input.setDecimals(3)
+        measurement_box_layout.addWidget(voltage_to_input, 1, 4)
+
+        measurement_box_layout.addWidget(QLabel("Step"), 2, 0)
+        step_input = QDoubleSpinBox()
+        step_input.setSuffix(" V")
+        step_input.setMaximum(3.2050E+01)
+        step_input.setDecimals(3)
+        measurement_box_layout.addWidget(step_input, 2, 2)
+        measurement_box.setLayout(measurement_box_layout)
+        measurement_tab_layout.addWidget(measurement_box, 0, 0, 1, 6)
+
+        measurement_tab_layout.addWidget(QLabel("Time delay"), 1, 0)
+        time_delay_input = QDoubleSpinBox()
+        time_delay_input.setMinimum(1.2)
+        time_delay_input.setSuffix(" s")
+        measurement_tab_layout.addWidget(time_delay_input, 1, 1)
+
+        start_button = QPushButton("Start")
+        arb_checkbox = QCheckBox("Sweep on instrument")
+        arb_checkbox.setToolTip("The power supply plays the sweep as ARB table, the host only takes readings")
+        measurement_tab_layout.addWidget(arb_checkbox, 2, 0, 1, 2)
+
+        settling_box = QGroupBox("Adaptive settling")
+        settling_box.setToolTip("Each point is read until its readings agree, the time delay is the longest wait")
+        settling_box.setCheckable(True)
+        settling_box.setChecked(False)
+        settling_box_layout = QGridLayout()
+        settling_box_layout.addWidget(QLabel("Readings"), 0, 0)
+        settling_count_input = QSpinBox()
+        settling_count_input.setRange(2, 100)
+        settling_count_input.setValue(3)
+        settling_box_layout.addWidget(settling_count_input, 0, 1)
+        settling_box_layout.addWidget(QLabel("Tolerance"), 0, 2)
+        settling_relative_input = QDoubleSpinBox()
+        settling_relative_input.setSuffix(" %")
+        settling_relative_input.setDecimals(3)
+        settling_relative_input.setValue(0.1)
+        settling_box_layout.addWidget(settling_relative_input, 0, 3)
+        settling_absolute_input = QDoubleSpinBox()
+        settling_absolute_input.setPrefix("+ ")
+        settling_absolute_input.setSuffix(" uA")
+        settling_absolute_input.setDecimals(3)
+        settling_absolute_input.setMaximum(1000)
+        settling_absolute_input.setValue(0.1)
+        settling_box_layout.addWidget(settling_absolute_input, 0, 4)
+        settling_box.setLayout(settling_box_layout)
+        measurement_tab_layout.addWidget(settling_box, 2, 2, 1, 3)
+
+        adaptive_box = QGroupBox("Adaptive steps")
+        adaptive_box.setToolTip("The Step grid is refined where the curve bends, down to the resolution")
+        adaptive_box.setCheckable(True)
+        adaptive_box.setChecked(False)
+        adaptive_box_layout = QGridLayout()
+        adaptive_box_layout.addWidget(QLabel("Resolution"), 0, 0)
+        resolution_input = QDoubleSpinBox()
+        resolution_input.setSuffix(" V")
+        resolution_input.setDecimals(3)
+        resolution_input.setRange(0.001, 3.2050E+01)
+        resolution_input.setValue(0.001)
+        adaptive_box_layout.addWidget(resolution_input, 0, 1)
+        adaptive_box_layout.addWidget(QLabel("Max points"), 0, 2)
+        max_points_input = QSpinBox()
+        max_points_input.setRange(2, 10000)
+        max_points_input.setValue(200)
+        adaptive_box_layout.addWidget(max_points_input, 0, 3)
+        adaptive_box.setLayout(adaptive_box_layout)
+        measurement_tab_layout.addWidget(adaptive_box, 3, 2, 1, 3)
+
+        plan_box = QGroupBox("Sweep plan")
+        plan_box.setToolTip("Nested, logarithmic, list and bidirectional sweeps saved in plan files, run on the "
+                            "checked channels with the time delay and settling above")
+        plan_box_layout = QGridLayout()
+        plan_box_layout.addWidget(QLabel("Readings"), 0, 0)
+        plan_quantity_menu = QComboBox()
+        plan_quantity_menu.addItem("Current", "current")
+        plan_quantity_menu.addItem("Voltage", "voltage")
+        plan_box_layout.addWidget(plan_quantity_menu, 0, 1)
+        run_plan_button = QPushButton("Run plan...")
+        plan_box_layout.addWidget(run_plan_button, 1, 0)
+        save_plan_button = QPushButton("Save plan...")
+        save_plan_button.setToolTip("Saves From, To and Step of the first checked channel as a linear plan")
+        plan_box_layout.addWidget(save_plan_button, 1, 1)
+        plan_box.setLayout(plan_box_layout)
+        measurement_tab_layout.addWidget(plan_box, 3, 0, 1, 2)
+
+        start_button.clicked.connect(lambda: self.measure_characteristic(
+            [("OUT" + str(number), readback_menu.currentData())
+             for number, (channel_checkbox, readback_menu) in enumerate(zip(channel_checkboxes, readback_menus), 1)
+             if channel_checkbox.isChecked()],
+            voltage_from_input.value(), voltage_to_input.value(), step_input.value(),
+            time_delay_input.value(), arb_checkbox.isChecked(),
+            Settling(settling_count_input.value(), settling_relative_input.value() / 100,
+                     settling_absolute_input.value() * 1e-6, time_delay_input.value())
+            if settling_box.isChecked() else None,
+            (resolution_input.value(), max_points_input.value()) if adaptive_box.isChecked() else None))
+        measurement_tab_layout.addWidget(start_button, 1, 3)
+
+        checked_channels = lambda: [
+            "OUT" + str(number) for number, channel_checkbox in enumerate(channel_checkboxes, 1)
+            if channel_checkbox.isChecked()]
+        run_plan_button.clicked.connect(lambda: self.run_plan(
+            [(channel, readback_menus[int(channel[3:]) - 1].currentData(), plan_quantity_menu.currentData())
+             for channel in checked_channels()],
+            time_delay_input.value(),
+            Settling(settling_count_input.value(), settling_relative_input.value() / 100,
+                     settling_absolute_input.value() * 1e-6, time_delay_input.value())
+            if settling_box.isChecked() else None))
+        save_plan_button.clicked.connect(lambda: self.save_linear_plan(
+            checked_channels(), voltage_from_input.value(), voltage_to_input.value(), step_input.value()))
+
+        stop_button = QPushButton("Stop && Save")
+        stop_button.clicked.connect(lambda: self.finish_measure_characteristic())
+        measurement_tab_layout.addWidget(stop_button, 1, 4)
+
+        reset_button = QPushButton("Clear")
+        reset_button.clicked.connect(lambda: self.reset_plots())
+        measurement_tab_layout.addWidget(reset_button, 1, 2)
+
+        self.characteristic_plot = CharacteristicPlot(self.measurement_tab)
+        self.characteristic_plot.setMinimumHeight(400)
+        measurement_tab_layout.addWidget(self.characteristic_plot, 4, 0, 1, 5)
+
+        self.measurement_tab.setLayout(measurement_tab_layout)
+        self.tab_bar.addTab(self.measurement_tab, "Characteristic measurement")
+        self.is_measurement_opened = True
+        self.powersupply_button.setDisabled(True)
+        self.multimeter_button.setDisabled(True)
         self.switch_tab_bar()
 
+    def add_diagnostics_tab(self):
+        if self.diagnostics_tab is None:
+            self.diagnostics_tab = QWidget()
+            self.diagnostics_tab.setAttribute(Qt.WA_DeleteOnClose)
+            diagnostics_tab_layout = QGridLayout()
+
+            self.diagnostics_summary = QLabel()
+            diagnostics_tab_layout.addWidget(self.diagnostics_summary, 0, 0)
+
+            reset_button = QPushButton("Reset")
+            reset_button.clicked.connect(self.reset_diagnostics)
+            diagnostics_tab_layout.addWidget(reset_button, 0, 1)
+
+            self.diagnostics_table = QTableWidget()
+            self.diagnostics_table.setColumnCount(10)
+            self.diagnostics_table.setHorizontalHeaderLabels(["Instrument", "Command", "Calls", "p50 (ms)", "p95 (ms)",
+                                                              "p99 (ms)", "Rate (1/s)", "Errors (%)", "Bus time (%)",
+                                                              "Bytes out/in"])
+            self.diagnostics_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+            self.diagnostics_table.verticalHeader().setVisible(False)
+            diagnostics_tab_layout.addWidget(self.diagnostics_table, 1, 0, 1, 2)
+
+            self.diagnostics_tab.setLayout(diagnostics_tab_layout)
+            self.tab_bar.addTab(self.diagnostics_tab, "Diagnostics")
+            self.diagnostics_button.setText("Close")
+            self.diagnostics_timer = QTimer(self)
+            self.diagnostics_timer.timeout.connect(self.refresh_diagnostics)
+            self.diagnostics_timer.start(1000)
+            self.refresh_diagnostics()
+        else:
+            self.diagnostics_timer.stop()
+            self.diagnostics_timer = None
+            self.tab_bar.removeTab(self.tab_bar.indexOf(self.diagnostics_tab))
+            self.diagnostics_tab.close()
+            self.diagnostics_tab = None
+            self.diagnostics_table = None
+            self.diagnostics_summary = None
+            self.diagnostics_button.setText("Open")
+        self.switch_tab_bar()
+
+    def metered_devices(self):
+        # Connected instruments recording command metrics, by the name shown in the diagnostics tab
+        devices = {"Power supply": self.power_supply, "Multimeter": self.multimeter,
+                   "Measured power supply": self.measured_power_supply}
+        for address, multimeter in self.measured_multimeters.items():
+            devices["Measured multimeter " + address] = multimeter
+        return {name: device for name, device in devices.items() if getattr(device, "metrics", None) is not None}
+
+    def refresh_diagnostics(self):
+        rows = []
+        summary = []
+        for name, device in self.metered_devices().items():
+            device_rows = device.metrics.summary()
+            rate = sum(row["rate"] for row in device_rows)
+            bus_time = sum(row["bus_time"] for row in device_rows)
+            summary.append(name + " (" + device.idn + "): " + format(rate, ".1f") + " commands/s, bus busy " +
+                           format(bus_time * 100, ".0f") + " %")
+            rows.extend((name, row) for row in device_rows)
+        for name, caller in (("Power supply", "ps"), ("Multimeter", "m")):
+            worker = self.workers.get(caller)
+            if worker is not None and worker.setpoints:
+                summary.append(name + ": " + str(worker.elided) + " of " + str(worker.setpoints) +
+                               " setpoint writes elided")
+        self.diagnostics_summary.setText("\n".join(summary) if summary else "No instrument connected")
+        self.diagnostics_table.setRowCount(len(rows))
+        for index, (name, row) in enumerate(rows):
+            values = [name, row["mnemonic"], str(row["count"]), format(row["p50"] * 1000, ".2f"),
+                      format(row["p95"] * 1000, ".2f"), format(row["p99"] * 1000, ".2f"), format(row["rate"], ".2f"),
+                      format(row["error_rate"] * 100, ".1f"), format(row["bus_time"] * 100, ".1f"),
+                      str(row["bytes_written"]) + "/" + str(row["bytes_read"])]
+            for column, value in enumerate(values):
+                self.diagnostics_table.setItem(index, column, QTableWidgetItem(value))
+        self.diagnostics_table.resizeColumnsToContents()
+
+    def reset_diagnostics(self):
+        for device in self.metered_devices().values():
+            device.metrics.reset()
+        for worker in self.workers.values():
+            worker.reset_counters()
+        self.refresh_diagnostics()
+
     def reset_plots(self):
-        self.x_axes = []
-        self.y_axes = []
-        self.plot_colors = []
+        self.characteristic_plot.clear()
 
     def finish_measure_characteristic(self):
-        if self.output_file:
-            if not self.output_file.closed:
-                self.output_file.close()
-        if self.measuring_loop is not None:
-            if self.measuring_loop.event_source is not None:
-                self.measuring_loop.event_source.stop()
-                self.measuring_loop = None
-                self.measured_power_supply.set_output_channel_state(0, "OUT1")
-                self.measured_power_supply.set_output_channel_state(0, "OUT2")
-                self.measured_power_supply.set_output_channel_state(0, "OUT3")
+        # The sweep stops within one step, the points measured so far are saved already
+        if self.sweep_thread is not None:
+            self.sweep_thread.engine.cancel()
+
+    def stop_sweep(self):
+        if self.sweep_thread is not None:
+            self.sweep_thread.stop()
+            self.sweep_thread = None
 
     def generate_color(self):
         rand_num = lambda: random.randint(0, 255)
         return '#%02X%02X%02X' % (rand_num(), rand_num(), rand_num())
 
-    def animate_plot(self, i, xs, ys, voltage_list, delay, channel, previous_channel):
-        self.measured_power_supply.set_source_voltage_level_immediate_amplitude(voltage_list[i], channel)
-        time.sleep(delay)
-        measured_value = float(self.measured_multimeter.measure_current_dc()[2])
-
-        self.file_writer.writerow([voltage_list[i], measured_value])
-
-        xs.append(voltage_list[i])
-        ys.append(measured_value * 1000)
-        if i == 0:
-            self.x_axes.append(xs)
-            self.y_axes.append(ys)
-            self.plot_colors.append(self.generate_color())
-        for q in range(len(self.x_axes)):
-            plt.plot(self.x_axes[q], self.y_axes[q], color=self.plot_colors[q], marker='o')
-        plt.title('VACH', fontsize=18)
-        plt.ylabel('Current (mA)', fontsize=16)
-        plt.xlabel('Voltage (V)', fontsize=16)
-        plt.tight_layout()
-        if len(voltage_list) == (i + 1):
-            self.measured_power_supply.set_output_channel_state(0, channel)
-            self.measured_power_supply.set_output_channel(previous_channel)
-            self.measured_power_supply.set_output_master_state(0, channel)
-            if self.output_file:
-                if not self.output_file.closed:
-                    self.output_file.close()
-            self.measuring_loop = None
-
-    def measure_characteristic(self, channel, voltage_from, voltage_to, step, delay):
+    def plot_point(self, point):
+        self.characteristic_plot.add_point(point.setpoint, point.reading * 1000, point.channel)
+
+    def plot_plan_point(self, point, engine):
+        # A line per channel and setpoints of the outer loops, the channel setpoint is on the x axis
+        position = engine.setpoint_position(point.channel)
+        key = " ".join([point.channel] + [format(value, "g") for index, value in enumerate(point.setpoints)
+                                          if index != position])
+        if key not in self.characteristic_plot.series:
+            self.characteristic_plot.add_series(key, self.generate_color())
+        self.characteristic_plot.add_point(point.setpoint, point.reading * 1000, key, ordered=False)
+
+    def check_lanes(self, lanes):
+        if not lanes:
+            self.handle_error("No channel selected")
+            return False
+        multimeters = [lane[1] for lane in lanes if lane[1] is not None]
+        if len(set(map(id, multimeters))) < len(multimeters):
+            self.handle_error("Each multimeter can read one channel only")
+            return False
+        if self.sweep_thread is not None and self.sweep_thread.isRunning():
+            self.handle_error("A measurement is running already")
+            return False
+        return True
+
+    def start_sweep_thread(self, engine, lanes, plot_point):
+        started = datetime.now().strftime("%d.%m.%Y-%H.%M.%S")
+        for lane in lanes:
+            suffix = "_" + lane[0] if len(lanes) > 1 else ""
+            engine.subscribe(CsvRecorder('../measurement_from_' + started + suffix + '.csv', lane[0]))
+        self.sweep_thread = SweepThread(engine, self)
+        self.sweep_thread.pointMeasured.connect(plot_point)
+        self.sweep_thread.finished.connect(self.characteristic_plot.finish_sweep)
+        self.sweep_thread.sweepFailed.connect(self.handle_error)
+        self.sweep_thread.start()
+
+    def run_plan(self, lanes, delay, settling=None):
+        # lanes: (channel, multimeter, quantity read) of each checked channel, the plan file sets the setpoints
+        if not self.check_lanes(lanes):
+            return
+        path, selected_filter = QFileDialog.getOpenFileName(self, "Run sweep plan", "..", "Sweep plans (*.json)")
+        if not path:
+            return
+        try:
+            plan = load_plan(path)
+        except (OSError, ValueError) as error:
+            self.handle_error("Could not load sweep plan: " + str(error))
+            return
+        engine = MultiChannelSweepEngine(self.measured_power_supply, lanes, plan, delay, settling)
+        plotted = engine.targets[engine.setpoint_position(lanes[0][0])][1]
+        self.characteristic_plot.set_quantities("Voltage (V)" if plotted == "voltage" else "Current (A)",
+                                                "Current (mA)" if lanes[0][2] == "current" else "Voltage (mV)")
+        self.characteristic_plot.start_sweep({})
+        self.start_sweep_thread(engine, lanes, lambda point: self.plot_plan_point(point, engine))
+
+    def save_linear_plan(self, channels, voltage_from, voltage_to, step):
+        if not channels or step == 0:
+            self.handle_error("Linear plan needs a checked channel and a step")
+            return
+        path, selected_filter = QFileDialog.getSaveFileName(self, "Save sweep plan", "..", "Sweep plans (*.json)")
+        if not path:
+            return
+        try:
+            save_plan(LinearPlan(channels[0], voltage_from, voltage_to, step), path)
+        except OSError as error:
+            self.handle_error("Could not save sweep plan: " + str(error))
+
+    def measure_characteristic(self, lanes, voltage_from, voltage_to, step, delay, on_instrument=False,
+                               settling=None, adaptive=None):
+        # lanes: (channel, multimeter) of each swept channel, multimeter None for the power supply readback
+        # adaptive: (resolution, max points) to refine the Step grid where the curve needs it
         if step == 0 or voltage_from >= voltage_to:
             return
-        previous_channel = self.measured_power_supply.get_output_channel()[2]
-        self.measured_power_supply.set_output_channel_state(1, channel)
-        self.measured_power_supply.set_output_master_state(1, channel)
+        if not self.check_lanes(lanes):
+            return
+        single = len(lanes) == 1 and lanes[0][1] is not None
+        if on_instrument and not single:
+            self.handle_error("Sweep on instrument needs a single channel read by a multimeter")
+            return
         frame_count = int((voltage_to * 1000 - voltage_from * 1000) / (step * 1000)) + 1
-        current_voltage = voltage_from
-        voltage_list = []
-        for x in range(frame_count):
-            voltage_list.append(round(current_voltage, 3))
-            current_voltage += step
-        print(voltage_list)
-        print(frame_count)
-        plt.ion()
-        fig = plt.gcf()
-        xs = []
-        ys = []
-        self.output_file = open('../measurement_from_' + datetime.now().strftime("%d.%m.%Y-%H.%M.%S") + '.csv', 'a',
-                                newline='')
-        self.file_writer = csv.writer(self.output_file, delimiter=';')
-        plt.cla()
-        self.measuring_loop = FuncAnimation(fig, fargs=(xs, ys, voltage_list, delay, channel, previous_channel),
-                                            init_func=lambda: None, repeat=False, frames=frame_count,
-                                            func=self.animate_plot)
+        if on_instrument and frame_count > ARB_MAX_POINTS:
+            self.handle_error("Sweep on instrument needs at most " + str(ARB_MAX_POINTS) + " points")
+            return
+        if on_instrument and not ARB_MIN_DWELL <= delay <= ARB_MAX_DWELL:
+            self.handle_error("Sweep on instrument needs a time delay from " + str(ARB_MIN_DWELL) + " s to " +
+                              str(ARB_MAX_DWELL) + " s")
+            return
+        if adaptive is not None:
+            if on_instrument:
+                self.handle_error("Adaptive steps depend on the readings, they cannot be swept on the instrument")
+                return
+            setpoints = AdaptiveSweep(voltage_from, voltage_to, step, *adaptive)
+        else:
+            current_voltage = voltage_from
+            setpoints = []
+            for x in range(frame_count):
+                setpoints.append(round(current_voltage, 3))
+                current_voltage += step
+        if single:
+            engine = SweepEngine(self.measured_power_supply, lanes[0][1], lanes[0][0], setpoints, delay,
+                                 on_instrument, settling)
+        else:
+            engine = MultiChannelSweepEngine(self.measured_power_supply, lanes, setpoints, delay, settling)
+        self.characteristic_plot.set_quantities("Voltage (V)", "Current (mA)")
+        self.characteristic_plot.start_sweep({channel: self.generate_color() for channel, multimeter in lanes},
+                                             voltage_from, voltage_to)
+        self.start_sweep_thread(engine, lanes, self.plot_point)
 
     def switch_tab_bar(self):
         if self.tab_bar.isHidden():
@@ -420,19 +1045,43 @@ class Application(QWidget):
         except AttributeError:
             self.handle_error("Tab for this device is not available!")
 
-    def send_command(self, func, caller):
+    # Driver calls are queued to the worker of the device, widget values have to be read before
+    # queueing, so they are passed as args instead of read by the call
+    def send_command(self, func, caller, *args, key=None):
         if func is not None:
-            res = func()
-            self.evaluate_method_call(res, caller)
+            self.workers[caller].submit(lambda: func(*args), lambda res: self.evaluate_method_call(res, caller), key)
+
+    def queue_command(self, func, caller, *args):
+        # Sent without reporting the result, as the direct calls of the handlers did
+        self.workers[caller].submit(lambda: func(*args))
+
+    def select_channel(self, channel):
+        self.queue_command(self.power_supply.set_output_channel, "ps", channel)
+
+    def send_batch(self, device, funcs, caller, key=None):
+        def call():
+            with device.batch() as transaction:
+                for func in funcs:
+                    func()
+            return transaction.results
+
+        def done(results):
+            if isinstance(results, Exception):
+                self.evaluate_method_call(results, caller)
+                return
+            for res in results:
+                self.evaluate_method_call(res, caller)
+        self.workers[caller].submit(call, done, key)
 
     def send_common_command(self, device_common_commands, device_common_commands_list, caller):
         inst = device_common_commands.currentText()
         if inst != '':
-            res = device_common_commands_list[inst]()
-            self.evaluate_method_call(res, caller)
+            self.send_command(device_common_commands_list[inst], caller)
 
     def evaluate_method_call(self, res, caller):
-        if res[0] is not True:
+        if isinstance(res, Exception):
+            self.handle_error(str(res))
+        elif res[0] is not True:
             self.handle_error(res[2])
         else:
             if res[1] == "Query":
@@ -487,25 +1136,25 @@ class Application(QWidget):
         first_channel_voltage.setSuffix(" mV")
         first_channel_voltage.setMaximum(3500)
         first_channel_voltage.editingFinished.connect(
-            lambda: self.power_supply.set_voltage_level(1, self.sender().value()))
+            lambda: self.queue_command(self.power_supply.set_voltage_level, "ps", 1, self.sender().value()))
         channel_voltage_box_layout.addWidget(first_channel_voltage, 0, 0)
         second_channel_voltage = QSpinBox()
         second_channel_voltage.setSuffix(" mV")
         second_channel_voltage.setMaximum(3500)
         second_channel_voltage.editingFinished.connect(
-            lambda: self.power_supply.set_voltage_level(2, self.sender().value()))
+            lambda: self.queue_command(self.power_supply.set_voltage_level, "ps", 2, self.sender().value()))
         channel_voltage_box_layout.addWidget(second_channel_voltage, 1, 0)
         third_channel_voltage = QSpinBox()
         third_channel_voltage.setSuffix(" mV")
         third_channel_voltage.setMaximum(3500)
         third_channel_voltage.editingFinished.connect(
-            lambda: self.power_supply.set_voltage_level(3, self.sender().value()))
+            lambda: self.queue_command(self.power_supply.set_voltage_level, "ps", 3, self.sender().value()))
         channel_voltage_box_layout.addWidget(third_channel_voltage, 2, 0)
         fourth_channel_voltage = QSpinBox()
         fourth_channel_voltage.setSuffix(" mV")
         fourth_channel_voltage.setMaximum(3500)
         fourth_channel_voltage.editingFinished.connect(
-            lambda: self.power_supply.set_voltage_level(4, self.sender().value()))
+            lambda: self.queue_command(self.power_supply.set_voltage_level, "ps", 4, self.sender().value()))
         channel_voltage_box_layout.addWidget(fourth_channel_voltage, 3, 0)
         channel_voltage_box.setLayout(channel_voltage_box_layout)
         device_box_layout.addWidget(channel_voltage_box, 0, 1)
@@ -520,9 +1169,9 @@ class Application(QWidget):
 
     def change_channel_state(self, state, channel):
         if state == Qt.Checked:
-            self.power_supply.set_channel_state(channel, 'e')
+            self.queue_command(self.power_supply.set_channel_state, "ps", channel, 'e')
         elif state == Qt.Unchecked:
-            self.power_supply.set_channel_state(channel, 'd')
+            self.queue_command(self.power_supply.set_channel_state, "ps", channel, 'd')
 
     def add_HMC8043_tab(self):
         self.power_supply_tab = QWidget()
@@ -559,7 +1208,7 @@ class Application(QWidget):
         channel_settings_box_layout.addWidget(QLabel("Selected channel:"), 0, 0)
         channel_box = QComboBox()
         channel_box.addItems(["OUT3", "OUT2", "OUT1"])
-        channel_box.currentIndexChanged.connect(lambda: self.power_supply.set_output_channel(channel_box.currentText()))
+        channel_box.currentIndexChanged.connect(lambda: self.select_channel(channel_box.currentText()))
         channel_box.setCurrentIndex(2)
         channel_settings_box_layout.addWidget(channel_box, 0, 1, 1, 2)
 
@@ -569,11 +1218,11 @@ class Application(QWidget):
         channel_settings_box_layout.addWidget(channel_state, 1, 0)
         channel_activation = QPushButton("Activate")
         channel_activation.clicked.connect(lambda: self.send_command(
-            lambda: self.power_supply.set_output_channel_state(1, channel_box.currentText()), "ps"))
+            self.power_supply.set_output_channel_state, "ps", 1, channel_box.currentText()))
         channel_settings_box_layout.addWidget(channel_activation, 1, 1)
         channel_deactivation = QPushButton("Deactivate")
         channel_deactivation.clicked.connect(lambda: self.send_command(
-            lambda: self.power_supply.set_output_channel_state(0, channel_box.currentText()), "ps"))
+            self.power_supply.set_output_channel_state, "ps", 0, channel_box.currentText()))
         channel_settings_box_layout.addWidget(channel_deactivation, 1, 2)
         channel_settings_box.setLayout(channel_settings_box_layout)
         output_settings_box_layout.addWidget(channel_settings_box, 0, 0)
@@ -589,11 +1238,11 @@ class Application(QWidget):
         master_settings_box_layout.addWidget(master_state, 0, 1)
         master_activation = QPushButton("Activate")
         master_activation.clicked.connect(lambda: self.send_command(
-            lambda: self.power_supply.set_output_master_state(1, channel_box.currentText()), "ps"))
+            self.power_supply.set_output_master_state, "ps", 1, channel_box.currentText()))
         master_settings_box_layout.addWidget(master_activation, 1, 0)
         master_deactivation = QPushButton("Deactivate")
         master_deactivation.clicked.connect(lambda: self.send_command(
-            lambda: self.power_supply.set_output_master_state(0, channel_box.currentText()), "ps"))
+            self.power_supply.set_output_master_state, "ps", 0, channel_box.currentText()))
         master_settings_box_layout.addWidget(master_deactivation, 1, 1)
         master_settings_box.setLayout(master_settings_box_layout)
         output_settings_box_layout.addWidget(master_settings_box, 1, 0)
@@ -622,7 +1271,7 @@ class Application(QWidget):
         first_fuse_trip_button.setText("Trip")
         first_fuse_trip_button.clicked.connect(lambda: self.send_command(lambda:
                                                                          self.power_supply.fuse_trip("OUT1"), "ps"))
-        first_fuse_trip_button.clicked.connect(lambda: self.power_supply.set_output_channel(channel_box.currentText()))
+        first_fuse_trip_button.clicked.connect(lambda: self.select_channel(channel_box.currentText()))
         fuse_state_box_layout.addWidget(first_fuse_trip_button, 0, 4)
         fuse_state_box_layout.addWidget(QLabel("Fuse 2", ), 1, 0)
         second_fuse_state_label = QLabel("State:")
@@ -641,7 +1290,7 @@ class Application(QWidget):
         second_fuse_trip_button.setText("Trip")
         second_fuse_trip_button.clicked.connect(lambda: self.send_command(lambda:
                                                                           self.power_supply.fuse_trip("OUT2"), "ps"))
-        second_fuse_trip_button.clicked.connect(lambda: self.power_supply.set_output_channel(channel_box.currentText()))
+        second_fuse_trip_button.clicked.connect(lambda: self.select_channel(channel_box.currentText()))
         fuse_state_box_layout.addWidget(second_fuse_trip_button, 1, 4)
         fuse_state_box_layout.addWidget(QLabel("Fuse 3", ), 2, 0)
         third_fuse_state_label = QLabel("State:")
@@ -660,7 +1309,7 @@ class Application(QWidget):
         third_fuse_trip_button.setText("Trip")
         third_fuse_trip_button.clicked.connect(lambda: self.send_command(lambda:
                                                                          self.power_supply.fuse_trip("OUT3"), "ps"))
-        third_fuse_trip_button.clicked.connect(lambda: self.power_supply.set_output_channel(channel_box.currentText()))
+        third_fuse_trip_button.clicked.connect(lambda: self.select_channel(channel_box.currentText()))
         fuse_state_box_layout.addWidget(third_fuse_trip_button, 2, 4)
         fuse_state_box.setLayout(fuse_state_box_layout)
         fuse_options_box_layout.addWidget(fuse_state_box, 0, 0)
@@ -700,7 +1349,7 @@ class Application(QWidget):
         measure_selected_value = ButtonWithSwitch()
         measure_selected_value.setText("Query")
         measure_selected_value.clicked.connect(
-            lambda: self.send_command(lambda: measurement_box.currentData()(channel_box.currentText()), "ps"))
+            lambda: self.send_command(measurement_box.currentData(), "ps", channel_box.currentText()))
         measurement_options_box_layout.addWidget(measure_selected_value, 0, 2)
         measurement_options_box.setLayout(measurement_options_box_layout)
         device_tab_layout.addWidget(measurement_options_box, 2, 0, 1, 2)
@@ -757,7 +1406,7 @@ class Application(QWidget):
         easyramp_duration.setMinimum(1.00E-02)
         easyramp_duration.setMaximum(1.000E+01)
         easyramp_duration.editingFinished.connect(lambda: self.send_command(
-            lambda: self.power_supply.set_source_voltage_ramp_duration(easyramp_duration.value()), "ps"))
+            self.power_supply.set_source_voltage_ramp_duration, "ps", easyramp_duration.value()))
         easyramp_layout.addWidget(easyramp_duration, 0, 1)
 
         first_channel_easyramp_state = ButtonWithSwitch()
@@ -945,13 +1594,13 @@ class Application(QWidget):
         first_ovp_trip_button.setText("Trip")
         first_ovp_trip_button.clicked.connect(lambda: self.send_command(
             lambda: self.power_supply.source_voltage_protection_trip("OUT1"), "ps"))
-        first_ovp_trip_button.clicked.connect(lambda: self.power_supply.set_output_channel(channel_box.currentText()))
+        first_ovp_trip_button.clicked.connect(lambda: self.select_channel(channel_box.currentText()))
         ovp_layout.addWidget(first_ovp_trip_button, 0, 5)
         first_ovp_clear_button = QPushButton()
         first_ovp_clear_button.setText("Clear")
         first_ovp_clear_button.clicked.connect(lambda: self.send_command(
             lambda: self.power_supply.source_voltage_protection_clear("OUT1"), "ps"))
-        first_ovp_clear_button.clicked.connect(lambda: self.power_supply.set_output_channel(channel_box.currentText()))
+        first_ovp_clear_button.clicked.connect(lambda: self.select_channel(channel_box.currentText()))
         ovp_layout.addWidget(first_ovp_clear_button, 0, 6)
 
         ovp_layout.addWidget(QLabel("CH2 OVP value:"), 1, 0)
@@ -980,13 +1629,13 @@ class Application(QWidget):
         second_ovp_trip_button.setText("Trip")
         second_ovp_trip_button.clicked.connect(lambda: self.send_command(
             lambda: self.power_supply.source_voltage_protection_trip("OUT2"), "ps"))
-        second_ovp_trip_button.clicked.connect(lambda: self.power_supply.set_output_channel(channel_box.currentText()))
+        second_ovp_trip_button.clicked.connect(lambda: self.select_channel(channel_box.currentText()))
         ovp_layout.addWidget(second_ovp_trip_button, 1, 5)
         second_ovp_clear_button = QPushButton()
         second_ovp_clear_button.setText("Clear")
         second_ovp_clear_button.clicked.connect(lambda: self.send_command(
             lambda: self.power_supply.source_voltage_protection_clear("OUT2"), "ps"))
-        second_ovp_clear_button.clicked.connect(lambda: self.power_supply.set_output_channel(channel_box.currentText()))
+        second_ovp_clear_button.clicked.connect(lambda: self.select_channel(channel_box.currentText()))
         ovp_layout.addWidget(second_ovp_clear_button, 1, 6)
 
         ovp_layout.addWidget(QLabel("CH3 OVP value:"), 2, 0)
@@ -1015,13 +1664,13 @@ class Application(QWidget):
         third_ovp_trip_button.setText("Trip")
         third_ovp_trip_button.clicked.connect(lambda: self.send_command(
             lambda: self.power_supply.source_voltage_protection_trip("OUT3"), "ps"))
-        third_ovp_trip_button.clicked.connect(lambda: self.power_supply.set_output_channel(channel_box.currentText()))
+        third_ovp_trip_button.clicked.connect(lambda: self.select_channel(channel_box.currentText()))
         ovp_layout.addWidget(third_ovp_trip_button, 2, 5)
         third_ovp_clear_button = QPushButton()
         third_ovp_clear_button.setText("Clear")
         third_ovp_clear_button.clicked.connect(lambda: self.send_command(
             lambda: self.power_supply.source_voltage_protection_clear("OUT3"), "ps"))
-        third_ovp_clear_button.clicked.connect(lambda: self.power_supply.set_output_channel(channel_box.currentText()))
+        third_ovp_clear_button.clicked.connect(lambda: self.select_channel(channel_box.currentText()))
         ovp_layout.addWidget(third_ovp_clear_button, 2, 6)
 
         ovp_box.setLayout(ovp_layout)
@@ -1046,13 +1695,13 @@ class Application(QWidget):
         first_opp_trip_button.setText("Trip")
         first_opp_trip_button.clicked.connect(lambda: self.send_command(
             lambda: self.power_supply.source_power_protection_trip("OUT1"), "ps"))
-        first_opp_trip_button.clicked.connect(lambda: self.power_supply.set_output_channel(channel_box.currentText()))
+        first_opp_trip_button.clicked.connect(lambda: self.select_channel(channel_box.currentText()))
         opp_layout.addWidget(first_opp_trip_button, 0, 3)
         first_opp_clear_button = QPushButton()
         first_opp_clear_button.setText("Clear")
         first_opp_clear_button.clicked.connect(lambda: self.send_command(
             lambda: self.power_supply.source_power_protection_clear("OUT1"), "ps"))
-        first_opp_clear_button.clicked.connect(lambda: self.power_supply.set_output_channel(channel_box.currentText()))
+        first_opp_clear_button.clicked.connect(lambda: self.select_channel(channel_box.currentText()))
         opp_layout.addWidget(first_opp_clear_button, 0, 4)
 
         opp_layout.addWidget(QLabel("CH2 OPP value:"), 1, 0)
@@ -1073,13 +1722,13 @@ class Application(QWidget):
         second_opp_trip_button.setText("Trip")
         second_opp_trip_button.clicked.connect(lambda: self.send_command(
             lambda: self.power_supply.source_power_protection_trip("OUT2"), "ps"))
-        second_opp_trip_button.clicked.connect(lambda: self.power_supply.set_output_channel(channel_box.currentText()))
+        second_opp_trip_button.clicked.connect(lambda: self.select_channel(channel_box.currentText()))
         opp_layout.addWidget(second_opp_trip_button, 1, 3)
         second_opp_clear_button = QPushButton()
         second_opp_clear_button.setText("Clear")
         second_opp_clear_button.clicked.connect(lambda: self.send_command(
             lambda: self.power_supply.source_power_protection_clear("OUT2"), "ps"))
-        second_opp_clear_button.clicked.connect(lambda: self.power_supply.set_output_channel(channel_box.currentText()))
+        second_opp_clear_button.clicked.connect(lambda: self.select_channel(channel_box.currentText()))
         opp_layout.addWidget(second_opp_clear_button, 1, 4)
 
         opp_layout.addWidget(QLabel("CH3 OPP value:"), 2, 0)
@@ -1100,13 +1749,13 @@ class Application(QWidget):
         third_opp_trip_button.setText("Trip")
         third_opp_trip_button.clicked.connect(lambda: self.send_command(
             lambda: self.power_supply.source_power_protection_trip("OUT3"), "ps"))
-        third_opp_trip_button.clicked.connect(lambda: self.power_supply.set_output_channel(channel_box.currentText()))
+        third_opp_trip_button.clicked.connect(lambda: self.select_channel(channel_box.currentText()))
         opp_layout.addWidget(third_opp_trip_button, 2, 3)
         third_opp_clear_button = QPushButton()
         third_opp_clear_button.setText("Clear")
         third_opp_clear_button.clicked.connect(lambda: self.send_command(
             lambda: self.power_supply.source_power_protection_clear("OUT3"), "ps"))
-        third_opp_clear_button.clicked.connect(lambda: self.power_supply.set_output_channel(channel_box.currentText()))
+        third_opp_clear_button.clicked.connect(lambda: self.select_channel(channel_box.currentText()))
         opp_layout.addWidget(third_opp_clear_button, 2, 4)
 
         opp_box.setLayout(opp_layout)
@@ -1131,7 +1780,7 @@ class Application(QWidget):
         first_channel_energy_meter_reset.clicked.connect(lambda: self.send_command(
             lambda: self.power_supply.measure_scalar_energy_reset("OUT1"), "ps"))
         first_channel_energy_meter_reset.clicked.connect(
-            lambda: self.power_supply.set_output_channel(channel_box.currentText()))
+            lambda: self.select_channel(channel_box.currentText()))
         energy_meter_layout.addWidget(first_channel_energy_meter_reset, 0, 2)
 
         energy_meter_layout.addWidget(QLabel("Channel 2 energy meter:"), 1, 0)
@@ -1146,7 +1795,7 @@ class Application(QWidget):
         second_channel_energy_meter_reset.clicked.connect(lambda: self.send_command(
             lambda: self.power_supply.measure_scalar_energy_reset("OUT2"), "ps"))
         second_channel_energy_meter_reset.clicked.connect(
-            lambda: self.power_supply.set_output_channel(channel_box.currentText()))
+            lambda: self.select_channel(channel_box.currentText()))
         energy_meter_layout.addWidget(second_channel_energy_meter_reset, 1, 2)
 
         energy_meter_layout.addWidget(QLabel("Channel 3 energy meter:"), 2, 0)
@@ -1161,12 +1810,14 @@ class Application(QWidget):
         third_channel_energy_meter_reset.clicked.connect(lambda: self.send_command(
             lambda: self.power_supply.measure_scalar_energy_reset("OUT3"), "ps"))
         third_channel_energy_meter_reset.clicked.connect(
-            lambda: self.power_supply.set_output_channel(channel_box.currentText()))
+            lambda: self.select_channel(channel_box.currentText()))
         energy_meter_layout.addWidget(third_channel_energy_meter_reset, 2, 2)
 
         energy_meter_box.setLayout(energy_meter_layout)
         device_tab_layout.addWidget(energy_meter_box, 0, 4, 1, 2)
 
+        device_tab_layout.addWidget(self.make_monitoring_box("ps"), 5, 0, 1, 6)
+
         self.switch_tab_bar()
 
         self.power_supply_tab.setLayout(device_tab_layout)
@@ -1175,31 +1826,39 @@ class Application(QWidget):
     def set_energy_meter_state(self, affected_channel, selected_channel):
         sender = self.sender()
         if sender.isActivated:
-            self.send_command(lambda: self.power_supply.set_measure_scalar_energy_state(0, affected_channel), "ps")
+            self.send_batch(self.power_supply, [
+                lambda: self.power_supply.set_measure_scalar_energy_state(0, affected_channel),
+                lambda: self.power_supply.set_output_channel(selected_channel)], "ps")
             sender.setText("Activate")
             sender.isActivated = False
         else:
-            self.send_command(lambda: self.power_supply.set_measure_scalar_energy_state(1, affected_channel), "ps")
+            self.send_batch(self.power_supply, [
+                lambda: self.power_supply.set_measure_scalar_energy_state(1, affected_channel),
+                lambda: self.power_supply.set_output_channel(selected_channel)], "ps")
             sender.setText("Deactivate")
             sender.isActivated = True
-        self.send_command(lambda: self.power_supply.set_output_channel(selected_channel), "ps")
 
     def set_easyramp_state(self, affected_channel, selected_channel):
         sender = self.sender()
         if sender.isActivated:
-            self.send_command(lambda: self.power_supply.set_source_voltage_ramp_state(0, affected_channel), "ps")
+            self.send_batch(self.power_supply, [
+                lambda: self.power_supply.set_source_voltage_ramp_state(0, affected_channel),
+                lambda: self.power_supply.set_output_channel(selected_channel)], "ps")
             sender.setText("Activate")
             sender.isActivated = False
         else:
-            self.send_command(lambda: self.power_supply.set_source_voltage_ramp_state(1, affected_channel), "ps")
+            self.send_batch(self.power_supply, [
+                lambda: self.power_supply.set_source_voltage_ramp_state(1, affected_channel),
+                lambda: self.power_supply.set_output_channel(selected_channel)], "ps")
             sender.setText("Deactivate")
             sender.isActivated = True
-        self.send_command(lambda: self.power_supply.set_output_channel(selected_channel), "ps")
 
     def setup_channel_ainput(self, ainput_unit, ainput_mode, affected_channel, selected_channel):
         sender = self.sender()
         if sender.isActivated:
-            self.send_command(lambda: self.power_supply.set_source_voltage_ainput_state(0, affected_channel), "ps")
+            self.send_batch(self.power_supply, [
+                lambda: self.power_supply.set_source_voltage_ainput_state(0, affected_channel),
+                lambda: self.power_supply.set_output_channel(selected_channel)], "ps")
             sender.setText("Activate")
             sender.isActivated = False
         else:
@@ -1208,113 +1867,140 @@ class Application(QWidget):
                     "STEP threshold", "Set the threshold for the Analog In mode STEP of channel "
                                       + affected_channel + "(0V to 10V)")
                 if was_success:
-                    self.send_command(lambda: self.power_supply.set_source_voltage_ainput_mode(ainput_mode), "ps")
-                    self.send_command(lambda: self.power_supply.set_source_voltage_ainput_input(ainput_unit), "ps")
-                    self.send_command(lambda: self.power_supply.set_source_voltage_ainput_threshold(user_input), "ps")
-                    self.send_command(lambda:
-                                      self.power_supply.set_source_voltage_ainput_state(1, affected_channel), "ps")
+                    self.send_batch(self.power_supply, [
+                        lambda: self.power_supply.set_source_voltage_ainput_mode(ainput_mode),
+                        lambda: self.power_supply.set_source_voltage_ainput_input(ainput_unit),
+                        lambda: self.power_supply.set_source_voltage_ainput_threshold(user_input),
+                        lambda: self.power_supply.set_source_voltage_ainput_state(1, affected_channel),
+                        lambda: self.power_supply.set_output_channel(selected_channel)], "ps")
                     sender.setText("Deactivate")
                     sender.isActivated = True
+                else:
+                    self.send_command(lambda: self.power_supply.set_output_channel(selected_channel), "ps")
             else:
-                self.send_command(lambda: self.power_supply.set_source_voltage_ainput_mode(ainput_mode), "ps")
-                self.send_command(lambda: self.power_supply.set_source_voltage_ainput_input(ainput_unit), "ps")
-                self.send_command(lambda: self.power_supply.set_source_voltage_ainput_state(1, affected_channel), "ps")
+                self.send_batch(self.power_supply, [
+                    lambda: self.power_supply.set_source_voltage_ainput_mode(ainput_mode),
+                    lambda: self.power_supply.set_source_voltage_ainput_input(ainput_unit),
+                    lambda: self.power_supply.set_source_voltage_ainput_state(1, affected_channel),
+                    lambda: self.power_supply.set_output_channel(selected_channel)], "ps")
                 sender.setText("Deactivate")
                 sender.isActivated = True
-        self.send_command(lambda: self.power_supply.set_output_channel(selected_channel), "ps")
 
     def change_ovp_mode(self, affected_channel, selected_channel):
-        self.send_command(lambda: self.power_supply.set_source_voltage_protection_mode(
-            self.sender().itemData(self.sender().currentIndex()), affected_channel), "ps")
-        self.send_command(lambda: self.power_supply.set_output_channel(selected_channel), "ps")
+        mode = self.sender().itemData(self.sender().currentIndex())
+        self.send_batch(self.power_supply, [
+            lambda: self.power_supply.set_source_voltage_protection_mode(mode, affected_channel),
+            lambda: self.power_supply.set_output_channel(selected_channel)], "ps")
 
     def change_opp_state(self, affected_channel, selected_channel):
         state = self.sender().checkState()
         if state == Qt.Checked:
-            self.send_command(lambda: self.power_supply.set_source_power_protection_state(1, affected_channel), "ps")
+            self.send_batch(self.power_supply, [
+                lambda: self.power_supply.set_source_power_protection_state(1, affected_channel),
+                lambda: self.power_supply.set_output_channel(selected_channel)], "ps")
         elif state == Qt.Unchecked:
-            self.send_command(lambda: self.power_supply.set_source_power_protection_state(0, affected_channel), "ps")
-        self.send_command(lambda: self.power_supply.set_output_channel(selected_channel), "ps")
+            self.send_batch(self.power_supply, [
+                lambda: self.power_supply.set_source_power_protection_state(0, affected_channel),
+                lambda: self.power_supply.set_output_channel(selected_channel)], "ps")
 
     def change_opp_value(self, affected_channel, selected_channel):
         pow_value = round(self.sender().value(), 2)
-        self.send_command(
-            lambda: self.power_supply.set_source_power_protection_level(pow_value, affected_channel), "ps")
-        self.send_command(lambda: self.power_supply.set_output_channel(selected_channel), "ps")
+        self.send_batch(self.power_supply, [
+            lambda: self.power_supply.set_source_power_protection_level(pow_value, affected_channel),
+            lambda: self.power_supply.set_output_channel(selected_channel)], "ps", ("opp", affected_channel))
 
     def change_ovp_state(self, affected_channel, selected_channel):
         state = self.sender().checkState()
         if state == Qt.Checked:
-            self.send_command(lambda: self.power_supply.set_source_voltage_protection_state(1, affected_channel), "ps")
+            self.send_batch(self.power_supply, [
+                lambda: self.power_supply.set_source_voltage_protection_state(1, affected_channel),
+                lambda: self.power_supply.set_output_channel(selected_channel)], "ps")
         elif state == Qt.Unchecked:
-            self.send_command(lambda: self.power_supply.set_source_voltage_protection_state(0, affected_channel), "ps")
-        self.send_command(lambda: self.power_supply.set_output_channel(selected_channel), "ps")
+            self.send_batch(self.power_supply, [
+                lambda: self.power_supply.set_source_voltage_protection_state(0, affected_channel),
+                lambda: self.power_supply.set_output_channel(selected_channel)], "ps")
 
     def change_ovp_value(self, affected_channel, selected_channel):
         volt_value = round(self.sender().value(), 3)
-        self.send_command(
-            lambda: self.power_supply.set_source_voltage_protection_level(volt_value, affected_channel), "ps")
-        self.send_command(lambda: self.power_supply.set_output_channel(selected_channel), "ps")
+        self.send_batch(self.power_supply, [
+            lambda: self.power_supply.set_source_voltage_protection_level(volt_value, affected_channel),
+            lambda: self.power_supply.set_output_channel(selected_channel)], "ps", ("ovp", affected_channel))
 
+    # The arrows of the spin boxes send the value they step to instead of stepping on the
+    # instrument (VOLT UP), so quick steps of a channel are coalesced into the latest setpoint
     def change_channel_voltage(self, affected_channel, selected_channel):
-        voltage = round(self.sender().value(), 3)
-        self.send_command(
-            lambda: self.power_supply.set_source_voltage_level_immediate_amplitude(voltage, affected_channel), "ps")
-        self.send_command(lambda: self.power_supply.set_output_channel(selected_channel), "ps")
+        self.set_channel_voltage(self.sender().value(), affected_channel, selected_channel)
 
     def increase_channel_voltage(self, affected_channel, selected_channel):
-        self.send_command(
-            lambda: self.power_supply.vary_source_voltage_level_immediate_amplitude("UP", affected_channel), "ps")
-        self.send_command(lambda: self.power_supply.set_output_channel(selected_channel), "ps")
+        spin_box = self.sender()
+        self.set_channel_voltage(min(spin_box.value() + spin_box.singleStep(), spin_box.maximum()),
+                                 affected_channel, selected_channel)
 
     def decrease_channel_voltage(self, affected_channel, selected_channel):
-        self.send_command(
-            lambda: self.power_supply.vary_source_voltage_level_immediate_amplitude("DOWN", affected_channel), "ps")
-        self.send_command(lambda: self.power_supply.set_output_channel(selected_channel), "ps")
+        spin_box = self.sender()
+        self.set_channel_voltage(max(spin_box.value() - spin_box.singleStep(), spin_box.minimum()),
+                                 affected_channel, selected_channel)
+
+    def set_channel_voltage(self, voltage, affected_channel, selected_channel):
+        voltage = round(voltage, 3)
+        self.send_batch(self.power_supply, [
+            lambda: self.power_supply.set_source_voltage_level_immediate_amplitude(voltage, affected_channel),
+            lambda: self.power_supply.set_output_channel(selected_channel)], "ps", ("voltage", affected_channel))
 
     def volt_step_changed(self):
         step = round(self.sender().value(), 3)
-        self.send_command(lambda: self.power_supply.set_source_voltage_level_step_increment(step), "ps")
+        self.send_command(self.power_supply.set_source_voltage_level_step_increment, "ps", step,
+                          key=("voltage step",))
 
     def change_channel_current(self, affected_channel, selected_channel):
-        current = round(self.sender().value(), 4)
-        self.send_command(
-            lambda: self.power_supply.set_source_current_level_immediate_amplitude(current, affected_channel), "ps")
-        self.send_command(lambda: self.power_supply.set_output_channel(selected_channel), "ps")
+        self.set_channel_current(self.sender().value(), affected_channel, selected_channel)
 
     def increase_channel_current(self, affected_channel, selected_channel):
-        self.send_command(
-            lambda: self.power_supply.vary_source_current_level_immediate_amplitude("UP", affected_channel), "ps")
-        self.send_command(lambda: self.power_supply.set_output_channel(selected_channel), "ps")
+        spin_box = self.sender()
+        self.set_channel_current(min(spin_box.value() + spin_box.singleStep(), spin_box.maximum()),
+                                 affected_channel, selected_channel)
 
     def decrease_channel_current(self, affected_channel, selected_channel):
-        self.send_command(
-            lambda: self.power_supply.vary_source_current_level_immediate_amplitude("DOWN", affected_channel), "ps")
-        self.send_command(lambda: self.power_supply.set_output_channel(selected_channel), "ps")
+        spin_box = self.sender()
+        self.set_channel_current(max(spin_box.value() - spin_box.singleStep(), spin_box.minimum()),
+                                 affected_channel, selected_channel)
+
+    def set_channel_current(self, current, affected_channel, selected_channel):
+        current = round(current, 4)
+        self.send_batch(self.power_supply, [
+            lambda: self.power_supply.set_source_current_level_immediate_amplitude(current, affected_channel),
+            lambda: self.power_supply.set_output_channel(selected_channel)], "ps", ("current", affected_channel))
 
     def curr_step_changed(self):
         step = round(self.sender().value(), 4)
-        self.send_command(lambda: self.power_supply.set_source_current_level_step_increment(step), "ps")
+        self.send_command(self.power_supply.set_source_current_level_step_increment, "ps", step,
+                          key=("current step",))
 
     def link_unlink_fuse(self, fuse_to_link, fuse_to_be_linked, selected_channel):
         sender = self.sender()
         if sender.isActivated:
-            self.send_command(lambda: self.power_supply.set_output_channel(fuse_to_be_linked), "ps")
-            self.send_command(lambda: self.power_supply.fuse_unlink(fuse_to_link), "ps")
+            self.send_batch(self.power_supply, [
+                lambda: self.power_supply.set_output_channel(fuse_to_be_linked),
+                lambda: self.power_supply.fuse_unlink(fuse_to_link),
+                lambda: self.power_supply.set_output_channel(selected_channel)], "ps")
             sender.setText("Link")
             sender.isActivated = False
         else:
-            self.send_command(lambda: self.power_supply.set_fuse_link(fuse_to_link, fuse_to_be_linked), "ps")
+            self.send_batch(self.power_supply, [
+                lambda: self.power_supply.set_fuse_link(fuse_to_link, fuse_to_be_linked),
+                lambda: self.power_supply.set_output_channel(selected_channel)], "ps")
             sender.setText("Unlink")
             sender.isActivated = True
-        self.send_command(lambda: self.power_supply.set_output_channel(selected_channel), "ps")
 
     def change_fuse_state(self, state, channel, selected_channel):
         if state == Qt.Checked:
-            self.send_command(lambda: self.power_supply.set_fuse_state(1, channel), "ps")
+            self.send_batch(self.power_supply, [
+                lambda: self.power_supply.set_fuse_state(1, channel),
+                lambda: self.power_supply.set_output_channel(selected_channel)], "ps")
         elif state == Qt.Unchecked:
-            self.send_command(lambda: self.power_supply.set_fuse_state(0, channel), "ps")
-        self.send_command(lambda: self.power_supply.set_output_channel(selected_channel), "ps")
+            self.send_batch(self.power_supply, [
+                lambda: self.power_supply.set_fuse_state(0, channel),
+                lambda: self.power_supply.set_output_channel(selected_channel)], "ps")
 
     def set_fuse_delay(self, fuse_number, selected_channel):
         fuse_number = str(fuse_number)
@@ -1322,10 +2008,12 @@ class Application(QWidget):
                                                                                                          "empty)")
         if was_success:
             if user_input.isspace() or not user_input:
-                self.send_command(lambda: self.power_supply.set_fuse_delay("MIN", "OUT" + fuse_number), "ps")
+                delay = "MIN"
             else:
-                self.send_command(lambda: self.power_supply.set_fuse_delay(user_input, "OUT" + fuse_number), "ps")
-            self.send_command(lambda: self.power_supply.set_output_channel(selected_channel), "ps")
+                delay = user_input
+            self.send_batch(self.power_supply, [
+                lambda: self.power_supply.set_fuse_delay(delay, "OUT" + fuse_number),
+                lambda: self.power_supply.set_output_channel(selected_channel)], "ps")
 
     def add_HMC8012_tab(self):
         self.multimeter_tab = QWidget()
@@ -1449,11 +2137,151 @@ class Application(QWidget):
         activate_statistic_function.clicked.connect(lambda: self.send_command(statistic_function.currentData(), "m"))
         function_box_layout.addWidget(activate_statistic_function, 2, 2)
 
+        data_log_box = QGroupBox("Data logging")
+        data_log_box_layout = QGridLayout()
+        data_log_box_layout.addWidget(QLabel("Interval:"), 0, 0)
+        data_log_interval = QDoubleSpinBox()
+        data_log_interval.setSuffix(" s")
+        data_log_interval.setMinimum(0.1)
+        data_log_interval.setMaximum(3600)
+        data_log_box_layout.addWidget(data_log_interval, 0, 1)
+        data_log_box_layout.addWidget(QLabel("Count:"), 0, 2)
+        data_log_count = QSpinBox()
+        data_log_count.setMinimum(1)
+        data_log_count.setMaximum(50000)
+        data_log_count.setValue(1000)
+        data_log_box_layout.addWidget(data_log_count, 0, 3)
+
+        start_data_log_button = QPushButton("Start")
+        start_data_log_button.clicked.connect(lambda: self.start_data_log(data_log_interval.value(),
+                                                                          data_log_count.value()))
+        data_log_box_layout.addWidget(start_data_log_button, 1, 1)
+        stop_data_log_button = QPushButton("Stop")
+        stop_data_log_button.clicked.connect(
+            lambda: self.send_command(lambda: self.multimeter.set_data_log_state('OFF'), "m"))
+        data_log_box_layout.addWidget(stop_data_log_button, 1, 2)
+        fetch_data_log_button = QPushButton("Fetch && Save")
+        fetch_data_log_button.clicked.connect(self.fetch_data_log)
+        data_log_box_layout.addWidget(fetch_data_log_button, 1, 3)
+
+        data_log_box.setLayout(data_log_box_layout)
+        device_tab_layout.addWidget(data_log_box, 3, 0, 1, 2)
+
+        device_tab_layout.addWidget(self.make_monitoring_box("m"), 4, 0, 1, 2)
+
         self.switch_tab_bar()
 
         self.multimeter_tab.setLayout(device_tab_layout)
         self.tab_bar.addTab(self.multimeter_tab, "HMC8012")
 
+    def make_monitoring_box(self, caller):
+        monitoring_box = QGroupBox("Monitoring")
+        monitoring_box_layout = QGridLayout()
+        monitoring_box_layout.addWidget(QLabel("Interval:"), 0, 0)
+        polling_interval = QDoubleSpinBox()
+        polling_interval.setSuffix(" s")
+        polling_interval.setDecimals(3)
+        polling_interval.setMaximum(60)
+        polling_interval.setValue(0.1)
+        polling_interval.setToolTip("0 s samples as fast as the instrument answers")
+        monitoring_box_layout.addWidget(polling_interval, 0, 1)
+
+        polling_button = ButtonWithSwitch()
+        polling_button.setText("Start")
+        polling_button.clicked.connect(lambda: self.toggle_polling(caller, polling_interval.value()))
+        monitoring_box_layout.addWidget(polling_button, 0, 2)
+
+        self.telemetry_labels[caller] = QLabel()
+        monitoring_box_layout.addWidget(self.telemetry_labels[caller], 1, 0, 1, 3)
+        monitoring_box.setLayout(monitoring_box_layout)
+        return monitoring_box
+
+    def toggle_polling(self, caller, interval):
+        sender = self.sender()
+        if sender.isActivated:
+            self.stop_polling(caller)
+            sender.setText("Start")
+            sender.isActivated = False
+        else:
+            if caller == "ps":
+                sample, width = power_supply_sampler(self.power_supply)
+            else:
+                sample, width = multimeter_sampler(self.multimeter)
+            poller = TelemetryPoller(sample, width, interval, parent=self)
+            poller.samplesReady.connect(lambda timestamps, values: self.show_telemetry(caller, timestamps, values))
+            poller.samplingFailed.connect(lambda error: self.polling_failed(caller, poller, sender, error))
+            self.pollers[caller] = poller
+            poller.start()
+            sender.setText("Stop")
+            sender.isActivated = True
+
+    def polling_failed(self, caller, poller, button, error):
+        # The poller thread ended, it is dropped and its button offers to start polling again
+        if self.pollers.get(caller) is poller:
+            self.stop_polling(caller)
+            button.setText("Start")
+            button.isActivated = False
+        self.handle_error(error)
+
+    def stop_polling(self, caller):
+        poller = self.pollers.pop(caller, None)
+        if poller is not None:
+            poller.stop()
+
+    def show_telemetry(self, caller, timestamps, values):
+        label = self.telemetry_labels.get(caller)
+        poller = self.pollers.get(caller)
+        if label is None or poller is None or not len(values):
+            return
+        rate = len(values) / max(timestamps[-1] - timestamps[0], poller.publish_interval)
+        lines = []
+        if caller == "ps":
+            fields = values[-1].reshape(self.power_supply.channels, -1)
+            for channel, row in enumerate(fields, 1):
+                lines.append("CH" + str(channel) + ": " + format(row[2], ".4f") + " V   " + format(row[3], ".5f") +
+                             " A   " + format(row[4], ".4f") + " W")
+        else:
+            lines.append("Reading: " + format(values[-1][0], ".6g") + "   mean of last " + str(len(values)) + ": " +
+                         format(values[:, 0].mean(), ".6g"))
+        lines.append(str(poller.buffer.count) + " samples, " + format(rate, ".1f") + " samples/s")
+        label.setText("\n".join(lines))
+
+    def start_data_log(self, interval, count):
+        self.workers["m"].submit(lambda: self.multimeter.start_data_log(round(interval, 1), count),
+                                 self.data_log_started)
+
+    def data_log_started(self, results):
+        if isinstance(results, Exception):
+            self.handle_error(str(results))
+            return
+        for res in results:
+            if res[0] is not True:
+                self.handle_error(res[2])
+                return
+        self.multimeter_output_area.setText("data logging started")
+
+    def fetch_data_log(self):
+        self.workers["m"].submit(self.multimeter.download_data_log, self.save_data_log)
+
+    def save_data_log(self, res):
+        if isinstance(res, Exception):
+            self.handle_error(str(res))
+            return
+        if res[0] is not True:
+            self.handle_error(res[2])
+            return
+        readings = res.value
+        with open('../datalog_from_' + datetime.now().strftime("%d.%m.%Y-%H.%M.%S") + '.csv', 'w',
+                  newline='') as log_file:
+            log_writer = csv.writer(log_file, delimiter=';')
+            for index, reading in enumerate(readings):
+                log_writer.writerow([index, reading])
+        if len(readings):
+            self.multimeter_output_area.setText(str(len(readings)) + " readings saved, mean " +
+                                                format(readings.mean(), ".6g"))
+        else:
+            self.multimeter_output_area.setText("data log is empty")
+
     def activate_calc_function(self):
         sender = self.sender()
         if sender.isActivated:
@@ -1489,7 +2317,7 @@ class Application(QWidget):
                     sender.blockSignals(True)
                     sender.setCurrentIndex(last)
                     sender.blockSignals(False)
-            self.send_command(lambda: self.multimeter.set_calculate_function(sender.currentText()), "m")
+            self.send_command(self.multimeter.set_calculate_function, "m", sender.currentText())
 
     def configure_multimeter_measurements(self, last, new):
         sender = self.sender()
@@ -1528,37 +2356,73 @@ class Application(QWidget):
         return cmds_list, cmds_box
 
     def get_device_options(self):
-        devices = {}
+        devices = self.discovery_cache.devices()
+        if devices.get("LowNoise") is not None:
+            return devices
         user_input, was_success = self.get_user_input("pySerial device address input", "Enter address for LowNoise, "
                                                                                        "if connected")
         if was_success:
-            try:
-                ser = serial.Serial(
-                    port=user_input,
-                    baudrate=115200,
-                    bytesize=EIGHTBITS,
-                    parity=PARITY_NONE,
-                    stopbits=STOPBITS_ONE
-                )
-                ser.close()
+            if probe_serial(user_input):
                 devices["LowNoise"] = user_input
-            except serial.SerialException:
+                self.discovery_cache.serial_ports[user_input] = "LowNoise"
+            else:
                 self.handle_error("Device address is invalid")
-        rm = pyvisa.ResourceManager('@py')
-        resources = rm.list_resources()
-        for res in resources:
-            try:
-                inst = rm.open_resource(res)
-                idn = inst.query("*IDN?").split(",")[1]
-                devices[idn] = res
-                inst.close()
-            except pyvisa.VisaIOError:
-                pass
-        rm.close()
         return devices
 
+    def start_device_discovery(self):
+        self.discovery_thread = DiscoveryThread(DeviceDiscovery(), self.discovery_cache.resources,
+                                                self.discovery_cache.serial_ports, self)
+        self.discovery_thread.deviceFound.connect(self.add_device_option)
+        self.discovery_thread.deviceLost.connect(self.remove_device_option)
+        self.discovery_thread.finished.connect(self.discovery_cache.save)
+        self.discovery_thread.start()
+
+    def add_device_option(self, model, resource, elapsed):
+        self.probe_times[resource] = elapsed
+        self.discovery_cache.resources[resource] = model
+        for menu in (self.powersupply_menu, self.multimeter_menu):
+            index = menu.findText(model)
+            if index == -1:
+                was_selected = menu.currentIndex() != -1
+                menu.addItem(model)
+                index = menu.count() - 1
+                if not was_selected:
+                    menu.setCurrentIndex(-1)
+            menu.setItemData(index, resource + " (" + str(round(elapsed * 1000)) + " ms)", Qt.ToolTipRole)
+        self.device_options[model] = resource
+
+    def is_device_connected(self, address):
+        for model, model_address in self.device_options.items():
+            if model_address == address and (
+                    (self.is_power_supply_connected and self.powersupply_menu.currentText() == model) or
+                    (self.is_multimeter_connected and self.multimeter_menu.currentText() == model)):
+                return True
+        measured_power_supply = getattr(self.measured_power_supply, "address", None)
+        return address == measured_power_supply or address in self.measured_multimeters
+
+    def remove_device_option(self, address):
+        # Evicts a cached device that did not answer, unless it is connected at the moment (it may
+        # just be busy answering the application)
+        if self.is_device_connected(address):
+            return
+        self.discovery_cache.resources.pop(address, None)
+        self.discovery_cache.serial_ports.pop(address, None)
+        for model, model_address in list(self.device_options.items()):
+            if model_address != address:
+                continue
+            del self.device_options[model]
+            for menu in (self.powersupply_menu, self.multimeter_menu):
+                index = menu.findText(model)
+                if index != -1:
+                    menu.removeItem(index)
+
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--capture", metavar="LOG", help="record the SCPI and serial traffic into a traffic log")
+    options = parser.parse_args()
+    if options.capture:
+        capture(TrafficLog(options.capture))
     app = QApplication([])
     ex = Application()
     ex.show()
@@ -0,0 +1,97 @@
+import asyncio
+import functools
+
+from driver import InstrumentDriver
+from multimeter_HMC8012 import DigitalMultimeterHMC8012
+from powersupply_HMC804x import PowerSupplyHMC804x
+
+
+class AsyncInstrumentDriver:
+    # Awaitable wrapper of a blocking instrument driver, PyVISA calls run in an executor.
+    # Calls to one instrument are serialized by its lock, calls to different instruments
+    # overlap, e.g.:
+    #  power_supply = await AsyncPowerSupplyHMC804x.open(power_supply_address)
+    #  multimeter = await AsyncDigitalMultimeterHMC8012.open(multimeter_address)
+    #  await asyncio.gather(power_supply.set_source_voltage_level_immediate_amplitude(1.5, "OUT1"),
+    #                       multimeter.measure_current_dc())
+
+    driver_class = InstrumentDriver
+
+    def __init__(self, driver, executor=None):
+        self.driver = driver
+        self.executor = executor
+        self.lock = asyncio.Lock()
+
+    @classmethod
+    async def open(cls, address, executor=None):
+        loop = asyncio.get_running_loop()
+        driver = await loop.run_in_executor(executor, cls.driver_class, address)
+        return cls(driver, executor)
+
+    @property
+    def idn(self):
+        return self.driver.idn
+
+    async def run(self, func, *args, **kwargs):
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The lock is held until the instrument finished the command already sent
+                await asyncio.wait([future])
+                raise
+
+    async def batch(self, funcs):
+        # Sends the calls made by funcs as one batch transaction and returns their results
+        def send():
+            with self.driver.batch() as transaction:
+                for func in funcs:
+                    func(self.driver)
+            return transaction.results
+        return await self.run(send)
+
+    async def close(self):
+        await self.run(self.driver.close)
+
+
+def async_command(name):
+    async def command(self, *args, **kwargs):
+        return await self.run(getattr(self.driver, name), *args, **kwargs)
+    command.__name__ = name
+    return command
+
+
+def async_generator(name):
+    # Async generator of a driver generator (e.g. acquire), every item is taken in the executor
+    async def generator(self, *args, **kwargs):
+        items = getattr(self.driver, name)(*args, **kwargs)
+        while True:
+            item = await self.run(next, items, None)
+            if item is None:
+                return
+            yield item
+    generator.__name__ = name
+    return generator
+
+
+def make_async_driver(driver_class, helpers=(), generators=()):
+    # Creates the awaitable counterpart of every exception_handler decorated method and of the
+    # undecorated helpers (e.g. upload_arb), generators become async generators. The service request
+    # methods of InstrumentDriver stay synchronous: waiting for one would block the other calls
+    namespace = {"driver_class": driver_class}
+    for name in dir(driver_class):
+        attribute = getattr(driver_class, name)
+        if callable(attribute) and hasattr(attribute, "__wrapped__"):
+            namespace[name] = async_command(name)
+    for name in helpers:
+        namespace[name] = async_command(name)
+    for name in generators:
+        namespace[name] = async_generator(name)
+    return type("Async" + driver_class.__name__, (AsyncInstrumentDriver,), namespace)
+
+
+AsyncPowerSupplyHMC804x = make_async_driver(PowerSupplyHMC804x, helpers=("upload_arb",))
+AsyncDigitalMultimeterHMC8012 = make_async_driver(DigitalMultimeterHMC8012, helpers=("start_data_log",),
+                                                  generators=("acquire",))
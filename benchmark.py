@@ -0,0 +1,331 @@
+import argparse
+import asyncio
+import inspect
+import json
+import statistics
+import subprocess
+import time
+
+from async_driver import AsyncDigitalMultimeterHMC8012, AsyncPowerSupplyHMC804x
+from emulator import Emulator
+from multimeter_HMC8012 import DigitalMultimeterHMC8012
+from powersupply_HMC804x import PowerSupplyHMC804x
+from sweep import SweepEngine
+
+
+class CountingResource:
+    # Wraps a PyVISA resource and counts the messages and bytes exchanged with the instrument
+
+    def __init__(self, resource):
+        self.resource = resource
+        self.reset()
+
+    def reset(self):
+        self.messages = 0
+        self.responses = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+
+    def counters(self):
+        return {"messages": self.messages, "responses": self.responses, "bytes_written": self.bytes_written,
+                "bytes_read": self.bytes_read}
+
+    def write(self, message):
+        self.messages += 1
+        self.bytes_written += len(message) + 1
+        return self.resource.write(message)
+
+    def write_raw(self, message):
+        self.messages += 1
+        self.bytes_written += len(message)
+        return self.resource.write_raw(message)
+
+    def read(self):
+        response = self.resource.read()
+        self.responses += 1
+        self.bytes_read += len(response) + 1
+        return response
+
+    def query(self, message):
+        self.write(message)
+        return self.read()
+
+    def __getattr__(self, name):
+        return getattr(self.resource, name)
+
+
+def attach_counter(driver):
+    counter = CountingResource(driver.manager)
+    driver.manager = counter
+    return counter
+
+
+def required_parameters(method):
+    # Parameters of the method besides self without default value
+    parameters = list(inspect.signature(method.__wrapped__).parameters.values())[1:]
+    return [parameter.name for parameter in parameters
+            if parameter.default is inspect.Parameter.empty and
+            parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD, parameter.KEYWORD_ONLY)]
+
+
+# Representative arguments of methods whose defaults do not reflect their typical use, or which
+# need arguments; the same arguments are sent on every call
+METHOD_ARGUMENTS = {"set_output_channel": ("OUT2",),
+                    "set_output_channel_state": (0, "OUT2"),
+                    "set_source_voltage_level_immediate_amplitude": (1.5, "OUT2"),
+                    "set_source_current_level_immediate_amplitude": (0.1, "OUT2"),
+                    "set_arb_data": ([(1.0, 0.1, 0.01), (2.0, 0.1, 0.01)],),
+                    "configure": ("CURR:DC", "AUTO")}
+
+
+def driver_methods(driver):
+    # Public exception_handler decorated methods of the driver with the arguments to call them with,
+    # methods needing arguments without an entry in METHOD_ARGUMENTS are left out
+    methods = []
+    for name in dir(type(driver)):
+        attribute = getattr(type(driver), name)
+        if name.startswith("_") or not callable(attribute) or not hasattr(attribute, "__wrapped__"):
+            continue
+        if name in METHOD_ARGUMENTS:
+            methods.append((name, METHOD_ARGUMENTS[name]))
+        elif not required_parameters(attribute):
+            methods.append((name, ()))
+    return methods
+
+
+def summary(durations):
+    durations = sorted(durations)
+    return {"calls": len(durations),
+            "min_ms": durations[0] * 1000,
+            "median_ms": statistics.median(durations) * 1000,
+            "mean_ms": statistics.fmean(durations) * 1000,
+            "max_ms": durations[-1] * 1000}
+
+
+def measure(func, counter, repeat):
+    # Times repeat calls of func and counts the messages of one call
+    durations = []
+    counter.reset()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    result = summary(durations)
+    for name, value in counter.counters().items():
+        result[name + "_per_call"] = value / repeat
+    return result
+
+
+def benchmark_methods(driver, counter, repeat, exclude=()):
+    results = {}
+    for name, arguments in driver_methods(driver):
+        if name in exclude:
+            continue
+        method = getattr(driver, name)
+        results[name] = measure(lambda: method(*arguments), counter, repeat)
+    return results
+
+
+# GUI actions of the HMC8043 tab, sending the same commands as the Application handlers
+def change_channel_voltage(power_supply):
+    with power_supply.batch():
+        power_supply.set_source_voltage_level_immediate_amplitude(1.0, "OUT2")
+        power_supply.set_output_channel("OUT1")
+
+
+def increase_channel_voltage(power_supply):
+    with power_supply.batch():
+        power_supply.vary_source_voltage_level_immediate_amplitude("UP", "OUT2")
+        power_supply.set_output_channel("OUT1")
+
+
+def change_channel_current(power_supply):
+    with power_supply.batch():
+        power_supply.set_source_current_level_immediate_amplitude(0.1, "OUT2")
+        power_supply.set_output_channel("OUT1")
+
+
+def change_ovp_state(power_supply):
+    with power_supply.batch():
+        power_supply.set_source_voltage_protection_state(1, "OUT2")
+        power_supply.set_source_voltage_protection_level(32, "OUT2")
+        power_supply.set_output_channel("OUT1")
+
+
+def set_energy_meter_state(power_supply):
+    with power_supply.batch():
+        power_supply.set_measure_scalar_energy_state(1, "OUT2")
+        power_supply.set_output_channel("OUT1")
+
+
+def change_fuse_state(power_supply):
+    with power_supply.batch():
+        power_supply.set_fuse_state(0, "OUT2")
+        power_supply.set_output_channel("OUT1")
+
+
+OPERATIONS = {
+    "change_channel_voltage": change_channel_voltage,
+    "increase_channel_voltage": increase_channel_voltage,
+    "change_channel_current": change_channel_current,
+    "change_ovp_state": change_ovp_state,
+    "set_energy_meter_state": set_energy_meter_state,
+    "change_fuse_state": change_fuse_state,
+}
+
+
+def benchmark_operations(power_supply, counter, repeat):
+    results = {}
+    for name, operation in OPERATIONS.items():
+        results[name] = measure(lambda: operation(power_supply), counter, repeat)
+    return results
+
+
+def sweep(power_supply, multimeter, channel, voltage_list, delay):
+    # The sweep of Application.measure_characteristic without plotting and file output
+    engine = SweepEngine(power_supply, multimeter, channel, voltage_list, delay)
+    points = []
+    engine.subscribe(points.append)
+    engine.run()
+    return [(point.setpoint, point.reading) for point in points]
+
+
+def benchmark_sweep(power_supply, multimeter, counters, points, delay, channel="OUT1"):
+    voltage_list = [round(0.5 + 0.3 * index / max(points - 1, 1), 3) for index in range(points)]
+    for counter in counters:
+        counter.reset()
+    start = time.perf_counter()
+    sweep(power_supply, multimeter, channel, voltage_list, delay)
+    elapsed = time.perf_counter() - start
+    messages = sum(counter.messages for counter in counters)
+    return {"points": points,
+            "delay_s": delay,
+            "elapsed_s": elapsed,
+            "points_per_s": points / elapsed,
+            "overhead_per_point_ms": (elapsed / points - delay) * 1000,
+            "messages": messages,
+            "messages_per_point": messages / points}
+
+
+def benchmark_concurrent(power_supply, multimeter, repeat):
+    # Snapshot of the power supply with a multimeter reading, one after the other and overlapped by
+    # the asyncio layer; overlapped takes about the longer of both calls
+    async def overlapped():
+        async_power_supply = AsyncPowerSupplyHMC804x(power_supply)
+        async_multimeter = AsyncDigitalMultimeterHMC8012(multimeter)
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await asyncio.gather(async_power_supply.snapshot(), async_multimeter.read())
+            durations.append(time.perf_counter() - start)
+        return summary(durations)
+
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        power_supply.snapshot()
+        multimeter.read()
+        durations.append(time.perf_counter() - start)
+    return {"sequential": summary(durations), "overlapped": asyncio.run(overlapped())}
+
+
+def version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(power_supply_address, multimeter_address, repeat=20, points=50, delay=0.0, exclude=()):
+    power_supply = PowerSupplyHMC804x(power_supply_address)
+    multimeter = DigitalMultimeterHMC8012(multimeter_address)
+    power_supply_counter = attach_counter(power_supply)
+    multimeter_counter = attach_counter(multimeter)
+    try:
+        return {"version": version(),
+                "timestamp": time.time(),
+                "power_supply": {"address": power_supply_address, "idn": power_supply.idn},
+                "multimeter": {"address": multimeter_address, "idn": multimeter.idn},
+                "methods": {
+                    "PowerSupplyHMC804x": benchmark_methods(power_supply, power_supply_counter, repeat, exclude),
+                    "DigitalMultimeterHMC8012": benchmark_methods(multimeter, multimeter_counter, repeat,
+                                                                  exclude)},
+                "operations": benchmark_operations(power_supply, power_supply_counter, repeat),
+                "concurrent": benchmark_concurrent(power_supply, multimeter, repeat),
+                "sweep": benchmark_sweep(power_supply, multimeter, (power_supply_counter, multimeter_counter),
+                                         points, delay)}
+    finally:
+        power_supply.close()
+        multimeter.close()
+
+
+def compare(baseline, current, threshold=0.1):
+    # Lists the timings and message counts of current which got worse than baseline by more than threshold
+    regressions = []
+
+    def check(path, old, new):
+        for key in ("median_ms", "messages_per_call", "messages_per_point", "overhead_per_point_ms"):
+            if key in old and key in new and new[key] > old[key] * (1 + threshold) and new[key] - old[key] > 1e-9:
+                regressions.append((path + "." + key, old[key], new[key]))
+
+    for driver_name, methods in current.get("methods", {}).items():
+        for name, result in methods.items():
+            old = baseline.get("methods", {}).get(driver_name, {}).get(name)
+            if old is not None:
+                check(driver_name + "." + name, old, result)
+    for group in ("operations", "concurrent"):
+        for name, result in current.get(group, {}).items():
+            old = baseline.get(group, {}).get(name)
+            if old is not None:
+                check(name if group == "operations" else group + "." + name, old, result)
+    if "sweep" in baseline and "sweep" in current:
+        check("sweep", baseline["sweep"], current["sweep"])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the instrument drivers, writes the results as JSON")
+    parser.add_argument("--power-supply", help="VISA address of the HMC804x, the emulator is used if not given")
+    parser.add_argument("--multimeter", help="VISA address of the HMC8012, the emulator is used if not given")
+    parser.add_argument("--latency", type=float, default=0.0, help="emulator delay per command in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="emulator delay variation in seconds")
+    parser.add_argument("--measurement-timing", action="store_true", help="emulate the multimeter reading times")
+    parser.add_argument("--repeat", type=int, default=20, help="calls per method and operation")
+    parser.add_argument("--points", type=int, default=50, help="points of the characteristic sweep")
+    parser.add_argument("--delay", type=float, default=0.0, help="settling delay per sweep point in seconds")
+    parser.add_argument("--exclude", action="append", default=[], help="method not to benchmark, e.g. rst")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON results to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as regression")
+    options = parser.parse_args()
+
+    emulator = None
+    if options.power_supply is None or options.multimeter is None:
+        emulator = Emulator(latency=options.latency, jitter=options.jitter, seed=0, low_noise=False,
+                            measurement_timing=options.measurement_timing).start()
+    try:
+        results = run(options.power_supply or emulator.devices["HMC8043"],
+                      options.multimeter or emulator.devices["HMC8012"],
+                      options.repeat, options.points, options.delay, options.exclude)
+    finally:
+        if emulator is not None:
+            emulator.stop()
+    results["backend"] = "emulator" if emulator is not None else "instruments"
+    with open(options.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print("Sweep: " + format(results["sweep"]["points_per_s"], ".1f") + " points/s, " +
+          format(results["sweep"]["messages_per_point"], ".2f") + " messages/point")
+
+    if options.compare:
+        with open(options.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, results, options.threshold)
+        for path, old, new in regressions:
+            print(path + ": " + format(old, ".3f") + " -> " + format(new, ".3f"))
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pyvisa
+import serial
+from serial import EIGHTBITS, PARITY_NONE, STOPBITS_ONE
+
+from driver import open_instrument
+
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".measuring_app_devices.json")
+
+
+def probe_serial(port):
+    # Returns True if the serial port of a LowNoise power supply can be opened
+    try:
+        ser = serial.Serial(
+            port=port,
+            baudrate=115200,
+            bytesize=EIGHTBITS,
+            parity=PARITY_NONE,
+            stopbits=STOPBITS_ONE
+        )
+        ser.close()
+        return True
+    except (serial.SerialException, ValueError):
+        return False
+
+
+class DiscoveryCache:
+    # Remembers VISA resources with their IDN model names and serial ports with their device
+    # types between application runs, so the device menus can be filled before any probe
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.resources = {}
+        self.serial_ports = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as cache_file:
+                content = json.load(cache_file)
+            self.resources = dict(content.get("resources", {}))
+            self.serial_ports = dict(content.get("serial_ports", {}))
+        except (OSError, ValueError, AttributeError):
+            self.resources = {}
+            self.serial_ports = {}
+
+    def save(self):
+        temporary_path = self.path + ".tmp"
+        try:
+            with open(temporary_path, "w") as cache_file:
+                json.dump({"resources": self.resources, "serial_ports": self.serial_ports}, cache_file, indent=2)
+            os.replace(temporary_path, self.path)
+        except OSError:
+            pass
+
+    def devices(self):
+        # Device name -> address mapping in the form used for the device menus
+        devices = {model: resource for resource, model in self.resources.items()}
+        devices.update({device: port for port, device in self.serial_ports.items()})
+        return devices
+
+    def update(self, result):
+        if result.model is None:
+            self.resources.pop(result.resource, None)
+        else:
+            self.resources[result.resource] = result.model
+
+
+class ProbeResult:
+
+    def __init__(self, resource, model, elapsed, error=None):
+        self.resource = resource
+        self.model = model
+        self.elapsed = elapsed
+        self.error = error
+
+
+class DeviceDiscovery:
+    # Probes VISA resources with *IDN? in a thread pool, every probe is bounded by
+    # probe_timeout (ms) so a slow or hung resource does not hold up the others
+
+    def __init__(self, probe_timeout=500, max_workers=8):
+        self.probe_timeout = probe_timeout
+        self.max_workers = max_workers
+        self.results = []
+
+    def probe(self, rm, resource):
+        start = time.perf_counter()
+        try:
+            inst = open_instrument(rm, resource, open_timeout=self.probe_timeout)
+            try:
+                inst.timeout = self.probe_timeout
+                model = inst.query("*IDN?").split(",")[1]
+            finally:
+                inst.close()
+            return ProbeResult(resource, model, time.perf_counter() - start)
+        except (pyvisa.errors.Error, OSError, ValueError, IndexError) as error:
+            return ProbeResult(resource, None, time.perf_counter() - start, error)
+
+    def run(self, callback, resources=None, known_resources=()):
+        # Calls callback with a ProbeResult of every resource, in the order the probes finish;
+        # known resources (e.g. from the cache) are probed before the bus is even listed
+        rm = pyvisa.ResourceManager('@py')
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(self.probe, rm, resource) for resource in known_resources]
+                if resources is None:
+                    resources = rm.list_resources()
+                futures += [executor.submit(self.probe, rm, resource) for resource in resources
+                            if resource not in known_resources]
+                for future in as_completed(futures):
+                    result = future.result()
+                    self.results.append(result)
+                    callback(result)
+        finally:
+            rm.close()
+        return self.results
@@ -1,33 +1,595 @@
+import bisect
+import functools
+import socket
+import threading
+import time
+
 import pyvisa
 
+TERMINATION = b"\n"
+
+BOOLEAN_VALUES = {"ON": True, "OFF": False}
+
+UNPARSED = object()
+
+# Bits of the status byte (*STB?)
+STB_ERROR_QUEUE = 1 << 2
+STB_QUESTIONABLE = 1 << 3
+STB_MESSAGE_AVAILABLE = 1 << 4
+STB_EVENT_STATUS = 1 << 5
+STB_SERVICE_REQUEST = 1 << 6
+STB_OPERATION = 1 << 7
+
+
+def parse_value(text):
+    # Converts a response to int, float or bool, other responses are returned stripped
+    text = text.strip()
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return BOOLEAN_VALUES.get(text.upper(), text)
+
+
+class InstrumentResult:
+    # Result of a driver call, usable as a (success, kind, text) tuple; the value is parsed
+    # from the response text on first access only
+    __slots__ = ("success", "kind", "text", "unit", "timestamp", "_value")
+
+    def __init__(self, success, kind, text, unit=None):
+        self.success = success
+        self.kind = kind
+        self.text = text
+        self.unit = unit
+        self.timestamp = time.time()
+        self._value = UNPARSED
+
+    @property
+    def value(self):
+        # Parsed query response, None for writes and failed calls; responses decoded by the
+        # driver already (e.g. NumPy arrays of bulk transfers) are returned as they are
+        if self._value is UNPARSED:
+            if self.success and self.kind == "Query":
+                self._value = parse_value(self.text) if isinstance(self.text, str) else self.text
+            else:
+                self._value = None
+        return self._value
+
+    def __getitem__(self, index):
+        return (self.success, self.kind, self.text)[index]
+
+    def __iter__(self):
+        yield self.success
+        yield self.kind
+        yield self.text
+
+    def __len__(self):
+        return 3
+
+    def __eq__(self, other):
+        if isinstance(other, (tuple, InstrumentResult)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return repr(tuple(self))
+
+
+def open_instrument(rm, address, **kwargs):
+    # Opens a VISA session, raw socket resources (e.g. the emulator) need an explicit read termination
+    manager = rm.open_resource(address, **kwargs)
+    manager.write_termination = TERMINATION.decode()
+    if address.upper().endswith("::SOCKET"):
+        manager.read_termination = TERMINATION.decode()
+        set_tcp_nodelay(manager)
+    return manager
+
+
+def set_tcp_nodelay(manager):
+    # Without TCP_NODELAY a query after a write waits for the delayed ACK of the write (~40 ms).
+    # pyvisa-py lists VI_ATTR_TCPIP_NODELAY for sockets but raises setting it, its session socket
+    # is set directly then; replayed sessions (traffic.ReplayResource) have no VISA attributes
+    if getattr(manager, "set_visa_attribute", None) is None:
+        return
+    try:
+        manager.set_visa_attribute(pyvisa.constants.ResourceAttribute.tcpip_nodelay, pyvisa.constants.VI_TRUE)
+        return
+    except Exception:
+        pass
+    session = getattr(manager.visalib, "sessions", {}).get(manager.session)
+    interface = getattr(session, "interface", None)
+    if isinstance(interface, socket.socket):
+        interface.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+# Upper edges of the latency histogram buckets, 8 per decade from 10 us to 100 s
+LATENCY_BUCKETS = tuple(10 ** (exponent / 8) for exponent in range(-40, 17))
+
+
+def message_mnemonic(message):
+    # SCPI headers of a program message without arguments, e.g. b"VOLT 1.5\n" -> "VOLT"
+    if isinstance(message, bytes):
+        message = message.decode("ascii", "replace")
+    return ";".join(unit.strip().split(" ")[0] for unit in message.strip().split(";"))
+
+
+class CommandStatistics:
+    # Counters and a fixed-size latency histogram of one command mnemonic
+    __slots__ = ("count", "failures", "total_time", "bytes_written", "bytes_read", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.failures = 0
+        self.total_time = 0.0
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def record(self, duration, success, bytes_written, bytes_read):
+        self.count += 1
+        if not success:
+            self.failures += 1
+        self.total_time += duration
+        self.bytes_written += bytes_written
+        self.bytes_read += bytes_read
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+
+    def percentile(self, fraction):
+        # Upper edge of the bucket holding the fraction (0 to 1) of the calls, in seconds
+        if self.count == 0:
+            return None
+        rank = fraction * self.count
+        total = 0
+        for index, count in enumerate(self.buckets):
+            total += count
+            if total >= rank and count:
+                return LATENCY_BUCKETS[min(index, len(LATENCY_BUCKETS) - 1)]
+        return LATENCY_BUCKETS[-1]
+
+
+class CommandMetrics:
+    # Latency histograms and counters per command mnemonic of one instrument
+
+    def __init__(self):
+        self.commands = {}
+        self.started = time.monotonic()
+
+    def reset(self):
+        self.commands = {}
+        self.started = time.monotonic()
+
+    def record(self, mnemonic, duration, success, bytes_written, bytes_read=0):
+        statistics = self.commands.get(mnemonic)
+        if statistics is None:
+            statistics = self.commands[mnemonic] = CommandStatistics()
+        statistics.record(duration, success, bytes_written, bytes_read)
+
+    def summary(self):
+        # One row per mnemonic: latency percentiles in seconds, command rate per second and error rate
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        rows = []
+        for mnemonic, statistics in sorted(self.commands.items()):
+            rows.append({"mnemonic": mnemonic,
+                         "count": statistics.count,
+                         "p50": statistics.percentile(0.5),
+                         "p95": statistics.percentile(0.95),
+                         "p99": statistics.percentile(0.99),
+                         "rate": statistics.count / elapsed,
+                         "error_rate": statistics.failures / statistics.count,
+                         "bus_time": statistics.total_time / elapsed,
+                         "bytes_written": statistics.bytes_written,
+                         "bytes_read": statistics.bytes_read})
+        return rows
+
+
+class MeteredResource:
+    # Forwards to a PyVISA resource and records every write and query into CommandMetrics.
+    # A query sent as write followed by read is recorded once, from the write to the response
+    __slots__ = ("resource", "metrics", "pending")
+
+    def __init__(self, resource, metrics):
+        object.__setattr__(self, "resource", resource)
+        object.__setattr__(self, "metrics", metrics)
+        object.__setattr__(self, "pending", None)
+
+    def __getattr__(self, name):
+        return getattr(self.resource, name)
+
+    def __setattr__(self, name, value):
+        if name in MeteredResource.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.resource, name, value)
+
+    def transfer(self, send, message, size):
+        start = time.perf_counter()
+        try:
+            send(message)
+        except pyvisa.VisaIOError:
+            self.metrics.record(message_mnemonic(message), time.perf_counter() - start, False, size)
+            raise
+        if (b"?" if isinstance(message, bytes) else "?") in message:
+            self.pending = message, start, size
+        else:
+            self.metrics.record(message_mnemonic(message), time.perf_counter() - start, True, size)
+
+    def write(self, message):
+        self.transfer(self.resource.write, message, len(message) + 1)
+
+    def write_raw(self, message):
+        self.transfer(self.resource.write_raw, message, len(message))
+
+    def receive(self, read, *args, **kwargs):
+        pending, self.pending = self.pending, None
+        if pending is None:
+            return read(*args, **kwargs)
+        message, start, size = pending
+        try:
+            response = read(*args, **kwargs)
+        except pyvisa.VisaIOError:
+            self.metrics.record(message_mnemonic(message), time.perf_counter() - start, False, size)
+            raise
+        self.metrics.record(message_mnemonic(message), time.perf_counter() - start, True, size, len(response) + 1)
+        return response
+
+    def read(self):
+        return self.receive(self.resource.read)
+
+    def read_binary_values(self, **kwargs):
+        return self.receive(self.resource.read_binary_values, **kwargs)
+
+    def query(self, message):
+        self.write(message)
+        return self.read()
+
+
+def command_unit(func):
+    command = getattr(func, "command", None)
+    if command is None:
+        return None
+    return command.unit
+
+
+def failure_text(func):
+    return func.__doc__ + " failed" + " (" + func.__name__ + ")"
+
 
 def exception_handler(func):
+    # The command kind (Query/Write), unit and failure text are resolved once, when decorating
+    kind = func.__doc__
+    unit = command_unit(func)
+    failure = failure_text(func)
+
+    @functools.wraps(func)
     def inner(*args, **kwargs):
+        # Calls from other threads wait for the call or batch in progress on the instrument
+        with args[0].lock:
+            transaction = args[0].transaction
+            if transaction is not None and not transaction.recording:
+                return transaction.record(func, *args, **kwargs)
+            try:
+                result = func(*args, **kwargs)
+                if result is None:
+                    return InstrumentResult(True, kind, func.__name__)
+                if isinstance(result, (tuple, InstrumentResult)):
+                    if not result[0]:
+                        return InstrumentResult(False, kind, result[2])
+                    return result
+                return InstrumentResult(True, kind, result, unit)
+            except pyvisa.VisaIOError:
+                args[0].invalidate_state()
+                return InstrumentResult(False, kind, failure)
+    return inner
+
+
+class Command:
+    # One row of a driver command table. Every InstrumentDriver subclass listing commands
+    # gets an exception_handler decorated method generated for each row when it is created
+    #  name: name of the generated method
+    #  kind: Query or Write
+    #  mnemonic: SCPI header sent to the instrument
+    #  parameter: default value of the parameter, None if the command takes no parameter
+    #  argument: name of the parameter in the generated method
+    #  channel: the channel (last argument, default OUT1) is selected before sending the command
+    #  formatter: converts the parameter to its SCPI form
+    #  unit: unit of the query response
+
+    def __init__(self, name, kind, mnemonic, parameter=None, argument="parameter", channel=False, formatter=str,
+                 unit=None):
+        self.name = name
+        self.kind = kind
+        self.mnemonic = mnemonic
+        self.parameter = parameter
+        self.argument = argument
+        self.channel = channel
+        self.formatter = formatter
+        self.unit = unit
+
+
+def write_message(manager, message):
+    manager.write_raw(message)
+
+
+def query_message(manager, message):
+    manager.write_raw(message)
+    return manager.read()
+
+
+def command_method(command):
+    # Builds the method sending the command, the message is encoded to bytes beforehand so only
+    # the parameter is formatted per call
+    transfer = query_message if command.kind == "Query" else write_message
+    message = command.mnemonic.encode("ascii") + TERMINATION
+    prefix = command.mnemonic.encode("ascii") + b" "
+    formatter = command.formatter
+    default = command.parameter
+    if command.parameter is None:
+        if command.channel:
+            def method(self, channel='OUT1'):
+                self.select_channel(channel)
+                return transfer(self.manager, message)
+        else:
+            def method(self):
+                return transfer(self.manager, message)
+    else:
+        if command.channel:
+            def method(self, parameter=default, channel='OUT1'):
+                self.select_channel(channel)
+                return transfer(self.manager, prefix + formatter(parameter).encode() + TERMINATION)
+        else:
+            def method(self, parameter=default):
+                return transfer(self.manager, prefix + formatter(parameter).encode() + TERMINATION)
+        if command.argument != "parameter":
+            code = method.__code__
+            method.__code__ = code.replace(co_varnames=tuple(
+                command.argument if name == "parameter" else name for name in code.co_varnames))
+    method.__name__ = method.__qualname__ = command.name
+    method.__doc__ = command.kind
+    method.command = command
+    return method
+
+
+def split_responses(text):
+    # Splits the response to a program message with several queries at the semicolons separating
+    # the responses; semicolons inside quoted strings and definite length blocks (#<n><length><data>)
+    # belong to the response
+    responses, start, index = [], 0, 0
+    while index < len(text):
+        character = text[index]
+        if character == '"':
+            # A quote within a string is doubled, which closes and reopens the string here
+            end = text.find('"', index + 1)
+            index = len(text) if end < 0 else end + 1
+            continue
+        if character == "#" and index == start and text[index + 1:index + 2].isdigit():
+            digits = int(text[index + 1])
+            if digits and text[index + 2:index + 2 + digits].isdigit():
+                index += 2 + digits + int(text[index + 2:index + 2 + digits])
+            else:
+                # Indefinite length block, it ends the response
+                index = len(text)
+            continue
+        if character == ";":
+            responses.append(text[start:index])
+            start = index + 1
+        index += 1
+    responses.append(text[start:])
+    return responses
+
+
+class BatchEntry:
+    # Returned by decorated calls inside a batch in place of their result, usable the same way: once
+    # the transaction is sent, indexing, iterating and value go to the result of the call. Before,
+    # the entry is pending, success and value are None and the text tells it is pending
+    #  with driver.batch():
+    #      entry = driver.tst()
+    #      entry[0]  # None
+    #  entry[0], entry.value  # True, 0
+
+    def __init__(self, func):
+        self.func = func
+        self.queries = []
+        self.result = None
+
+    @property
+    def pending(self):
+        return self.result is None
+
+    def current(self):
+        if self.result is None:
+            return InstrumentResult(None, self.func.__doc__, "Pending in batch")
+        return self.result
+
+    @property
+    def value(self):
+        return self.current().value
+
+    @property
+    def timestamp(self):
+        return self.current().timestamp
+
+    def __getitem__(self, index):
+        return self.current()[index]
+
+    def __iter__(self):
+        return iter(self.current())
+
+    def __len__(self):
+        return 3
+
+    def __repr__(self):
+        return "BatchEntry(" + repr(self.current()) + ")"
+
+
+class BatchTransaction:
+    # Collects commands of decorated driver calls and sends them joined into semicolon
+    # separated program messages when the with block is left; the result tuple of every
+    # call is available in results afterwards, in the order the calls were made. The calls
+    # themselves return a BatchEntry, pending until the transaction is sent
+
+    def __init__(self, driver, max_message_length=1024):
+        self.driver = driver
+        self.max_message_length = max_message_length
+        self.recording = False
+        self.entries = []
+        self.commands = []
+        self.results = []
+
+    def __enter__(self):
+        # The driver lock is held for the whole with block, so calls from other threads are not recorded
+        self.driver.lock.acquire()
+        self.driver.transaction = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.driver.transaction = None
+            if exc_type is not None:
+                self.driver.invalidate_state()
+                return False
+            self.send()
+            self.results = [entry.result for entry in self.entries]
+            return False
+        finally:
+            self.driver.lock.release()
+
+    def record(self, func, *args, **kwargs):
+        entry = BatchEntry(func)
+        self.entries.append(entry)
+        resource = self.driver.manager
+        self.driver.manager = self
+        self.recording = True
         try:
             result = func(*args, **kwargs)
-            if func.__doc__ == "Query":
-                if not result[0]:
-                    return False, func.__doc__, result[2]
-                return True, func.__doc__, result
-            if result is None:
-                return True, func.__doc__, func.__name__
-            return result
-        except pyvisa.VisaIOError:
-            return False, func.__doc__, func.__doc__ + " failed" + " (" + func.__name__ + ")"
-    return inner
+        finally:
+            self.recording = False
+            self.driver.manager = resource
+        if isinstance(result, (tuple, InstrumentResult)) and not result[0]:
+            entry.result = InstrumentResult(False, func.__doc__, result[2])
+        return entry
+
+    def write(self, command):
+        self.commands.append((self.entries[-1], command.strip(), False))
+
+    def query(self, command):
+        self.commands.append((self.entries[-1], command.strip(), True))
+        return ""
+
+    def write_raw(self, message):
+        self.write(message.decode())
+
+    def read(self):
+        entry, command, is_query = self.commands[-1]
+        self.commands[-1] = entry, command, True
+        return ""
+
+    def messages(self):
+        message, commands = "", []
+        for entry, command, is_query in self.commands:
+            if message:
+                separator = ";" if command.startswith("*") else ";:"
+                if len(message) + len(separator) + len(command) > self.max_message_length:
+                    yield message, commands
+                    message, commands = "", []
+                else:
+                    command = separator + command
+            message += command
+            commands.append((entry, is_query))
+        if message:
+            yield message, commands
+
+    def send(self):
+        failed = False
+        for message, commands in self.messages():
+            if failed:
+                self.fail(commands)
+                continue
+            try:
+                queries = [entry for entry, is_query in commands if is_query]
+                if queries:
+                    responses = split_responses(self.driver.manager.query(message).strip())
+                    if len(responses) != len(queries):
+                        raise pyvisa.VisaIOError(pyvisa.constants.StatusCode.error_io)
+                    for entry, response in zip(queries, responses):
+                        entry.queries.append(response)
+                else:
+                    self.driver.manager.write(message)
+            except pyvisa.VisaIOError:
+                self.driver.invalidate_state()
+                self.fail(commands)
+                failed = True
+        for entry in self.entries:
+            if entry.result is not None:
+                continue
+            if entry.func.__doc__ == "Query" and entry.queries:
+                entry.result = InstrumentResult(True, entry.func.__doc__, entry.queries[-1], command_unit(entry.func))
+            else:
+                entry.result = InstrumentResult(True, entry.func.__doc__, entry.func.__name__)
+
+    @staticmethod
+    def fail(commands):
+        for entry, is_query in commands:
+            entry.result = InstrumentResult(False, entry.func.__doc__, failure_text(entry.func))
 
 
 class InstrumentDriver:
+    commands = ()
+    # Resource manager used instead of a new PyVISA one, e.g. traffic.ReplayResourceManager
+    resource_manager = None
+    # traffic.TrafficLog capturing the messages of sessions opened from now on, None when not capturing
+    traffic_log = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for command in cls.__dict__.get("commands", ()):
+            if command.name not in cls.__dict__:
+                setattr(cls, command.name, exception_handler(command_method(command)))
 
     def __init__(self, address):
-        self.rm = pyvisa.ResourceManager('@py')
-        self.manager = self.rm.open_resource(address)
+        self.address = address
+        self.lock = threading.RLock()
+        self.transaction = None
+        self.metrics = CommandMetrics()
+        self.rm = self.resource_manager if self.resource_manager is not None else pyvisa.ResourceManager('@py')
+        self.manager = self.open_session()
         self.idn = ((self.manager.query("*IDN?")).split(","))[1]
+        self.invalidate_state()
+
+    def open_session(self):
+        resource = open_instrument(self.rm, self.address)
+        if self.traffic_log is not None:
+            resource = self.traffic_log.wrap(resource, self.address)
+        return MeteredResource(resource, self.metrics)
 
     def close(self):
         self.manager.close()
         self.rm.close()
 
+    def reconnect(self):
+        # Reopens the session to the same address, any cached instrument state is dropped
+        self.manager.close()
+        self.manager = self.open_session()
+        self.invalidate_state()
+
+    def batch(self, max_message_length=1024):
+        # Decorated calls made inside the with block are sent together on leaving it
+        #  with driver.batch() as transaction:
+        #      driver.rst()
+        #      driver.tst()
+        #  transaction.results -> [(True, "Write", "rst"), (True, "Query", "0")]
+        return BatchTransaction(self, max_message_length)
+
+    def invalidate_state(self):
+        # Drops instrument state cached on the host side (e.g. selected channel),
+        # called after reset, reconnect, return to front panel control and failed I/O
+        pass
+
     @property
     def idn(self):
         return self._idn
@@ -49,13 +611,68 @@ class InstrumentDriver:
         """Write"""
         # *RST
         # Sets the instrument to a defined default status
+        self.invalidate_state()
         self.manager.write("*RST")
 
+    @exception_handler
+    def read_status_byte(self):
+        """Query"""
+        # *STB?
+        # Returns the status byte in decimal form, the summary bits of the status registers (STB_*)
+        return self.manager.query("*STB?")
+
+    @exception_handler
+    def clear_status(self):
+        """Write"""
+        # *CLS
+        # Clears the event registers of the status model and the error queue
+        self.manager.write("*CLS")
+
+    @exception_handler
+    def set_service_request_enable(self, mask=0):
+        """Write"""
+        # *SRE <Value>
+        # Sets the status byte bits raising a service request
+        self.manager.write("*SRE " + str(int(mask)))
+
+    def enable_service_requests(self):
+        # Queues the service request events of the session; False if the resource has no SRQ line
+        # (raw sockets) or the VISA backend does not deliver its events, the status byte has to be
+        # polled then
+        if not self.address.upper().endswith("::INSTR"):
+            return False
+        try:
+            self.manager.enable_event(pyvisa.constants.EventType.service_request,
+                                      pyvisa.constants.EventMechanism.queue)
+            return True
+        except (pyvisa.VisaIOError, NotImplementedError, AttributeError):
+            return False
+
+    def wait_for_service_request(self, timeout):
+        # Waits up to timeout seconds for a service request without holding the driver lock, so other
+        # threads keep using the instrument meanwhile; returns True if one arrived
+        try:
+            response = self.manager.wait_on_event(pyvisa.constants.EventType.service_request, int(timeout * 1000),
+                                                  capture_timeout=True)
+        except pyvisa.VisaIOError:
+            return False
+        return not response.timed_out
+
+    def disable_service_requests(self):
+        try:
+            self.manager.disable_event(pyvisa.constants.EventType.service_request,
+                                       pyvisa.constants.EventMechanism.queue)
+            self.manager.discard_events(pyvisa.constants.EventType.service_request,
+                                        pyvisa.constants.EventMechanism.queue)
+        except (pyvisa.VisaIOError, NotImplementedError, AttributeError):
+            pass
+
     @exception_handler
     def local(self):
         """Write"""
         # SYSTem:LOCal
         # Sets the system to front panel control, the front panel control is unlocked
+        self.invalidate_state()
         self.manager.write("SYST:LOC")
 
     @exception_handler
@@ -0,0 +1,1023 @@
+import argparse
+import math
+import os
+import random
+import re
+import socket
+import socketserver
+import threading
+import time
+
+from discovery import DiscoveryCache
+from driver import STB_ERROR_QUEUE, STB_QUESTIONABLE, STB_SERVICE_REQUEST
+from powersupply_HMC804x import ISUM_FUSE_TRIPPED, ISUM_OPP_TRIPPED, ISUM_OVP_TRIPPED, QUES_INSTRUMENT
+
+VOWELS = "AEIOU"
+
+NO_ERROR = '0,"No error"'
+
+
+def short_form(node):
+    # SCPI short form of a header node: the first four characters, three if the fourth is a vowel
+    if len(node) <= 4:
+        return node
+    if node[3] in VOWELS:
+        return node[:3]
+    return node[:4]
+
+
+def format_number(value):
+    return "{:.4E}".format(value)
+
+
+def parse_number(argument, minimum, maximum, default=None):
+    argument = argument.strip().upper()
+    if argument in ("MIN", "MINIMUM"):
+        return minimum
+    if argument in ("MAX", "MAXIMUM"):
+        return maximum
+    if argument in ("DEF", "DEFAULT"):
+        return default if default is not None else minimum
+    return min(max(float(argument), minimum), maximum)
+
+
+def parse_state(argument):
+    return argument.strip().upper() in ("1", "ON")
+
+
+class CommandError(Exception):
+
+    def __init__(self, code, message):
+        super(CommandError, self).__init__(message)
+        self.code = code
+        self.message = message
+
+
+class Latency:
+    # Response delay of an emulated instrument, per command header latencies override the base one
+    #  latency: base delay per command in seconds
+    #  jitter: the delay varies uniformly by +-jitter seconds
+    #  command_latency: header (short form, e.g. MEAS:CURR:DC) -> delay in seconds
+    #  seed: seed of the jitter generator, runs with the same seed are reproducible
+
+    def __init__(self, latency=0.0, jitter=0.0, command_latency=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.command_latency = command_latency or {}
+        self.random = random.Random(seed)
+
+    def delay(self, header):
+        delay = self.command_latency.get(header, self.latency)
+        if self.jitter:
+            delay += self.random.uniform(-self.jitter, self.jitter)
+        return max(delay, 0.0)
+
+
+class InstrumentModel:
+    # Stateful model answering SCPI program messages, subclasses register their commands
+    # in self.commands as short form header (without optional nodes) -> handler(query, arguments)
+    optional_nodes = ()
+
+    def __init__(self, model, serial_number, latency=None):
+        self.idn = "Rohde&Schwarz," + model + "," + serial_number + ",01.000"
+        self.latency = latency or Latency()
+        self.lock = threading.Lock()
+        self.errors = []
+        # Time the instrument spends executing the commands of the current message, added by handlers
+        self.busy = 0.0
+        self.service_request_enable = 0
+        self.questionable_event = 0
+        self.questionable_enable = 0
+        self.commands = {
+            "*IDN": lambda query, arguments: self.idn,
+            "*RST": lambda query, arguments: self.reset(),
+            "*TST": lambda query, arguments: "0",
+            "*OPC": lambda query, arguments: "1" if query else None,
+            "*CLS": lambda query, arguments: self.clear_status(),
+            "*STB": lambda query, arguments: self.status_byte(),
+            "*SRE": self.register("service_request_enable"),
+            "STAT:QUES": self.event_register("questionable_event"),
+            "STAT:QUES:EVEN": self.event_register("questionable_event"),
+            "STAT:QUES:ENAB": self.register("questionable_enable"),
+            "STAT:QUES:COND": lambda query, arguments: 0,
+            "SYST:LOC": lambda query, arguments: None,
+            "SYST:REM": lambda query, arguments: None,
+            "SYST:ERR": lambda query, arguments: self.errors.pop(0) if self.errors else NO_ERROR,
+        }
+
+    def reset(self):
+        pass
+
+    def clear_status(self):
+        # *CLS clears the error queue and the event registers, enable registers are kept
+        self.errors.clear()
+        self.questionable_event = 0
+
+    def status_byte(self):
+        status = 0
+        if self.errors:
+            status |= STB_ERROR_QUEUE
+        if self.questionable_event & self.questionable_enable:
+            status |= STB_QUESTIONABLE
+        if status & self.service_request_enable:
+            status |= STB_SERVICE_REQUEST
+        return status
+
+    def register(self, name, target=None):
+        # Enable register of the model (or of target(), e.g. the selected channel)
+        def handler(query, arguments):
+            owner = target() if target is not None else self
+            if query:
+                return getattr(owner, name)
+            setattr(owner, name, int(float(arguments[0])))
+        return handler
+
+    def event_register(self, name, target=None):
+        # Event register, reading it clears it
+        def handler(query, arguments):
+            owner = target() if target is not None else self
+            value = getattr(owner, name)
+            setattr(owner, name, 0)
+            return value
+        return handler
+
+    def header(self, header):
+        nodes = []
+        for node in header.upper().split(":"):
+            suffix = re.search(r"\d+$", node)
+            if suffix is not None and not node.startswith("*"):
+                node = node[:suffix.start()]
+            node = short_form(node) if not node.startswith("*") else node
+            if node not in self.optional_nodes:
+                nodes.append(node)
+        return ":".join(nodes)
+
+    def suffix(self, header):
+        # Numeric suffix of the last node having one, e.g. 2 of STAT:QUES:INST:ISUM2:EVEN
+        suffixes = re.findall(r"[A-Z](\d+)(?=:|$)", header.upper())
+        return int(suffixes[-1]) if suffixes else None
+
+    def handle(self, message):
+        # Executes a program message, returns the joined query responses or None if there are none
+        responses = []
+        delay = 0.0
+        path = []
+        with self.lock:
+            self.update()
+            for unit in message.strip().split(";"):
+                unit = unit.strip()
+                if not unit:
+                    continue
+                header, _, argument_text = unit.partition(" ")
+                query = header.endswith("?")
+                header = header.rstrip("?")
+                if header.startswith(":"):
+                    header = header[1:]
+                elif path and not header.startswith("*"):
+                    header = ":".join(path + [header])
+                if not header.startswith("*"):
+                    path = header.split(":")[:-1]
+                arguments = [argument.strip() for argument in argument_text.split(",")] if argument_text else []
+                short_header = self.header(header)
+                delay += self.latency.delay(short_header)
+                handler = self.commands.get(short_header)
+                if handler is None:
+                    self.errors.append('-113,"Undefined header;' + unit + '"')
+                    continue
+                try:
+                    self.current_suffix = self.suffix(header)
+                    response = handler(query, arguments)
+                except (CommandError, ValueError, IndexError) as error:
+                    if isinstance(error, CommandError):
+                        self.errors.append(str(error.code) + ',"' + error.message + '"')
+                    else:
+                        self.errors.append('-224,"Illegal parameter value"')
+                    continue
+                if query and response is not None:
+                    responses.append(str(response))
+            delay += self.busy
+            self.busy = 0.0
+        if delay:
+            time.sleep(delay)
+        if responses:
+            return ";".join(responses)
+        return None
+
+    def update(self):
+        # Advances time dependent state (settling, energy meter) before every program message
+        pass
+
+
+class DiodeLoad:
+    # Device under test on an output: a diode in parallel with a resistor
+
+    def __init__(self, saturation_current=1e-9, ideality=1.8, parallel_resistance=1e4):
+        self.saturation_current = saturation_current
+        self.ideality = ideality
+        self.parallel_resistance = parallel_resistance
+
+    def current(self, voltage):
+        exponent = min(voltage / (self.ideality * 0.02585), 200.0)
+        return voltage / self.parallel_resistance + self.saturation_current * (math.exp(exponent) - 1)
+
+    def voltage(self, current):
+        low, high = 0.0, 100.0
+        for _ in range(60):
+            middle = (low + high) / 2
+            if self.current(middle) < current:
+                low = middle
+            else:
+                high = middle
+        return low
+
+
+class PowerSupplyChannel:
+
+    def __init__(self, load, settling_time):
+        self.load = load
+        self.settling_time = settling_time
+        self.summary_event = 0
+        self.summary_enable = 0
+        self.reset()
+
+    def summary_condition(self):
+        # STATus:QUEStionable:INSTrument:ISUMmary<n>:CONDition of the channel
+        return ((ISUM_OVP_TRIPPED if self.ovp_tripped else 0) | (ISUM_FUSE_TRIPPED if self.fuse_tripped else 0) |
+                (ISUM_OPP_TRIPPED if self.opp_tripped else 0))
+
+    def reset(self):
+        self.voltage = 0.0
+        self.current = 0.1
+        self.active = False
+        self.fuse_state = False
+        self.fuse_delay = 0.01
+        self.fuse_links = set()
+        self.fuse_tripped = False
+        self.ovp_state = False
+        self.ovp_level = 32.05
+        self.ovp_mode = "MEAS"
+        self.ovp_tripped = False
+        self.opp_state = False
+        self.opp_level = 33.0
+        self.opp_tripped = False
+        self.energy_state = False
+        self.energy = 0.0
+        self.ainput_state = False
+        self.ramp_state = False
+        self.start_voltage = 0.0
+        self.changed_at = time.monotonic()
+        self.arb = []
+        self.arb_repetitions = 1
+        self.arb_started = None
+        self.arb_index = -1
+
+    def arb_setpoint(self, now):
+        # Moves the setpoints to the ARB table point played at now
+        if self.arb_started is None:
+            return
+        period = sum(point[2] for point in self.arb)
+        cycle = int((now - self.arb_started) // period)
+        if self.arb_repetitions and cycle >= self.arb_repetitions:
+            self.arb_started = None
+            index, started = len(self.arb) - 1, now
+        else:
+            elapsed = now - self.arb_started - cycle * period
+            index, started = 0, self.arb_started + cycle * period
+            while index < len(self.arb) - 1 and elapsed >= self.arb[index][2]:
+                elapsed -= self.arb[index][2]
+                started += self.arb[index][2]
+                index += 1
+        if index != self.arb_index:
+            self.start_voltage = self.voltage
+            self.voltage, self.current = self.arb[index][:2]
+            self.changed_at = started
+            self.arb_index = index
+
+    def target(self, enabled):
+        # Steady state output (voltage, current) for the present setpoints
+        if not enabled:
+            return 0.0, 0.0
+        current = self.load.current(self.voltage)
+        if current > self.current:
+            return self.load.voltage(self.current), self.current
+        return self.voltage, current
+
+    def output(self, enabled, now):
+        # Output (voltage, current) settling exponentially towards the target after a change
+        self.arb_setpoint(now)
+        voltage, current = self.target(enabled)
+        if self.settling_time > 0:
+            factor = math.exp(-(now - self.changed_at) / self.settling_time)
+            voltage += (self.start_voltage - voltage) * factor
+            current = self.load.current(voltage) if current < self.current else current
+        return voltage, current
+
+
+class PowerSupplyModel(InstrumentModel):
+    # HMC804x power supply: channel selection, setpoints, OVP/OPP/fuse protection and energy meter
+    optional_nodes = ("SOUR", "SCAL", "IMM", "AMPL", "SEL", "INCR", "DC")
+
+    def __init__(self, model="HMC8043", serial_number="000000", channels=3, loads=None, settling_time=0.05,
+                 noise=1e-4, latency=None, seed=None):
+        super(PowerSupplyModel, self).__init__(model, serial_number, latency)
+        loads = loads or [DiodeLoad() for _ in range(channels)]
+        self.channels = [PowerSupplyChannel(load, settling_time) for load in loads]
+        self.noise = noise
+        self.random = random.Random(seed)
+        self.updated_at = time.monotonic()
+        self.instrument_event = 0
+        self.instrument_enable = 0
+        self.reset()
+        summary_channel = lambda: self.channels[(self.current_suffix or 1) - 1]
+        channel_commands = {
+            "VOLT": self.voltage,
+            "VOLT:STEP": self.voltage_step,
+            "CURR": self.current,
+            "CURR:STEP": self.current_step,
+            "OUTP": self.output,
+            "OUTP:STAT": self.output,
+            "OUTP:CHAN": self.output_channel,
+            "OUTP:CHAN:STAT": self.output_channel,
+            "OUTP:MAST": self.output_master,
+            "OUTP:MAST:STAT": self.output_master,
+            "FUSE": self.flag("fuse_state"),
+            "FUSE:STAT": self.flag("fuse_state"),
+            "FUSE:DEL": self.fuse_delay,
+            "FUSE:LINK": self.fuse_link,
+            "FUSE:UNL": self.fuse_unlink,
+            "FUSE:TRIP": self.trip_flag("fuse_tripped"),
+            "MEAS": self.measure_voltage,
+            "MEAS:VOLT": self.measure_voltage,
+            "MEAS:CURR": self.measure_current,
+            "MEAS:POW": self.measure_power,
+            "MEAS:ENER": self.measure_energy,
+            "MEAS:ENER:STAT": self.flag("energy_state"),
+            "MEAS:ENER:RES": self.energy_reset,
+            "VOLT:PROT": self.flag("ovp_state"),
+            "VOLT:PROT:STAT": self.flag("ovp_state"),
+            "VOLT:PROT:LEV": self.level("ovp_level", 0.0, 32.05, 32.05),
+            "VOLT:PROT:TRIP": self.trip_flag("ovp_tripped"),
+            "VOLT:PROT:CLE": self.clear("ovp_tripped"),
+            "VOLT:PROT:MODE": self.ovp_mode,
+            "POW:PROT": self.flag("opp_state"),
+            "POW:PROT:STAT": self.flag("opp_state"),
+            "POW:PROT:LEV": self.level("opp_level", 0.0, 33.0, 33.0),
+            "POW:PROT:TRIP": self.trip_flag("opp_tripped"),
+            "POW:PROT:CLE": self.clear("opp_tripped"),
+            "VOLT:AINP": self.flag("ainput_state"),
+            "VOLT:AINP:STAT": self.flag("ainput_state"),
+            "VOLT:AINP:INP": self.setting("ainput_input"),
+            "VOLT:AINP:MODE": self.setting("ainput_mode"),
+            "VOLT:AINP:THR": self.setting_number("ainput_threshold", 0.0, 10.0, 1.0),
+            "VOLT:RAMP": self.flag("ramp_state"),
+            "VOLT:RAMP:STAT": self.flag("ramp_state"),
+            "VOLT:RAMP:DUR": self.setting_number("ramp_duration", 0.01, 10.0, 0.01),
+            "INST": self.instrument,
+            "ARB:CLE": lambda query, arguments: self.arb_table.clear(),
+            "ARB:DATA": self.arb_data,
+            "ARB:REP": self.setting_number("arb_repetitions", 0, 255, 1),
+            "ARB:TRAN": self.arb_transfer,
+            "ARB:STAR": self.arb_start,
+            "ARB:STOP": self.arb_stop,
+            "STAT:QUES:INST": self.event_register("instrument_event"),
+            "STAT:QUES:INST:EVEN": self.event_register("instrument_event"),
+            "STAT:QUES:INST:ENAB": self.register("instrument_enable"),
+            "STAT:QUES:INST:ISUM": self.event_register("summary_event", summary_channel),
+            "STAT:QUES:INST:ISUM:EVEN": self.event_register("summary_event", summary_channel),
+            "STAT:QUES:INST:ISUM:ENAB": self.register("summary_enable", summary_channel),
+            "STAT:QUES:INST:ISUM:COND": lambda query, arguments: summary_channel().summary_condition(),
+            "STAT:QUES:INST:ISUM:PTR": lambda query, arguments: None,
+            "STAT:QUES:INST:ISUM:NTR": lambda query, arguments: None,
+        }
+        self.commands.update(channel_commands)
+
+    def reset(self):
+        self.selected = 0
+        self.master = False
+        self.voltage_step_size = 1.0
+        self.current_step_size = 0.1
+        self.ainput_input = "VOLT"
+        self.ainput_mode = "LIN"
+        self.ainput_threshold = 1.0
+        self.ramp_duration = 0.01
+        self.arb_table = []
+        self.arb_repetitions = 1
+        for channel in self.channels:
+            channel.reset()
+
+    @property
+    def channel(self):
+        return self.channels[self.selected]
+
+    def channel_output(self, channel, now=None):
+        return channel.output(channel.active and self.master, now if now is not None else time.monotonic())
+
+    def reading(self, value):
+        return value + self.random.gauss(0.0, self.noise) if self.noise else value
+
+    def changed(self, channel):
+        channel.start_voltage = self.channel_output(channel)[0]
+        channel.changed_at = time.monotonic()
+        self.check_protection(channel)
+
+    def clear_status(self):
+        super(PowerSupplyModel, self).clear_status()
+        self.instrument_event = 0
+        for channel in self.channels:
+            channel.summary_event = 0
+
+    def status_event(self, channel, bit):
+        # Latches a protection trip in the ISUMmary event register of the channel and, when
+        # enabled, in the instrument and questionable summaries above it
+        channel.summary_event |= bit
+        if channel.summary_event & channel.summary_enable:
+            self.instrument_event |= 1 << (self.channels.index(channel) + 1)
+        if self.instrument_event & self.instrument_enable:
+            self.questionable_event |= QUES_INSTRUMENT
+
+    def check_protection(self, channel):
+        voltage, current = channel.target(channel.active and self.master)
+        tripped = False
+        if channel.ovp_state and (voltage if channel.ovp_mode == "MEAS" else channel.voltage) > channel.ovp_level:
+            channel.ovp_tripped = tripped = True
+            self.status_event(channel, ISUM_OVP_TRIPPED)
+        if channel.opp_state and voltage * current > channel.opp_level:
+            channel.opp_tripped = tripped = True
+            self.status_event(channel, ISUM_OPP_TRIPPED)
+        if channel.fuse_state and channel.active and self.master and current >= channel.current:
+            channel.fuse_tripped = tripped = True
+            self.status_event(channel, ISUM_FUSE_TRIPPED)
+            for index in channel.fuse_links:
+                self.channels[index].fuse_tripped = True
+                self.channels[index].active = False
+                self.status_event(self.channels[index], ISUM_FUSE_TRIPPED)
+        if tripped:
+            channel.active = False
+
+    def update(self):
+        now = time.monotonic()
+        for channel in self.channels:
+            if channel.energy_state:
+                voltage, current = self.channel_output(channel, now)
+                channel.energy += voltage * current * (now - self.updated_at)
+        self.updated_at = now
+
+    def arb_data(self, query, arguments):
+        if query:
+            return ",".join(format_number(value) for point in self.arb_table for value in point)
+        if len(arguments) % 4 or len(arguments) > 4 * 512:
+            raise CommandError(-109, "Missing parameter")
+        points = []
+        for index in range(0, len(arguments), 4):
+            voltage, current, dwell, interpolation = (float(value) for value in arguments[index:index + 4])
+            if not 0.01 <= dwell <= 60:
+                raise CommandError(-222, "Data out of range")
+            points.append((voltage, current, dwell, interpolation))
+        self.arb_table = points
+
+    def arb_channel(self, arguments):
+        index = int(arguments[0]) - 1
+        if not 0 <= index < len(self.channels):
+            raise CommandError(-224, "Illegal parameter value")
+        return self.channels[index]
+
+    def arb_transfer(self, query, arguments):
+        channel = self.arb_channel(arguments)
+        channel.arb = list(self.arb_table)
+        channel.arb_repetitions = int(self.arb_repetitions)
+
+    def arb_start(self, query, arguments):
+        channel = self.arb_channel(arguments)
+        if not channel.arb:
+            raise CommandError(-221, "Settings conflict")
+        channel.arb_started = time.monotonic()
+        channel.arb_index = -1
+
+    def arb_stop(self, query, arguments):
+        self.arb_channel(arguments).arb_started = None
+
+    def instrument(self, query, arguments):
+        if query:
+            return "OUTP" + str(self.selected + 1)
+        number = re.search(r"(\d+)$", arguments[0])
+        if number is None or not 1 <= int(number.group(1)) <= len(self.channels):
+            raise CommandError(-224, "Illegal parameter value")
+        self.selected = int(number.group(1)) - 1
+
+    def voltage(self, query, arguments):
+        channel = self.channel
+        if query:
+            return format_number(channel.voltage)
+        argument = arguments[0].upper()
+        if argument == "UP":
+            channel.voltage = min(channel.voltage + self.voltage_step_size, 32.05)
+        elif argument == "DOWN":
+            channel.voltage = max(channel.voltage - self.voltage_step_size, 0.0)
+        else:
+            channel.voltage = parse_number(argument, 0.0, 32.05)
+        self.changed(channel)
+
+    def voltage_step(self, query, arguments):
+        if query:
+            return format_number(self.voltage_step_size)
+        self.voltage_step_size = parse_number(arguments[0], 0.0, 32.05, 1.0)
+
+    def current(self, query, arguments):
+        channel = self.channel
+        if query:
+            return format_number(channel.current)
+        argument = arguments[0].upper()
+        if argument == "UP":
+            channel.current = min(channel.current + self.current_step_size, 3.0)
+        elif argument == "DOWN":
+            channel.current = max(channel.current - self.current_step_size, 0.0005)
+        else:
+            channel.current = parse_number(argument, 0.0005, 3.0)
+        self.changed(channel)
+
+    def current_step(self, query, arguments):
+        if query:
+            return format_number(self.current_step_size)
+        self.current_step_size = parse_number(arguments[0], 0.0005, 3.0, 0.1)
+
+    def output(self, query, arguments):
+        if query:
+            return int(self.channel.active and self.master)
+        self.channel.active = parse_state(arguments[0])
+        if self.channel.active:
+            self.master = True
+        self.changed(self.channel)
+
+    def output_channel(self, query, arguments):
+        if query:
+            return int(self.channel.active)
+        self.channel.active = parse_state(arguments[0])
+        self.changed(self.channel)
+
+    def output_master(self, query, arguments):
+        if query:
+            return int(self.master)
+        self.master = parse_state(arguments[0])
+        for channel in self.channels:
+            self.changed(channel)
+
+    def flag(self, name):
+        def handler(query, arguments):
+            if query:
+                return int(getattr(self.channel, name))
+            setattr(self.channel, name, parse_state(arguments[0]))
+            self.check_protection(self.channel)
+        return handler
+
+    def trip_flag(self, name):
+        def handler(query, arguments):
+            return int(getattr(self.channel, name))
+        return handler
+
+    def clear(self, name):
+        def handler(query, arguments):
+            setattr(self.channel, name, False)
+        return handler
+
+    def level(self, name, minimum, maximum, default):
+        def handler(query, arguments):
+            if query:
+                return format_number(getattr(self.channel, name))
+            setattr(self.channel, name, parse_number(arguments[0], minimum, maximum, default))
+            self.check_protection(self.channel)
+        return handler
+
+    def setting(self, name):
+        def handler(query, arguments):
+            if query:
+                return getattr(self, name)
+            setattr(self, name, arguments[0].upper())
+        return handler
+
+    def setting_number(self, name, minimum, maximum, default):
+        def handler(query, arguments):
+            if query:
+                return format_number(getattr(self, name))
+            setattr(self, name, parse_number(arguments[0], minimum, maximum, default))
+        return handler
+
+    def ovp_mode(self, query, arguments):
+        if query:
+            return self.channel.ovp_mode
+        self.channel.ovp_mode = short_form(arguments[0].upper())
+
+    def fuse_delay(self, query, arguments):
+        if query:
+            return format_number(self.channel.fuse_delay)
+        self.channel.fuse_delay = parse_number(arguments[0], 0.01, 10.0)
+
+    def fuse_link(self, query, arguments):
+        index = int(arguments[0]) - 1
+        if query:
+            return int(index in self.channel.fuse_links)
+        self.channel.fuse_links.add(index)
+
+    def fuse_unlink(self, query, arguments):
+        self.channel.fuse_links.discard(int(arguments[0]) - 1)
+
+    def measure_voltage(self, query, arguments):
+        return format_number(self.reading(self.channel_output(self.channel)[0]))
+
+    def measure_current(self, query, arguments):
+        return format_number(self.reading(self.channel_output(self.channel)[1]))
+
+    def measure_power(self, query, arguments):
+        voltage, current = self.channel_output(self.channel)
+        return format_number(self.reading(voltage * current))
+
+    def measure_energy(self, query, arguments):
+        return format_number(self.channel.energy)
+
+    def energy_reset(self, query, arguments):
+        self.channel.energy = 0.0
+
+
+class MultimeterModel(InstrumentModel):
+    # HMC8012 multimeter: measurement function and range, CALC null offset and statistics. With
+    # measurement_timing a reading takes the time of the ADC rate, changing the configuration more
+    optional_nodes = ("SENS",)
+    reading_times = {"SLOW": 0.2, "MED": 0.1, "FAST": 0.005}
+    configuration_time = 0.1
+
+    functions = {
+        "VOLT": "VOLT:DC", "VOLT:DC": "VOLT:DC", "DC": "VOLT:DC", "": "VOLT:DC",
+        "VOLT:AC": "VOLT:AC", "AC": "VOLT:AC",
+        "CURR": "CURR:DC", "CURR:DC": "CURR:DC", "CURR:AC": "CURR:AC",
+        "RES": "RES", "FRES": "FRES", "CAP": "CAP", "CONT": "CONT", "DIOD": "DIOD",
+        "FREQ": "FREQ:VOLT", "FREQ:VOLT": "FREQ:VOLT", "FREQ:CURR": "FREQ:CURR", "TEMP": "TEMP",
+    }
+
+    def __init__(self, model="HMC8012", serial_number="000000", source=None, noise=1e-6, latency=None, seed=None,
+                 measurement_timing=False):
+        super(MultimeterModel, self).__init__(model, serial_number, latency)
+        self.measurement_timing = measurement_timing
+        # source(function) returns the true value of the measured quantity
+        self.source = source or (lambda function: 0.0)
+        self.noise = noise
+        self.random = random.Random(seed)
+        self.reset()
+        for name in set(self.functions):
+            self.commands["MEAS" + (":" + name if name else "")] = self.measure(self.functions[name])
+            self.commands["CONF" + (":" + name if name else "")] = self.configure(self.functions[name])
+        for function in set(self.functions.values()):
+            self.commands[function + ":RANG"] = self.range
+        self.commands.update({
+            "READ": self.read,
+            "FETC": self.fetch,
+            "CONF": self.configuration,
+            "CALC": self.calculate_state,
+            "CALC:STAT": self.calculate_state,
+            "CALC:FUNC": self.calculate_function,
+            "CALC:NULL:OFFS": self.null_offset,
+            "CALC:NULL:OFF": self.null_offset,
+            "CALC:AVER:AVER": lambda query, arguments: format_number(self.statistic_sum / self.statistic_count)
+            if self.statistic_count else format_number(0.0),
+            "CALC:AVER:COUN": lambda query, arguments: self.statistic_count,
+            "CALC:AVER:MAX": lambda query, arguments: format_number(self.statistic_maximum),
+            "CALC:AVER:MIN": lambda query, arguments: format_number(self.statistic_minimum),
+            "CALC:AVER:PTP": lambda query, arguments: format_number(self.statistic_maximum - self.statistic_minimum)
+            if self.statistic_count else format_number(0.0),
+            "CALC:AVER:CLE": lambda query, arguments: self.statistic_clear(),
+            "UNIT:TEMP": self.temperature_unit,
+            "ADCR": self.adc_rate,
+            "DATA:LOG:COUN": self.data_log_setting("log_count", 1, 50000),
+            "DATA:LOG:INT": self.data_log_setting("log_interval", 0.1, 3600),
+            "DATA:LOG:MODE": self.data_log_mode,
+            "DATA:LOG:STAT": self.data_log_state,
+            "DATA:POIN": lambda query, arguments: len(self.log),
+            "DATA:DATA": self.data_log_data,
+        })
+
+    def reset(self):
+        self.function = "VOLT:DC"
+        self.measurement_range = "AUTO"
+        self.calculation_state = False
+        self.calculation_function = "NULL"
+        self.null_offset_value = 0.0
+        self.unit = "C"
+        self.rate = "MED"
+        self.log_count = 50000
+        self.log_interval = 0.1
+        self.log_mode = "COUN"
+        self.logging = False
+        self.log_started = 0.0
+        self.log = []
+        self.last_reading = 0.0
+        self.statistic_clear()
+
+    def statistic_clear(self):
+        self.statistic_count = 0
+        self.statistic_sum = 0.0
+        self.statistic_minimum = 0.0
+        self.statistic_maximum = 0.0
+
+    def take_reading(self):
+        if self.measurement_timing:
+            self.busy += self.reading_times.get(self.rate, 0.1)
+        value = self.source(self.function)
+        if self.noise:
+            value += self.random.gauss(0.0, self.noise)
+        if self.calculation_state:
+            if self.calculation_function == "NULL":
+                value -= self.null_offset_value
+            elif self.calculation_function == "AVER":
+                if self.statistic_count == 0:
+                    self.statistic_minimum = self.statistic_maximum = value
+                self.statistic_count += 1
+                self.statistic_sum += value
+                self.statistic_minimum = min(self.statistic_minimum, value)
+                self.statistic_maximum = max(self.statistic_maximum, value)
+        self.last_reading = value
+        return format_number(value)
+
+    def configure(self, function):
+        def handler(query, arguments):
+            if self.measurement_timing:
+                self.busy += self.configuration_time
+            self.function = function
+            self.measurement_range = arguments[0].upper() if arguments and arguments[0] else "AUTO"
+        return handler
+
+    def measure(self, function):
+        configure = self.configure(function)
+
+        def handler(query, arguments):
+            configure(query, arguments)
+            return self.take_reading()
+        return handler
+
+    def configuration(self, query, arguments):
+        return '"' + self.function + " " + self.measurement_range + '"'
+
+    def range(self, query, arguments):
+        if query:
+            return self.measurement_range
+        self.measurement_range = arguments[0].upper()
+
+    def read(self, query, arguments):
+        return self.take_reading()
+
+    def fetch(self, query, arguments):
+        return format_number(self.last_reading)
+
+    def calculate_state(self, query, arguments):
+        if query:
+            return "ON" if self.calculation_state else "OFF"
+        self.calculation_state = parse_state(arguments[0])
+
+    def calculate_function(self, query, arguments):
+        if query:
+            return self.calculation_function
+        self.calculation_function = short_form(arguments[0].upper())
+
+    def null_offset(self, query, arguments):
+        if query:
+            return format_number(self.null_offset_value)
+        self.null_offset_value = parse_number(arguments[0], -1e3, 1e3, 0.0)
+
+    def update(self):
+        # Readings the data logging took since the last message, at the present input value
+        if not self.logging:
+            return
+        due = int((time.monotonic() - self.log_started) / self.log_interval) + 1
+        if self.log_mode == "COUN":
+            due = min(due, self.log_count)
+        while len(self.log) < due:
+            value = self.source(self.function)
+            if self.noise:
+                value += self.random.gauss(0.0, self.noise)
+            self.log.append(value)
+        if self.log_mode == "COUN" and len(self.log) >= self.log_count:
+            self.logging = False
+
+    def data_log_setting(self, name, minimum, maximum):
+        def handler(query, arguments):
+            if query:
+                return format_number(getattr(self, name))
+            setattr(self, name, parse_number(arguments[0], minimum, maximum))
+        return handler
+
+    def data_log_mode(self, query, arguments):
+        if query:
+            return self.log_mode
+        self.log_mode = short_form(arguments[0].upper())
+
+    def data_log_state(self, query, arguments):
+        if query:
+            return int(self.logging)
+        state = parse_state(arguments[0])
+        if state and not self.logging:
+            self.log = []
+            self.log_started = time.monotonic()
+        self.logging = state
+        self.update()
+
+    def data_log_data(self, query, arguments):
+        # Logged readings, one per line, as a definite length block
+        data = "".join(str(index) + ";" + format_number(value) + "\n" for index, value in enumerate(self.log))
+        length = str(len(data))
+        return "#" + str(len(length)) + length + data
+
+    def adc_rate(self, query, arguments):
+        if query:
+            return self.rate
+        self.rate = short_form(arguments[0].upper())
+
+    def temperature_unit(self, query, arguments):
+        if query:
+            return self.unit
+        self.unit = arguments[0].upper()
+
+
+class LowNoiseModel:
+    # LowNoise power supply serial protocol: ch<n><e|d> and ch<n>s<mV>\r
+    pattern = re.compile(r"ch(\d+)(?:([ed])|s(\d+)\r)")
+
+    def __init__(self, channels=4):
+        self.enabled = [False] * channels
+        self.voltage = [0] * channels
+        self.buffer = ""
+
+    def feed(self, data):
+        self.buffer += data
+        while self.buffer:
+            match = self.pattern.match(self.buffer)
+            if match is None:
+                if re.fullmatch(r"c|ch|ch\d+|ch\d+s\d*", self.buffer):
+                    return
+                self.buffer = self.buffer[1:]
+                continue
+            index = int(match.group(1)) - 1
+            if 0 <= index < len(self.enabled):
+                if match.group(2) is not None:
+                    self.enabled[index] = match.group(2) == "e"
+                else:
+                    self.voltage[index] = min(int(match.group(3)), 3500)
+            self.buffer = self.buffer[match.end():]
+
+
+class SocketHandler(socketserver.StreamRequestHandler):
+
+    def setup(self):
+        # Responses are sent at once instead of waiting for the ACK of the previous segment (Nagle)
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super(SocketHandler, self).setup()
+
+    def handle(self):
+        for line in self.rfile:
+            response = self.server.model.handle(line.decode("ascii", "replace"))
+            if response is not None:
+                self.wfile.write(response.encode("ascii") + b"\n")
+
+
+class InstrumentServer(socketserver.ThreadingTCPServer):
+    # Serves a model as raw SCPI socket, reachable as TCPIP::<host>::<port>::SOCKET
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, model, host="127.0.0.1", port=0):
+        super(InstrumentServer, self).__init__((host, port), SocketHandler)
+        self.model = model
+
+    @property
+    def resource(self):
+        host, port = self.server_address[:2]
+        return "TCPIP::" + host + "::" + str(port) + "::SOCKET"
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class SerialPort:
+    # Pseudo terminal feeding everything written to it into a LowNoise model, port is the device path
+
+    def __init__(self, model):
+        self.model = model
+        self.master, self.slave = os.openpty()
+        self.port = os.ttyname(self.slave)
+
+    def run(self):
+        while True:
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                return
+            if not data:
+                return
+            self.model.feed(data.decode("ascii", "replace"))
+
+    def start(self):
+        thread = threading.Thread(target=self.run, daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class Emulator:
+    # HMC8043 and HMC8012 on local sockets and a LowNoise supply on a pty. The multimeter measures
+    # the output of the power supply channel source_channel (current in DC I, voltage in DC V).
+
+    def __init__(self, host="127.0.0.1", power_supply_port=0, multimeter_port=0, latency=0.0, jitter=0.0,
+                 command_latency=None, seed=None, settling_time=0.05, source_channel=1, low_noise=True,
+                 measurement_timing=False):
+        self.power_supply = PowerSupplyModel(latency=Latency(latency, jitter, command_latency, seed),
+                                             settling_time=settling_time, seed=seed)
+        self.multimeter = MultimeterModel(source=self.measured_quantity,
+                                          latency=Latency(latency, jitter, command_latency,
+                                                          None if seed is None else seed + 1),
+                                          seed=None if seed is None else seed + 1,
+                                          measurement_timing=measurement_timing)
+        self.source_channel = source_channel
+        self.servers = [InstrumentServer(self.power_supply, host, power_supply_port),
+                        InstrumentServer(self.multimeter, host, multimeter_port)]
+        self.low_noise = LowNoiseModel() if low_noise else None
+        self.serial_port = SerialPort(self.low_noise) if low_noise else None
+
+    def measured_quantity(self, function):
+        channel = self.power_supply.channels[self.source_channel - 1]
+        voltage, current = self.power_supply.channel_output(channel)
+        if function == "CURR:DC":
+            return current
+        if function == "VOLT:DC":
+            return voltage
+        return 0.0
+
+    @property
+    def devices(self):
+        # Device name -> address, in the form used for the application device menus
+        devices = {"HMC8043": self.servers[0].resource, "HMC8012": self.servers[1].resource}
+        if self.serial_port is not None:
+            devices["LowNoise"] = self.serial_port.port
+        return devices
+
+    def start(self):
+        for server in self.servers:
+            server.start()
+        if self.serial_port is not None:
+            self.serial_port.start()
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        if self.serial_port is not None:
+            self.serial_port.close()
+
+    def register(self, cache=None):
+        # Adds the emulated devices to the discovery cache, so the application lists them on startup
+        cache = cache or DiscoveryCache()
+        cache.resources[self.servers[0].resource] = "HMC8043"
+        cache.resources[self.servers[1].resource] = "HMC8012"
+        if self.serial_port is not None:
+            cache.serial_ports[self.serial_port.port] = "LowNoise"
+        cache.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emulates HMC8043, HMC8012 and LowNoise instruments")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--power-supply-port", type=int, default=5025)
+    parser.add_argument("--multimeter-port", type=int, default=5026)
+    parser.add_argument("--latency", type=float, default=0.0, help="delay per command in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform delay variation in seconds")
+    parser.add_argument("--command-latency", action="append", default=[], metavar="HEADER=SECONDS",
+                        help="delay of one command header (short form), e.g. MEAS:CURR:DC=0.1")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--settling-time", type=float, default=0.05, help="output time constant in seconds")
+    parser.add_argument("--measurement-timing", action="store_true",
+                        help="multimeter readings take the time of the ADC rate, configuring takes longer")
+    parser.add_argument("--no-lownoise", action="store_true")
+    parser.add_argument("--register", action="store_true", help="add the devices to the discovery cache")
+    options = parser.parse_args()
+
+    command_latency = {}
+    for item in options.command_latency:
+        header, _, seconds = item.partition("=")
+        command_latency[header.upper()] = float(seconds)
+    emulator = Emulator(options.host, options.power_supply_port, options.multimeter_port, options.latency,
+                        options.jitter, command_latency, options.seed, options.settling_time,
+                        low_noise=not options.no_lownoise, measurement_timing=options.measurement_timing).start()
+    for device, address in emulator.devices.items():
+        print(device + ": " + address)
+    if options.register:
+        emulator.register()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        emulator.stop()
+
+
+if __name__ == '__main__':
+    main()
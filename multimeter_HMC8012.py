@@ -1,226 +1,319 @@
-import random
+import re
 
-from driver import InstrumentDriver, exception_handler
+import numpy as np
 
+from driver import Command, InstrumentDriver, TERMINATION, exception_handler
 
-class DigitalMultimeterHMC8012(InstrumentDriver):
+NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
 
-    def __init__(self, address):
-        super(DigitalMultimeterHMC8012, self).__init__(address)
 
-    @exception_handler
-    def toggle_calculate_function(self, parameter='ON'):
-        """Write"""
-        # CALCulate[:STATe] {OFF | ON}
-        # Turns with the CALC FUNC command selected calculation function ON or OFF
-        self.manager.write("CALC " + str(parameter))
+def parse_data_log(data):
+    # Readings of a data log transfer as a float array, the reading is the last number of each line,
+    # lines without numbers (file headers) are skipped
+    if isinstance(data, bytes):
+        data = data.decode("ascii", "replace")
+    readings = []
+    for line in data.splitlines():
+        numbers = NUMBER.findall(line)
+        if numbers:
+            readings.append(numbers[-1])
+    return np.array(readings, dtype=np.float64)
 
-    @exception_handler
-    def calculate_function_state(self):
-        """Query"""
-        # CALCulate[:STATe]?
-        # Returns the state (ON/OFF) of the CALC FUNC command selected calculation function
-        value = self.manager.query("CALC?")
-        return value
 
-    @exception_handler
-    def calculate_average_average(self):
-        """Query"""
-        # CALCulate:AVERage:AVERage?
-        # Returns the mean value of the statistic function depending on the activated measurement function
-        value = self.manager.query("CALC:AVER:AVER?")
-        return value
+# Unit of the readings per measurement function, by the first node of the function
+FUNCTION_UNITS = {"VOLT": "V", "CURR": "A", "RES": "Ω", "FRES": "Ω", "CAP": "F", "FREQ": "Hz"}
 
-    @exception_handler
-    def calculate_average_clear(self):
-        """Write"""
-        # CALCulate:AVERage:CLEar
-        # Resets all statistic function values
-        self.manager.write("CALC:AVER:CLE")
+HMC8012_COMMANDS = (
+    # CALCulate[:STATe] {OFF | ON}
+    # Turns with the CALC FUNC command selected calculation function ON or OFF
+    Command("toggle_calculate_function", "Write", "CALC", parameter='ON'),
 
-    @exception_handler
-    def calculate_average_count(self):
-        """Query"""
-        # CALCulate:AVERage:COUNt?
-        # Returns the number of statistic measurement counts
-        value = self.manager.query("CALC:AVER:COUN?")
-        return value
+    # CALCulate[:STATe]?
+    # Returns the state (ON/OFF) of the CALC FUNC command selected calculation function
+    Command("calculate_function_state", "Query", "CALC?"),
 
-    @exception_handler
-    def calculate_average_maximum(self):
-        """Query"""
-        # CALCulate:AVERage:MAXimum?
-        # Returns the maximum value of the statistic function depending on the activated measurement function
-        value = self.manager.query("CALC:AVER:MAX?")
-        return value
+    # CALCulate:AVERage:AVERage?
+    # Returns the mean value of the statistic function depending on the activated measurement function
+    Command("calculate_average_average", "Query", "CALC:AVER:AVER?"),
 
-    @exception_handler
-    def calculate_average_minimum(self):
-        """Query"""
-        # CALCulate:AVERage:MINimum?
-        # Returns the minimum value of the statistic function depending on the activated measurement function
-        value = self.manager.query("CALC:AVER:MIN?")
-        return value
+    # CALCulate:AVERage:CLEar
+    # Resets all statistic function values
+    Command("calculate_average_clear", "Write", "CALC:AVER:CLE"),
 
-    @exception_handler
-    def calculate_average_ptpeak(self):
-        """Query"""
-        # CALCulate:AVERage:PTPeak?
-        # Returns the peak to peak value of the statistic function depending on the activated measurement function
-        value = self.manager.query("CALC:AVER:PTP?")
-        return value
+    # CALCulate:AVERage:COUNt?
+    # Returns the number of statistic measurement counts
+    Command("calculate_average_count", "Query", "CALC:AVER:COUN?"),
 
-    @exception_handler
-    def get_calculate_function(self):
-        """Query"""
-        # CALCulate:FUNCtion?
-        # Returns the calculation function
-        #  NULL: Null function
-        #  DB: dB function (available in DC V AC V, DC I, AC I)
-        #  DBM: dBm function (available in DC V AC V, DC I, AC I)
-        #  AVER: Statistic measurements
-        #  LIM: Limit lines
-        #  POW: DC power value (available in DC V/DC I or DC I/DC V mode)
-        value = self.manager.query("CALC:FUNC?")
-        return value
+    # CALCulate:AVERage:MAXimum?
+    # Returns the maximum value of the statistic function depending on the activated measurement function
+    Command("calculate_average_maximum", "Query", "CALC:AVER:MAX?"),
 
-    @exception_handler
-    def set_calculate_function(self, measurement_function='NULL'):
-        """Write"""
-        # CALCulate:FUNCtion {NULL | DB | DBM | AVERage | LIMit | POWer}
-        # Sets the calculation function, but does not activate the function
-        #  NULL: Null function
-        #  DB: dB function
-        #  DBM: dBm function
-        #  AVERage: Statistic measurements
-        #  LIMit: Limit lines
-        #  POWer: Power display
-        self.manager.write("CALC:FUNC " + str(measurement_function))
+    # CALCulate:AVERage:MINimum?
+    # Returns the minimum value of the statistic function depending on the activated measurement function
+    Command("calculate_average_minimum", "Query", "CALC:AVER:MIN?"),
 
-    @exception_handler
-    def get_calculate_null_offset(self, parameter='MIN'):
-        """Query"""
-        # CALCulate:NULL:OFFSet? {MINimum | MAXimum}
-        # Returns the maximum null value depending on the activated measurement function
-        value = self.manager.query("CALC:NULL:OFFS? " + str(parameter))
-        return value
+    # CALCulate:AVERage:PTPeak?
+    # Returns the peak to peak value of the statistic function depending on the activated measurement function
+    Command("calculate_average_ptpeak", "Query", "CALC:AVER:PTP?"),
 
-    @exception_handler
-    def set_calculate_null_offset(self, parameter='MIN'):
-        """Write"""
-        # CALCulate:NULL:OFFSet {<Value> | MINimum | MAXimum}
-        # Sets the maximum null value depending on the activated measurement function
-        self.manager.write("CALC:NULL:OFF " + str(parameter))
+    # CALCulate:FUNCtion?
+    # Returns the calculation function
+    #  NULL: Null function
+    #  DB: dB function (available in DC V AC V, DC I, AC I)
+    #  DBM: dBm function (available in DC V AC V, DC I, AC I)
+    #  AVER: Statistic measurements
+    #  LIM: Limit lines
+    #  POW: DC power value (available in DC V/DC I or DC I/DC V mode)
+    Command("get_calculate_function", "Query", "CALC:FUNC?"),
 
-    @exception_handler
-    def measure_capacitance(self, measurement_range='AUTO'):
-        """Query"""
-        # MEASure:CAPacitance? [{<Range>| AUTO | MIN | MAX | DEF}]
-        # Configures the instrument for capacitance measurements
-        #  <Range> 5nF, 50nF, 500nF, 5µF, 50µF, 500µF
-        #  AUTO: Auto range selection
-        #  MIN: 5nF range selection
-        #  MAX: 500µF range selection
-        #  DEF: 5nF range selection
-        value = self.manager.query("MEAS:CAP? " + str(measurement_range))
-        return value
+    # CALCulate:FUNCtion {NULL | DB | DBM | AVERage | LIMit | POWer}
+    # Sets the calculation function, but does not activate the function
+    #  NULL: Null function
+    #  DB: dB function
+    #  DBM: dBm function
+    #  AVERage: Statistic measurements
+    #  LIMit: Limit lines
+    #  POWer: Power display
+    Command("set_calculate_function", "Write", "CALC:FUNC", parameter='NULL', argument="measurement_function"),
 
-    @exception_handler
-    def measure_continuity(self):
-        """Query"""
-        # MEASure:CONTinuity?
-        # Configures the instrument for continuity measurements
-        # Returns a single reading, the range is fixed (4000Ω)
-        value = self.manager.query("MEAS:CONT?")
-        return value
+    # CALCulate:NULL:OFFSet? {MINimum | MAXimum}
+    # Returns the maximum null value depending on the activated measurement function
+    Command("get_calculate_null_offset", "Query", "CALC:NULL:OFFS?", parameter='MIN'),
 
-    @exception_handler
-    def measure_current_ac(self, measurement_range='AUTO'):
-        """Query"""
-        # MEASure:CURRent:AC? [{<Range>| AUTO | MIN | MAX | DEF}]
-        # Configures the instrument for AC I measurements
-        #  <Range> 20mA, 200mA, 2A, 10A
-        #  AUTO: Auto range selection
-        #  MIN: 20mA range selection
-        #  MAX: 10A range selection
-        #  DEF: 20mA range selection
-        value = self.manager.query("MEAS:CURR:AC? " + str(measurement_range))
-        return value
+    # CALCulate:NULL:OFFSet {<Value> | MINimum | MAXimum}
+    # Sets the maximum null value depending on the activated measurement function
+    Command("set_calculate_null_offset", "Write", "CALC:NULL:OFF", parameter='MIN'),
 
-    @exception_handler
-    def measure_current_dc(self, measurement_range='AUTO'):
-        """Query"""
-        # MEASure:CURRent:DC? [{<Range>| AUTO | MIN | MAX | DEF}]
-        # Configures the instrument for DC I measurements
-        #  <Range> 20mA, 200mA, 2A, 10A
-        #  AUTO: Auto range selection
-        #  MIN: 20mA range selection
-        #  MAX: 10A range selection
-        #  DEF: 20mA range selection
-        value = self.manager.query("MEAS:CURR:DC? " + str(measurement_range))
-        return value
+    # DATA:LOG:COUNt?
+    # Returns the number of readings the data logging stores in COUNt mode
+    Command("get_data_log_count", "Query", "DATA:LOG:COUN?"),
 
-    @exception_handler
-    def measure_diode(self):
-        """Query"""
-        # MEASure:DIODe?
-        # Configures the instrument for diode tests
-        # Returns a single reading, the range is fixed (5V)
-        value = self.manager.query("MEAS:DIOD?")
-        return value
+    # DATA:LOG:COUNt {<Count> | MINimum | MAXimum}
+    # Sets the number of readings the data logging stores in COUNt mode
+    Command("set_data_log_count", "Write", "DATA:LOG:COUN", parameter='MAX', argument="count"),
 
-    @exception_handler
-    def measure_frequency_current(self, measurement_range='AUTO'):
-        """Query"""
-        # MEASure:FREQuency:CURRent [{<Range>| AUTO | MIN | MAX | DEF}]
-        # Configures the instrument for frequency measurements with main function AC I
-        #  <Range> AC current: 20mA, 200mA (5Hz to 10kHz)
-        #                      2A, 10A (5Hz to 5kHz)
-        #  AUTO: Auto range selection
-        #  MIN: 20mA range selection
-        #  MAX: 10A range selection
-        #  DEFault: 20mA range selection
-        value = self.manager.query("MEAS:FREQ:CURR " + str(measurement_range))
-        return value
+    # DATA:LOG:INTerval?
+    # Returns the data logging interval in seconds
+    Command("get_data_log_interval", "Query", "DATA:LOG:INT?", unit="s"),
+
+    # DATA:LOG:INTerval {<Interval> | MINimum | MAXimum}
+    # Sets the data logging interval in seconds
+    #  <Interval> 0.1s to 3600s
+    Command("set_data_log_interval", "Write", "DATA:LOG:INT", parameter='MIN', argument="interval"),
+
+    # DATA:LOG:MODE?
+    # Returns the data logging mode
+    Command("get_data_log_mode", "Query", "DATA:LOG:MODE?"),
+
+    # DATA:LOG:MODE {UNLimited | COUNt | TIME}
+    # Sets the data logging mode
+    #  UNLimited: Logs until the memory is full or logging is stopped
+    #  COUNt: Logs the number of readings set by DATA:LOG:COUNt
+    #  TIME: Logs for the time set by DATA:LOG:TIME
+    Command("set_data_log_mode", "Write", "DATA:LOG:MODE", parameter='COUN', argument="mode"),
+
+    # DATA:LOG:STATe?
+    # Returns the state (0/1) of the data logging
+    Command("get_data_log_state", "Query", "DATA:LOG:STAT?"),
+
+    # DATA:LOG:STATe {OFF | ON}
+    # Starts or stops the data logging
+    Command("set_data_log_state", "Write", "DATA:LOG:STAT", parameter='ON', argument="state"),
+
+    # DATA:POINts?
+    # Returns the number of readings stored by the data logging
+    Command("data_log_points", "Query", "DATA:POIN?"),
+
+    # FETCh?
+    # Returns the last reading of the configured measurement function without starting a new measurement
+    Command("fetch", "Query", "FETC?"),
+
+    # READ?
+    # Starts a measurement with the configured measurement function and range and returns the reading
+    Command("read", "Query", "READ?"),
+
+    # [SENSe:]ADCRate?
+    # Returns the measurement rate
+    Command("get_adc_rate", "Query", "SENS:ADCR?"),
+
+    # [SENSe:]ADCRate {SLOW | MEDium | FAST}
+    # Sets the measurement rate
+    #  SLOW: 5 readings/s
+    #  MEDium: 10 readings/s
+    #  FAST: 200 readings/s
+    Command("set_adc_rate", "Write", "SENS:ADCR", parameter='MED', argument="adc_rate"),
+
+    # MEASure:CAPacitance? [{<Range>| AUTO | MIN | MAX | DEF}]
+    # Configures the instrument for capacitance measurements
+    #  <Range> 5nF, 50nF, 500nF, 5µF, 50µF, 500µF
+    #  AUTO: Auto range selection
+    #  MIN: 5nF range selection
+    #  MAX: 500µF range selection
+    #  DEF: 5nF range selection
+    Command("measure_capacitance", "Query", "MEAS:CAP?", parameter='AUTO', argument="measurement_range", unit="F"),
+
+    # MEASure:CONTinuity?
+    # Configures the instrument for continuity measurements
+    # Returns a single reading, the range is fixed (4000Ω)
+    Command("measure_continuity", "Query", "MEAS:CONT?", unit="Ω"),
+
+    # MEASure:CURRent:AC? [{<Range>| AUTO | MIN | MAX | DEF}]
+    # Configures the instrument for AC I measurements
+    #  <Range> 20mA, 200mA, 2A, 10A
+    #  AUTO: Auto range selection
+    #  MIN: 20mA range selection
+    #  MAX: 10A range selection
+    #  DEF: 20mA range selection
+    Command("measure_current_ac", "Query", "MEAS:CURR:AC?", parameter='AUTO', argument="measurement_range", unit="A"),
+
+    # MEASure:CURRent:DC? [{<Range>| AUTO | MIN | MAX | DEF}]
+    # Configures the instrument for DC I measurements
+    #  <Range> 20mA, 200mA, 2A, 10A
+    #  AUTO: Auto range selection
+    #  MIN: 20mA range selection
+    #  MAX: 10A range selection
+    #  DEF: 20mA range selection
+    Command("measure_current_dc", "Query", "MEAS:CURR:DC?", parameter='AUTO', argument="measurement_range", unit="A"),
+
+    # MEASure:DIODe?
+    # Configures the instrument for diode tests
+    # Returns a single reading, the range is fixed (5V)
+    Command("measure_diode", "Query", "MEAS:DIOD?", unit="V"),
+
+    # MEASure:FREQuency:CURRent [{<Range>| AUTO | MIN | MAX | DEF}]
+    # Configures the instrument for frequency measurements with main function AC I
+    #  <Range> AC current: 20mA, 200mA (5Hz to 10kHz)
+    #                      2A, 10A (5Hz to 5kHz)
+    #  AUTO: Auto range selection
+    #  MIN: 20mA range selection
+    #  MAX: 10A range selection
+    #  DEFault: 20mA range selection
+    Command("measure_frequency_current", "Query", "MEAS:FREQ:CURR", parameter='AUTO', argument="measurement_range",
+            unit="Hz"),
+
+    # MEASure:FREQuency[:VOLTAGE]? [{<Range>| AUTO | MIN | MAX | DEF}]
+    # Configures the instrument for frequency measurements with main function AC V
+    #  <Range> AC voltage: 400mV, 4V, 40V, 400V, 750V (5Hz to 700kHz)
+    #  AUTO: Auto range selection
+    #  MIN: 400mV range selection
+    #  MAX: 750V range selection
+    #  DEFault: 400mV range selection
+    Command("measure_frequency_voltage", "Query", "MEAS:FREQ?", parameter='AUTO', argument="measurement_range",
+            unit="Hz"),
+
+    # MEASure:FRESistance? [{<Range>| AUTO | MIN | MAX | DEF}]
+    # Configures the instrument for 4-wire resistance measurements
+    #  <Range> 400Ω, 4kΩ, 40kΩ, 400kΩ, 4MΩ
+    #  AUTO: Auto range selection
+    #  MIN:	400Ω
+    #  MAX:	4MΩ
+    #  DEF:	400Ω
+    Command("measure_fresistance", "Query", "MEAS:FRES?", parameter='AUTO', argument="measurement_range", unit="Ω"),
+
+    # MEASure:RESistance? [{<Range>| AUTO | MIN | MAX | DEF}]
+    # Configures the instrument for 2-wire resistance measurements
+    #  <Range> 400Ω, 4kΩ, 40kΩ, 400kΩ, 4MΩ, 40MΩ, 250MΩ
+    #  AUTO: Auto range selection
+    #  MIN:	400Ω range selection
+    #  MAX: 250MΩ range selection
+    #  DEFault: 400Ω range selection
+    Command("measure_resistance", "Query", "MEAS:RES?", parameter='AUTO', argument="measurement_range", unit="Ω"),
+
+    # MEASure[:VOLTage]:AC? [{<Range>| AUTO | MIN | MAX | DEF}]
+    # Configures the instrument for AC V measurements
+    #  <Range> 400mV, 4V, 40V, 400V, 750V
+    #  AUTO: Auto range selection
+    #  MIN: 400mV range selection
+    #  MAX: 750V range selection
+    #  DEF: 400mV range selection
+    Command("measure_voltage_ac", "Query", "MEAS:AC?", parameter='AUTO', argument="measurement_range", unit="V"),
+
+    # MEASure[:VOLTage][:DC]? [{<Range>| AUTO | MIN | MAX | DEF}]
+    # Configures the instrument for DC V measurements
+    #  <Range> 400mV, 4V, 40V, 400V, 750V
+    #  AUTO: Auto range selection
+    #  MIN: 400mV range selection
+    #  MAX: 750V range selection
+    #  DEF: 400mV range selection
+    Command("measure_voltage_dc", "Query", "MEAS?", parameter='AUTO', argument="measurement_range", unit="V"),
+
+    # UNIT:TEMPerature?
+    # Returns the unit of the temperature measurement function
+    #  C: °C is activated
+    #  K: Kelvins is activated
+    #  F: °F is activated
+    Command("get_temperature_unit", "Query", "UNIT:TEMP?"),
+
+    # UNIT:TEMPerature {C | K | F}
+    # Selects the unit of the temperature measurement function
+    #  C: °C
+    #  K: Kelvins
+    #  F: °F
+    Command("set_temperature_unit", "Write", "UNIT:TEMP", parameter='C', argument="temperature_unit"),
+)
 
-    @exception_handler
-    def measure_frequency_voltage(self, measurement_range='AUTO'):
-        """Query"""
-        # MEASure:FREQuency[:VOLTAGE]? [{<Range>| AUTO | MIN | MAX | DEF}]
-        # Configures the instrument for frequency measurements with main function AC V
-        #  <Range> AC voltage: 400mV, 4V, 40V, 400V, 750V (5Hz to 700kHz)
-        #  AUTO: Auto range selection
-        #  MIN: 400mV range selection
-        #  MAX: 750V range selection
-        #  DEFault: 400mV range selection
-        value = self.manager.query("MEAS:FREQ? " + str(measurement_range))
-        return value
+
+class DigitalMultimeterHMC8012(InstrumentDriver):
+    commands = HMC8012_COMMANDS
+
+    def __init__(self, address):
+        super(DigitalMultimeterHMC8012, self).__init__(address)
 
     @exception_handler
-    def measure_fresistance(self, measurement_range='AUTO'):
-        """Query"""
-        # MEASure:FRESistance? [{<Range>| AUTO | MIN | MAX | DEF}]
-        # Configures the instrument for 4-wire resistance measurements
-        #  <Range> 400Ω, 4kΩ, 40kΩ, 400kΩ, 4MΩ
-        #  AUTO: Auto range selection
-        #  MIN:	400Ω
-        #  MAX:	4MΩ
-        #  DEF:	400Ω
-        value = self.manager.query("MEAS:FRES? " + str(measurement_range))
-        return value
+    def configure(self, measurement_function='VOLT:DC', measurement_range='AUTO'):
+        """Write"""
+        # CONFigure:<Function> [{<Range>| AUTO | MIN | MAX | DEF}]
+        # Configures the instrument for measurements with READ? and FETCh?, unlike MEASure? it sends no reading
+        #  <Function> VOLT:DC, VOLT:AC, CURR:DC, CURR:AC, RES, FRES, CAP, FREQ:VOLT, FREQ:CURR
+        self.manager.write("CONF:" + str(measurement_function) + " " + str(measurement_range))
+
+    def acquire(self, measurement_function='VOLT:DC', measurement_range='AUTO', adc_rate=None, count=None,
+                configured=False):
+        # Generator of readings (results of read) for long logging runs and sweeps. Function, range and
+        # ADC rate are configured once, on the first reading (not at all if configured beforehand),
+        # each reading is then a single READ? query. Stops after count readings (endless if None)
+        # or after the first failed one
+        #  for reading in multimeter.acquire('CURR:DC', adc_rate='FAST', count=1000):
+        #      reading.value
+        if not configured:
+            with self.batch() as transaction:
+                self.configure(measurement_function, measurement_range)
+                if adc_rate is not None:
+                    self.set_adc_rate(adc_rate)
+            for result in transaction.results:
+                if not result[0]:
+                    yield result
+                    return
+        unit = FUNCTION_UNITS.get(str(measurement_function).upper().split(":")[0])
+        taken = 0
+        while count is None or taken < count:
+            reading = self.read()
+            if reading[0]:
+                reading.unit = unit
+            yield reading
+            if not reading[0]:
+                return
+            taken += 1
+
+    def start_data_log(self, interval='MIN', count='MAX'):
+        # Configures logging of count readings every interval seconds into the instrument memory
+        # and starts it, all in one message; returns the results of the commands sent
+        with self.batch() as transaction:
+            self.set_data_log_state('OFF')
+            self.set_data_log_mode('COUN')
+            self.set_data_log_count(count)
+            self.set_data_log_interval(interval)
+            self.set_data_log_state('ON')
+        return transaction.results
 
     @exception_handler
-    def measure_resistance(self, measurement_range='AUTO'):
+    def download_data_log(self):
         """Query"""
-        # MEASure:RESistance? [{<Range>| AUTO | MIN | MAX | DEF}]
-        # Configures the instrument for 2-wire resistance measurements
-        #  <Range> 400Ω, 4kΩ, 40kΩ, 400kΩ, 4MΩ, 40MΩ, 250MΩ
-        #  AUTO: Auto range selection
-        #  MIN:	400Ω range selection
-        #  MAX: 250MΩ range selection
-        #  DEFault: 400Ω range selection
-        value = self.manager.query("MEAS:RES? " + str(measurement_range))
-        return value
+        # DATA:DATA?
+        # Transfers the readings stored by the data logging in one definite length block,
+        # the value of the result is a NumPy array of the readings
+        self.manager.write_raw(b"DATA:DATA?" + TERMINATION)
+        return parse_data_log(self.manager.read_binary_values(datatype='s', container=bytes))
 
     @exception_handler
     def measure_temperature(self, probe_type='DEF', sensor_type='DEF', unit='C'):
@@ -234,50 +327,3 @@ class DigitalMultimeterHMC8012(InstrumentDriver):
             return ret
         value = self.manager.query("MEAS:TEMP? " + str(probe_type) + ',' + str(sensor_type))
         return value
-
-    @exception_handler
-    def measure_voltage_ac(self, measurement_range='AUTO'):
-        """Query"""
-        # MEASure[:VOLTage]:AC? [{<Range>| AUTO | MIN | MAX | DEF}]
-        # Configures the instrument for AC V measurements
-        #  <Range> 400mV, 4V, 40V, 400V, 750V
-        #  AUTO: Auto range selection
-        #  MIN: 400mV range selection
-        #  MAX: 750V range selection
-        #  DEF: 400mV range selection
-        value = self.manager.query("MEAS:AC? " + str(measurement_range))
-        return value
-
-    @exception_handler
-    def measure_voltage_dc(self, measurement_range='AUTO'):
-        """Query"""
-        # MEASure[:VOLTage][:DC]? [{<Range>| AUTO | MIN | MAX | DEF}]
-        # Configures the instrument for DC V measurements
-        #  <Range> 400mV, 4V, 40V, 400V, 750V
-        #  AUTO: Auto range selection
-        #  MIN: 400mV range selection
-        #  MAX: 750V range selection
-        #  DEF: 400mV range selection
-        value = self.manager.query("MEAS? " + str(measurement_range))
-        return value
-
-    @exception_handler
-    def get_temperature_unit(self):
-        """Query"""
-        # UNIT:TEMPerature?
-        # Returns the unit of the temperature measurement function
-        #  C: °C is activated
-        #  K: Kelvins is activated
-        #  F: °F is activated
-        value = self.manager.query("UNIT:TEMP?")
-        return value
-
-    @exception_handler
-    def set_temperature_unit(self, temperature_unit='C'):
-        """Write"""
-        # UNIT:TEMPerature {C | K | F}
-        # Selects the unit of the temperature measurement function
-        #  C: °C
-        #  K: Kelvins
-        #  F: °F
-        self.manager.write("UNIT:TEMP " + str(temperature_unit))
@@ -1,636 +1,528 @@
-from driver import InstrumentDriver, exception_handler
+import re
+import time
 
+import numpy as np
 
-class PowerSupplyHMC804x(InstrumentDriver):
-
-    def __init__(self, address):
-        super(PowerSupplyHMC804x, self).__init__(address)
-
-    @exception_handler
-    def set_output_channel(self, parameter='OUT1'):
-        """Write"""
-        # INSTrument[:SELect] {OUTPut1 | OUTPut2 | OUTPut3 | OUT1 | OUT2 | OUT3}
-        # Selects a channel
-        self.manager.write("INST " + str(parameter))
-
-    @exception_handler
-    def get_output_channel(self):
-        """Query"""
-        # INSTrument[:SELect]?
-        # Returns the channel selection
-        value = self.manager.query("INST?")
-        return value
-
-    @exception_handler
-    def set_fuse_state(self, parameter='1', channel='OUT1'):
-        """Write"""
-        # FUSE[:STATe] {ON | OFF | 0 | 1}
-        # Activates or deactivates the fuse for the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("FUSE " + str(parameter))
-        # print("FUSE " + str(parameter))
-
-    @exception_handler
-    def get_fuse_state(self, channel='OUT1'):
-        """Query"""
-        # FUSE[:STATe]?
-        # Returns the fuse state of the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("FUSE?")
-        return value
-
-    @exception_handler
-    def set_fuse_delay(self, parameter='MIN', channel='OUT1'):
-        """Write"""
-        # FUSE:DELay {<Delay>| MIN | MAX}
-        # Defines a fuse delay for the previous selected channel
-        #  <Delay> 10ms to 10s (adjustable in 1ms steps)
-        #  MIN: 1.000E-02 (FUSE:DELay 0.01)
-        #  MAX: 1.000E+01 (FUSE:DELay 10)
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("FUSE:DEL " + str(parameter))
-
-    @exception_handler
-    def get_fuse_delay(self, channel='OUT1'):
-        """Query"""
-        # FUSE:DELay? [MIN | MAX]
-        # Returns the fuse delay time for the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("FUSE:DEL?")
-        return value
-
-    @exception_handler
-    def set_fuse_link(self, parameter='1', channel='OUT1'):
-        """Write"""
-        # FUSE:LINK {1 | 2 | 3}
-        # Combines the channel fuses (fuse linking) for the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("FUSE:LINK " + str(parameter))
-
-    @exception_handler
-    def get_fuse_link(self, parameter='1', channel='OUT1'):
-        """Query"""
-        # FUSE:LINK? {1 | 2 | 3}
-        # Returns the combined fuses. If the fuse of channel 1 is linked with fuse of channel 2, a „1“ is
-        # returned; when the fuse of channel 1 is not linked to the fuse of channel 2, it returns a „0“
-        #  1: Fuse is linked
-        #  0: Fuse is not linked
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("FUSE:LINK? " + str(parameter))
-        return value
-
-    @exception_handler
-    def fuse_unlink(self, parameter='1'):
-        """Write"""
-        # FUSE:UNLink {1 | 2 | 3}
-        # Unlinks the channel fuses
-        #  1 = channel CH1
-        #  2 = channel CH2
-        #  3 = channel CH3
-        self.manager.write("FUSE:UNL " + str(parameter))
-
-    @exception_handler
-    def fuse_trip(self, channel='OUT1'):
-        """Query"""
-        # FUSE:TRIPed?
-        # Returns the fuse trip of the previous selected channel
-        #  1: Fuse is tripped.
-        #  0: Fuse is not tripped
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("FUSE:TRIP?")
-        # value = "return FUSE:TRIP?"
-        return value
-
-    @exception_handler
-    def measure_scalar_current_dc(self, channel='OUT1'):
-        """Query"""
-        # MEASure[:SCALar]:CURRent[:DC]?
-        # Returns the measured current value of the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("MEAS:CURR?")
-        # value = "return:MEAS:CURR?"
-        return value
-
-    @exception_handler
-    def measure_scalar_voltage_dc(self, channel='OUT1'):
-        """Query"""
-        # MEASure[:SCALar][:VOLTage][:DC]?
-        # Returns the measured voltage value of the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("MEAS?")
-        return value
-
-    @exception_handler
-    def measure_scalar_power(self, channel='OUT1'):
-        """Query"""
-        # MEASure[:SCALar]:POWer?
-        # Returns the measured power value of the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("MEAS:POW?")
-        return value
-
-    @exception_handler
-    def measure_scalar_energy(self, channel='OUT1'):
-        """Query"""
-        # MEASure[:SCALar]:ENERgy?
-        # Returns the measured current released energy value of the previous selected channel in Ws
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("MEAS:ENER?")
-        return value
-
-    @exception_handler
-    def set_measure_scalar_energy_state(self, parameter='1', channel='OUT1'):
-        """Write"""
-        # MEASure[:SCALar]:ENERgy:STATe {ON | OFF | 1 | 0}
-        # Activates or deactivates the energy meter function
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("MEAS:ENER:STAT " + str(parameter))
+from driver import STB_QUESTIONABLE, TERMINATION, Command, InstrumentDriver, exception_handler
 
-    @exception_handler
-    def get_measure_scalar_energy_state(self, channel='OUT1'):
-        """Query"""
-        # MEASure[:SCALar]:ENERgy:STATe?
-        # Returns the energy meter state of the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("MEAS:ENER:STAT?")
-        return value
 
-    @exception_handler
-    def measure_scalar_energy_reset(self, channel='OUT1'):
-        """Write"""
-        # MEASure[:SCALar]:ENERgy:RESet
-        # Resets the energy meter value of the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("MEAS:ENER:RES")
+def channel_name(parameter):
+    # Normalizes channel identifiers (OUTPut1, OUTP1, OUT1, 1) to the OUT<n> form
+    name = str(parameter).strip().upper()
+    number = re.search(r"(\d+)$", name)
+    if number is not None and (name.startswith("OUT") or name.isdigit()):
+        return "OUT" + number.group(1)
+    return name
+
+
+# Most points of an ARB table, dwell times of the points in seconds
+ARB_MAX_POINTS = 512
+ARB_MIN_DWELL = 0.01
+ARB_MAX_DWELL = 60
+
+
+# Bits of the STATus:QUEStionable:INSTrument:ISUMmary<n> registers of a channel, of
+# STATus:QUEStionable (INSTrument summary); the INSTrument register has bit n for channel n
+ISUM_OVP_TRIPPED = 1 << 9
+ISUM_FUSE_TRIPPED = 1 << 10
+ISUM_OPP_TRIPPED = 1 << 11
+QUES_INSTRUMENT = 1 << 13
+
+PROTECTION_EVENTS = (
+    (ISUM_OVP_TRIPPED, "ovp"),
+    (ISUM_OPP_TRIPPED, "opp"),
+    (ISUM_FUSE_TRIPPED, "fuse"),
+)
+PROTECTION_MASK = ISUM_OVP_TRIPPED | ISUM_OPP_TRIPPED | ISUM_FUSE_TRIPPED
+
+
+def channel_number(parameter):
+    # Number of a channel given in any form channel_name accepts, e.g. OUTP2 -> "2"
+    return channel_name(parameter)[3:]
+
+
+HMC804X_COMMANDS = (
+    # ARBitrary:CLEar
+    # Clears the ARB table of the instrument
+    Command("arb_clear", "Write", "ARB:CLE"),
+
+    # ARBitrary:DATA?
+    # Returns the ARB table as voltage, current, dwell time and interpolation of each point
+    Command("get_arb_data", "Query", "ARB:DATA?"),
+
+    # ARBitrary:REPetitions {<Repetitions> | MINimum | MAXimum}
+    # Sets how often the ARB table is played, 0 plays it until ARB:STOP
+    #  <Repetitions> 0 to 255
+    Command("set_arb_repetitions", "Write", "ARB:REP", parameter='1', argument="repetitions"),
+
+    # ARBitrary:REPetitions?
+    # Returns how often the ARB table is played
+    Command("get_arb_repetitions", "Query", "ARB:REP?"),
+
+    # ARBitrary:TRANsfer {1 | 2 | 3}
+    # Transfers the ARB table to the channel with the number
+    Command("arb_transfer", "Write", "ARB:TRAN", parameter='1', argument="channel", formatter=channel_number),
+
+    # ARBitrary:STARt {1 | 2 | 3}
+    # Starts playing the transferred ARB table on the channel with the number, the output has to be on
+    Command("arb_start", "Write", "ARB:STAR", parameter='1', argument="channel", formatter=channel_number),
+
+    # ARBitrary:STOP {1 | 2 | 3}
+    # Stops playing the ARB table on the channel with the number
+    Command("arb_stop", "Write", "ARB:STOP", parameter='1', argument="channel", formatter=channel_number),
+
+    # FUSE[:STATe] {ON | OFF | 0 | 1}
+    # Activates or deactivates the fuse for the previous selected channel
+    Command("set_fuse_state", "Write", "FUSE", parameter='1', channel=True),
+
+    # FUSE[:STATe]?
+    # Returns the fuse state of the previous selected channel
+    Command("get_fuse_state", "Query", "FUSE?", channel=True),
+
+    # FUSE:DELay {<Delay>| MIN | MAX}
+    # Defines a fuse delay for the previous selected channel
+    #  <Delay> 10ms to 10s (adjustable in 1ms steps)
+    #  MIN: 1.000E-02 (FUSE:DELay 0.01)
+    #  MAX: 1.000E+01 (FUSE:DELay 10)
+    Command("set_fuse_delay", "Write", "FUSE:DEL", parameter='MIN', channel=True),
+
+    # FUSE:DELay? [MIN | MAX]
+    # Returns the fuse delay time for the previous selected channel
+    Command("get_fuse_delay", "Query", "FUSE:DEL?", channel=True, unit="s"),
+
+    # FUSE:LINK {1 | 2 | 3}
+    # Combines the channel fuses (fuse linking) for the previous selected channel
+    Command("set_fuse_link", "Write", "FUSE:LINK", parameter='1', channel=True),
+
+    # FUSE:LINK? {1 | 2 | 3}
+    # Returns the combined fuses. If the fuse of channel 1 is linked with fuse of channel 2, a „1“ is
+    # returned; when the fuse of channel 1 is not linked to the fuse of channel 2, it returns a „0“
+    #  1: Fuse is linked
+    #  0: Fuse is not linked
+    Command("get_fuse_link", "Query", "FUSE:LINK?", parameter='1', channel=True),
+
+    # FUSE:UNLink {1 | 2 | 3}
+    # Unlinks the channel fuses
+    #  1 = channel CH1
+    #  2 = channel CH2
+    #  3 = channel CH3
+    Command("fuse_unlink", "Write", "FUSE:UNL", parameter='1'),
+
+    # FUSE:TRIPed?
+    # Returns the fuse trip of the previous selected channel
+    #  1: Fuse is tripped.
+    #  0: Fuse is not tripped
+    Command("fuse_trip", "Query", "FUSE:TRIP?", channel=True),
+
+    # MEASure[:SCALar]:CURRent[:DC]?
+    # Returns the measured current value of the previous selected channel
+    Command("measure_scalar_current_dc", "Query", "MEAS:CURR?", channel=True, unit="A"),
+
+    # MEASure[:SCALar][:VOLTage][:DC]?
+    # Returns the measured voltage value of the previous selected channel
+    Command("measure_scalar_voltage_dc", "Query", "MEAS?", channel=True, unit="V"),
+
+    # MEASure[:SCALar]:POWer?
+    # Returns the measured power value of the previous selected channel
+    Command("measure_scalar_power", "Query", "MEAS:POW?", channel=True, unit="W"),
+
+    # MEASure[:SCALar]:ENERgy?
+    # Returns the measured current released energy value of the previous selected channel in Ws
+    Command("measure_scalar_energy", "Query", "MEAS:ENER?", channel=True, unit="Ws"),
+
+    # MEASure[:SCALar]:ENERgy:STATe {ON | OFF | 1 | 0}
+    # Activates or deactivates the energy meter function
+    Command("set_measure_scalar_energy_state", "Write", "MEAS:ENER:STAT", parameter='1', channel=True),
+
+    # MEASure[:SCALar]:ENERgy:STATe?
+    # Returns the energy meter state of the previous selected channel
+    Command("get_measure_scalar_energy_state", "Query", "MEAS:ENER:STAT?", channel=True),
+
+    # MEASure[:SCALar]:ENERgy:RESet
+    # Resets the energy meter value of the previous selected channel
+    Command("measure_scalar_energy_reset", "Write", "MEAS:ENER:RES", channel=True),
+
+    # OUTPut[:STATe] {OFF | ON | 0 | 1}
+    # Activates or deactivates the previous selected channel and turning on the master output
+    #  1: Channel and master output will be activated
+    #  0: Channel will be deactivated
+    Command("set_output_state", "Write", "OUTP", parameter='0', channel=True),
+
+    # OUTPut[:STATe]?
+    # Returns the output state
+    Command("get_output_state", "Query", "OUTP?"),
+
+    # OUTPut:CHANnel[:STATe] {OFF | ON | 0 | 1}
+    # Activates or deactivates the previous selected channel
+    Command("set_output_channel_state", "Write", "OUTP:CHAN", parameter='0', channel=True),
+
+    # OUTPut:CHANnel[:STATe]?
+    # Returns the channel output state
+    Command("get_output_channel_state", "Query", "OUTP:CHAN?"),
+
+    # OUTPut:MASTer[:STATe] {OFF | ON | 0 | 1}
+    # Turning on / off all previous selected channels simultaneously
+    #  1: Master output will be activated
+    #  0: Master output will be deactivated
+    Command("set_output_master_state", "Write", "OUTP:MAST", parameter='0', channel=True),
+
+    # OUTPut:MASTer[:STATe]?
+    # Returns the master output state
+    Command("get_output_master_state", "Query", "OUTP:MAST?"),
+
+    # [SOURce:]CURRent[:LEVel][:IMMediate][:AMPLitude] {<Current>| MIN | MAX}
+    # Sets the current value of the selected channel
+    #  <Current> Adjustable in 0.1mA (I<1A) / 1mA (I≥1A) steps.
+    #  MIN: 0.5mA
+    #  MAX: 3.000A
+    Command("set_source_current_level_immediate_amplitude", "Write", "CURR", parameter='MIN', channel=True),
+
+    # [SOURce:]CURRent[:LEVel][:IMMediate][:AMPLitude]? [MIN | MAX]
+    # Returns the current value of the selected channel
+    Command("get_source_current_level_immediate_amplitude", "Query", "CURR?", channel=True, unit="A"),
+
+    # [SOURce:]CURRent[:LEVel][:IMMediate][:AMPLitude] {UP | DOWN}
+    # Increases (UP) resp. decreases (DOWN) the current value of the selected channel
+    Command("vary_source_current_level_immediate_amplitude", "Write", "CURR", parameter='UP', channel=True),
+
+    # [SOURce:]CURRent[:LEVel]:STEP[:INCRement) {<Numeric Value>| DEFault}
+    # Defines the current step size for the CURR UP (CURR DOWN) command
+    #  <Numeric Value> Adjustable in 0.1mA (I<1A) / 1mA (I≥1A) steps.
+    #  5.0000E-04 to 3.000E+00  (R&S®HMC8043)
+    #  5.0000E-04 to 5.000E+00  (R&S®HMC8042)
+    #  5.0000E-04 to 1.0000E+01 (R&S®HMC8041)
+    #  DEF: 1.0000E-01
+    Command("set_source_current_level_step_increment", "Write", "CURR:STEP", parameter='DEF'),
+
+    # [SOURce:]CURRent[:LEVel]:STEP[:INCRement]? [Default]
+    # Returns the current step size
+    Command("get_source_current_level_step_increment", "Query", "CURR:STEP?", channel=True, unit="A"),
+
+    # [SOURce:]VOLTage:PROTection[:STATe] {OFF | ON | 0 | 1}
+    # Activates (1) or deactivates (0) the OVP for the previous selected channel
+    Command("set_source_voltage_protection_state", "Write", "VOLT:PROT", parameter='0', channel=True),
+
+    # [SOURce:]VOLTage:PROTection[:STATe]?
+    # Returns the OVP state of the previous selected channel
+    Command("get_source_voltage_protection_state", "Query", "VOLT:PROT?", channel=True),
+
+    # [SOURce:]VOLTage:PROTection:LEVel {<Voltage>| MIN | MAX | DEF}
+    # Sets the OVP value of the previous selected channel
+    #  <Voltage> 0V to 32.50V (adjustable in 1mV steps)
+    #  MIN: 0.000E+00
+    #  MAX: 3.2050E+01
+    #  DEF: 3.2050E+01
+    Command("set_source_voltage_protection_level", "Write", "VOLT:PROT:LEV", parameter='DEF', channel=True),
+
+    # [SOURce:]VOLTage:PROTection:LEVel? [MIN | MAX | DEF]
+    # Returns the OVP value of the previous selected channel
+    Command("get_source_voltage_protection_level", "Query", "VOLT:PROT:LEV?", channel=True, unit="V"),
+
+    # [SOURce:]VOLTage:PROTection:TRIPped?
+    # Returns the OVP state of the previous selected channel
+    #  1: OVP is tripped
+    #  0: OVP is not tripped
+    Command("source_voltage_protection_trip", "Query", "VOLT:PROT:TRIP?", channel=True),
+
+    # [SOURce:]VOLTage:PROTection:CLEar
+    # Resets the OVP state of the selected channel
+    Command("source_voltage_protection_clear", "Write", "VOLT:PROT:CLE", channel=True),
+
+    # [SOURce:]VOLTage:PROTection:MODE {MEASured | PROTected}
+    # Sets the OVP mode for the previous selected channel
+    #  MEASured: The OVP switches off if the measured value exceeds the threshold
+    #  PROTected: If the adjusted threshold is exceeded the output of the instrument will be not switched on
+    Command("set_source_voltage_protection_mode", "Write", "VOLT:PROT:MODE", parameter='MEAS', channel=True),
+
+    # [SOURce:]VOLTage:PROTection:MODE?
+    # Returns the OVP mode for the previous selected channel
+    Command("get_source_voltage_protection_mode", "Query", "VOLT:PROT:MODE?", channel=True),
+
+    # [SOURce:]POWer:PROTection[:STATe] {OFF | ON | 0 | 1}
+    # Activates (1) or deactivates (0) the OPP for the previous selected channel
+    Command("set_source_power_protection_state", "Write", "POW:PROT", parameter='0', channel=True),
+
+    # [SOURce:]POWer:PROTection[:STATe]?
+    # Returns the OPP state of the previous selected channel
+    Command("get_source_power_protection_state", "Query", "POW:PROT?", channel=True),
+
+    # [SOURce:]POWer:PROTection:LEVel {<Power>| MIN | MAX | DEF}
+    # Sets the OPP value of the previous selected channel
+    #  <Voltage> 0W to 33W (adjustable in 10mW steps)
+    #  MIN: 0.000E+00
+    #  MAX: 3.300E+01
+    #  DEF: 3.300E+01
+    Command("set_source_power_protection_level", "Write", "POW:PROT:LEV", parameter='DEF', channel=True),
+
+    # [SOURce:]POWer:PROTection:LEVel? [MIN | MAX | DEF]
+    # Returns the OPP value of the previous selected channel
+    Command("get_source_power_protection_level", "Query", "POW:PROT:LEV?", channel=True, unit="W"),
+
+    # [SOURce:]POWer:PROTection:TRIPped?
+    # Returns the OPP state of the previous selected channel
+    #  1: OPP is tripped
+    #  0: OPP is not tripped
+    Command("source_power_protection_trip", "Query", "POW:PROT:TRIP?", channel=True),
+
+    # [SOURce:]POWer:PROTection:CLEar
+    # Resets the OPP state of the selected channel
+    Command("source_power_protection_clear", "Write", "POW:PROT:CLE", channel=True),
+
+    # [SOURce:]VOLTage:AINPut[:STATe] {OFF | ON | 0 | 1}
+    # Activates (1) or deactivates (0) the Analog In function for the previous selected channel
+    Command("set_source_voltage_ainput_state", "Write", "VOLT:AINP", parameter='0', channel=True),
+
+    # [SOURce:]VOLTage:AINPut[:STATe]?
+    # Returns the Analog In function state of the previous selected channel
+    Command("get_source_voltage_ainput_state", "Query", "VOLT:AINP?", channel=True),
+
+    # [SOURce:]VOLTage:AINPut:INPut {VOLTage | CURRent}
+    # Selects the input unit of the Analog In connector (terminal block) on the rear panel
+    Command("set_source_voltage_ainput_input", "Write", "VOLT:AINP:INP", parameter='VOLT'),
+
+    # [SOURce:]VOLTage:AINPut:INPut?
+    # Returns the input unit of the Analog In connector (terminal block) on the rear panel
+    Command("get_source_voltage_ainput_input", "Query", "VOLT:AINP:INP?"),
+
+    # [SOURce:]VOLTage:AINPut:MODE {LINear | STEP}
+    # Selects the mode of the Analog In connector (terminal block) on the rear panel
+    #  LINear: Output voltage linear to the input voltage
+    #  STEP: Reference value or zero depending on threshold
+    Command("set_source_voltage_ainput_mode", "Write", "VOLT:AINP:MODE", parameter='LIN'),
+
+    # [SOURce:]VOLTage:AINPut:MODE?
+    # Returns the mode of the Analog In connector (terminal block) on the rear panel
+    Command("get_source_voltage_ainput_mode", "Query", "VOLT:AINP:MODE?"),
+
+    # [SOURce:]VOLTage:AINPut:THReshold {<Threshold>| MIN | MAX | DEF}
+    # Sets the threshold for the Analog In mode STEP
+    #  <Threshold> 0V to 10V (adjustable in 100mV steps)
+    #  MIN: 0.0E+00
+    #  MAX: 1.00E+01
+    #  DEF: 1.0E+00
+    Command("set_source_voltage_ainput_threshold", "Write", "VOLT:AINP:THR", parameter='DEF'),
+
+    # [SOURce:]VOLTage:AINPut:THReshold?
+    # Returns the threshold of the Analog In mode STEP
+    Command("get_source_voltage_ainput_threshold", "Query", "VOLT:AINP:THR?", unit="V"),
+
+    # [SOURce:]VOLTage:RAMP[:STATe] {OFF | ON | 0 | 1}
+    # Activates (1) or deactivates (0) the EasyRamp function for the previous selected channel
+    Command("set_source_voltage_ramp_state", "Write", "VOLT:RAMP", parameter='0', channel=True),
+
+    # [SOURce:]VOLTage:RAMP[:STATe]?
+    # Returns the EasyRamp function state of the previous selected channel
+    Command("get_source_voltage_ramp_state", "Query", "VOLT:RAMP?", channel=True),
+
+    # [SOURce:]VOLTage:RAMP:DURation {<Duration>| MIN | MAX | DEF}
+    # Sets the duration of the voltage ramp
+    #  <Duration> 10ms to 10s
+    #  MIN: 1.00E-02 (VOLT:RAMP:DUR 0.01)
+    #  MAX: 1.000E+01 (VOLT:RAMP:DUR 10)
+    #  DEF: 1.00E-02 (VOLT:RAMP:DUR 0.01)
+    Command("set_source_voltage_ramp_duration", "Write", "VOLT:RAMP:DUR", parameter='DEF'),
+
+    # [SOURce:]VOLTage:RAMP:DURation?
+    # Returns the duration of the voltage ramp
+    Command("get_source_voltage_ramp_duration", "Query", "VOLT:RAMP:DUR?", unit="s"),
+
+    # [SOURce:]VOLTage[:LEVel][:IMMediate][:AMPLitude] {<Voltage>| MIN | MAX}}
+    # Sets the voltage value of the selected channel
+    #  <Voltage> 0.000V to 32.050V (adjustable in 1mV steps)
+    #  MIN 0.000E+00
+    #  MAX 3.2050E+01
+    Command("set_source_voltage_level_immediate_amplitude", "Write", "VOLT", parameter='MIN', channel=True),
+
+    # [SOURce:]VOLTage[:LEVel][:IMMediate][:AMPLitude]? [MIN | MAX]
+    # Returns the voltage value of the selected channel
+    Command("get_source_voltage_level_immediate_amplitude", "Query", "VOLT?", channel=True, unit="V"),
+
+    # [SOURce:]VOLTage[:LEVel][:IMMediate][:AMPLitude] {UP | DOWN}
+    # Increases (UP) resp. decreases (DOWN) the voltage value of the selected channel
+    Command("vary_source_voltage_level_immediate_amplitude", "Write", "VOLT", parameter='UP', channel=True),
+
+    # [SOURce:]VOLTage[:LEVel]:STEP[:INCRement) {<Numeric Value>| DEFault}
+    # Defines the voltage step size for the VOLT UP (VOLT DOWN) command
+    #  <Numeric Value> 0.000E+00 to 3.2050E+01 (adjustable in 1mV steps)
+    #  DEF: 1.000E+00
+    Command("set_source_voltage_level_step_increment", "Write", "VOLT:STEP", parameter='DEF'),
+
+    # [SOURce:]VOLTage[:LEVel]:STEP[:INCRement)? [Default)
+    # Returns the voltage step size
+    Command("get_source_voltage_level_step_increment", "Query", "VOLT:STEP?", channel=True, unit="V"),
+)
+
+
+# Queries of one channel in a snapshot, in the order of the snapshot columns; the queries without
+# channel argument (OUTP:CHAN?) follow one selecting the channel
+SNAPSHOT_FIELDS = (
+    ("voltage", "get_source_voltage_level_immediate_amplitude", True),
+    ("current", "get_source_current_level_immediate_amplitude", True),
+    ("measured_voltage", "measure_scalar_voltage_dc", True),
+    ("measured_current", "measure_scalar_current_dc", True),
+    ("measured_power", "measure_scalar_power", True),
+    ("output", "get_output_channel_state", False),
+    ("ovp_tripped", "source_voltage_protection_trip", True),
+    ("opp_tripped", "source_power_protection_trip", True),
+    ("fuse_tripped", "fuse_trip", True),
+)
+
+SNAPSHOT_COLUMNS = {field[0]: column for column, field in enumerate(SNAPSHOT_FIELDS)}
+
+
+class Snapshot:
+    # State of all channels at one time: values is a (channels, fields) float array with the
+    # columns of SNAPSHOT_FIELDS, states and trip flags are 0/1
+    __slots__ = ("timestamp", "master", "values")
+
+    def __init__(self, timestamp, master, values):
+        self.timestamp = timestamp
+        self.master = master
+        self.values = values
+
+    def field(self, name):
+        # Column of one field over all channels, e.g. snapshot.field("measured_current")
+        return self.values[:, SNAPSHOT_COLUMNS[name]]
+
+    def channel(self, channel):
+        # Fields of one channel (1 to n) as a dictionary
+        row = self.values[int(channel) - 1]
+        return {name: row[column] for name, column in SNAPSHOT_COLUMNS.items()}
+
+    def __repr__(self):
+        return "Snapshot(" + str(self.timestamp) + ", master=" + str(self.master) + ", " + repr(self.values) + ")"
+
 
-    @exception_handler
-    def set_output_state(self, parameter='0', channel='OUT1'):
-        """Write"""
-        # OUTPut[:STATe] {OFF | ON | 0 | 1}
-        # Activates or deactivates the previous selected channel and turning on the master output
-        #  1: Channel and master output will be activated
-        #  0: Channel will be deactivated
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("OUTP " + str(parameter))
-
-    @exception_handler
-    def get_output_state(self):
-        """Query"""
-        # OUTPut[:STATe]?
-        # Returns the output state
-        value = self.manager.query("OUTP?")
-        return value
-
-    @exception_handler
-    def set_output_channel_state(self, parameter='0', channel='OUT1'):
-        """Write"""
-        # OUTPut:CHANnel[:STATe] {OFF | ON | 0 | 1}
-        # Activates or deactivates the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("OUTP:CHAN " + str(parameter))
-
-    @exception_handler
-    def get_output_channel_state(self):
-        """Query"""
-        # OUTPut:CHANnel[:STATe]?
-        # Returns the channel output state
-        value = self.manager.query("OUTP:CHAN?")
-        return value
-
-    @exception_handler
-    def set_output_master_state(self, parameter='0', channel='OUT1'):
-        """Write"""
-        # OUTPut:MASTer[:STATe] {OFF | ON | 0 | 1}
-        # Turning on / off all previous selected channels simultaneously
-        #  1: Master output will be activated
-        #  0: Master output will be deactivated
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("OUTP:MAST " + str(parameter))
-
-    @exception_handler
-    def get_output_master_state(self):
-        """Query"""
-        # OUTPut:MASTer[:STATe]?
-        # Returns the master output state
-        value = self.manager.query("OUTP:MAST?")
-        return value
-
-    @exception_handler
-    def set_source_current_level_immediate_amplitude(self, parameter='MIN', channel='OUT1'):
-        """Write"""
-        # [SOURce:]CURRent[:LEVel][:IMMediate][:AMPLitude] {<Current>| MIN | MAX}
-        # Sets the current value of the selected channel
-        #  <Current> Adjustable in 0.1mA (I<1A) / 1mA (I≥1A) steps.
-        #  MIN: 0.5mA
-        #  MAX: 3.000A
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("CURR " + str(parameter))
-
-    @exception_handler
-    def get_source_current_level_immediate_amplitude(self, channel='OUT1'):
-        """Query"""
-        # [SOURce:]CURRent[:LEVel][:IMMediate][:AMPLitude]? [MIN | MAX]
-        # Returns the current value of the selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("CURR?")
-        return value
-
-    @exception_handler
-    def vary_source_current_level_immediate_amplitude(self, parameter='UP', channel='OUT1'):
-        """Write"""
-        # [SOURce:]CURRent[:LEVel][:IMMediate][:AMPLitude] {UP | DOWN}
-        # Increases (UP) resp. decreases (DOWN) the current value of the selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("CURR " + str(parameter))
-
-    @exception_handler
-    def set_source_current_level_step_increment(self, parameter='DEF'):
-        """Write"""
-        # [SOURce:]CURRent[:LEVel]:STEP[:INCRement) {<Numeric Value>| DEFault}
-        # Defines the current step size for the CURR UP (CURR DOWN) command
-        #  <Numeric Value> Adjustable in 0.1mA (I<1A) / 1mA (I≥1A) steps.
-        #  5.0000E-04 to 3.000E+00  (R&S®HMC8043)
-        #  5.0000E-04 to 5.000E+00  (R&S®HMC8042)
-        #  5.0000E-04 to 1.0000E+01 (R&S®HMC8041)
-        #  DEF: 1.0000E-01
-        self.manager.write("CURR:STEP " + str(parameter))
-
-    @exception_handler
-    def get_source_current_level_step_increment(self, channel='OUT1'):
-        """Query"""
-        # [SOURce:]CURRent[:LEVel]:STEP[:INCRement]? [Default]
-        # Returns the current step size
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("CURR:STEP?")
-        return value
-
-    @exception_handler
-    def set_source_voltage_protection_state(self, parameter='0', channel='OUT1'):
-        """Write"""
-        # [SOURce:]VOLTage:PROTection[:STATe] {OFF | ON | 0 | 1}
-        # Activates (1) or deactivates (0) the OVP for the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("VOLT:PROT " + str(parameter))
-
-    @exception_handler
-    def get_source_voltage_protection_state(self, channel='OUT1'):
-        """Query"""
-        # [SOURce:]VOLTage:PROTection[:STATe]?
-        # Returns the OVP state of the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("VOLT:PROT?")
-        return value
-
-    @exception_handler
-    def set_source_voltage_protection_level(self, parameter='DEF', channel='OUT1'):
-        """Write"""
-        # [SOURce:]VOLTage:PROTection:LEVel {<Voltage>| MIN | MAX | DEF}
-        # Sets the OVP value of the previous selected channel
-        #  <Voltage> 0V to 32.50V (adjustable in 1mV steps)
-        #  MIN: 0.000E+00
-        #  MAX: 3.2050E+01
-        #  DEF: 3.2050E+01
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("VOLT:PROT:LEV " + str(parameter))
-
-    @exception_handler
-    def get_source_voltage_protection_level(self, channel='OUT1'):
-        """Query"""
-        # [SOURce:]VOLTage:PROTection:LEVel? [MIN | MAX | DEF]
-        # Returns the OVP value of the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("VOLT:PROT:LEV?")
-        return value
-
-    @exception_handler
-    def source_voltage_protection_trip(self, channel='OUT1'):
-        """Query"""
-        # [SOURce:]VOLTage:PROTection:TRIPped?
-        # Returns the OVP state of the previous selected channel
-        #  1: OVP is tripped
-        #  0: OVP is not tripped
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("VOLT:PROT:TRIP?")
-        # value = "VOLT:PROT:TRIP? " + str(channel)
-        return value
-
-    @exception_handler
-    def source_voltage_protection_clear(self, channel='OUT1'):
-        """Write"""
-        # [SOURce:]VOLTage:PROTection:CLEar
-        # Resets the OVP state of the selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("VOLT:PROT:CLE")
-
-    @exception_handler
-    def set_source_voltage_protection_mode(self, parameter='MEAS', channel='OUT1'):
-        """Write"""
-        # [SOURce:]VOLTage:PROTection:MODE {MEASured | PROTected}
-        # Sets the OVP mode for the previous selected channel
-        #  MEASured: The OVP switches off if the measured value exceeds the threshold
-        #  PROTected: If the adjusted threshold is exceeded the output of the instrument will be not switched on
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("VOLT:PROT:MODE " + str(parameter))
-
-    @exception_handler
-    def get_source_voltage_protection_mode(self, channel='OUT1'):
-        """Query"""
-        # [SOURce:]VOLTage:PROTection:MODE?
-        # Returns the OVP mode for the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("VOLT:PROT:MODE?")
-        return value
-
-    @exception_handler
-    def set_source_power_protection_state(self, parameter='0', channel='OUT1'):
-        """Write"""
-        # [SOURce:]POWer:PROTection[:STATe] {OFF | ON | 0 | 1}
-        # Activates (1) or deactivates (0) the OPP for the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("POW:PROT " + str(parameter))
-
-    @exception_handler
-    def get_source_power_protection_state(self, channel='OUT1'):
-        """Query"""
-        # [SOURce:]POWer:PROTection[:STATe]?
-        # Returns the OPP state of the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("POW:PROT?")
-        return value
-
-    @exception_handler
-    def set_source_power_protection_level(self, parameter='DEF', channel='OUT1'):
-        """Write"""
-        # [SOURce:]POWer:PROTection:LEVel {<Power>| MIN | MAX | DEF}
-        # Sets the OPP value of the previous selected channel
-        #  <Voltage> 0W to 33W (adjustable in 10mW steps)
-        #  MIN: 0.000E+00
-        #  MAX: 3.300E+01
-        #  DEF: 3.300E+01
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("POW:PROT:LEV " + str(parameter))
-
-    @exception_handler
-    def get_source_power_protection_level(self, channel='OUT1'):
-        """Query"""
-        # [SOURce:]POWer:PROTection:LEVel? [MIN | MAX | DEF]
-        # Returns the OPP value of the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("POW:PROT:LEV?")
-        return value
-
-    @exception_handler
-    def source_power_protection_trip(self, channel='OUT1'):
-        """Query"""
-        # [SOURce:]POWer:PROTection:TRIPped?
-        # Returns the OPP state of the previous selected channel
-        #  1: OPP is tripped
-        #  0: OPP is not tripped
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("POW:PROT:TRIP?")
-        # value = "POW:PROT:TRIP?"
-        return value
-
-    @exception_handler
-    def source_power_protection_clear(self, channel='OUT1'):
-        """Write"""
-        # [SOURce:]POWer:PROTection:CLEar
-        # Resets the OPP state of the selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("POW:PROT:CLE")
-
-    @exception_handler
-    def set_source_voltage_ainput_state(self, parameter='0', channel='OUT1'):
-        """Write"""
-        # [SOURce:]VOLTage:AINPut[:STATe] {OFF | ON | 0 | 1}
-        # Activates (1) or deactivates (0) the Analog In function for the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("VOLT:AINP " + str(parameter))
-
-    @exception_handler
-    def get_source_voltage_ainput_state(self, channel='OUT1'):
-        """Query"""
-        # [SOURce:]VOLTage:AINPut[:STATe]?
-        # Returns the Analog In function state of the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("VOLT:AINP?")
-        return value
-
-    @exception_handler
-    def set_source_voltage_ainput_input(self, parameter='VOLT'):
-        """Write"""
-        # [SOURce:]VOLTage:AINPut:INPut {VOLTage | CURRent}
-        # Selects the input unit of the Analog In connector (terminal block) on the rear panel
-        self.manager.write("VOLT:AINP:INP " + str(parameter))
+class PowerSupplyHMC804x(InstrumentDriver):
+    commands = HMC804X_COMMANDS
+    channels = 3
 
-    @exception_handler
-    def get_source_voltage_ainput_input(self):
-        """Query"""
-        # [SOURce:]VOLTage:AINPut:INPut?
-        # Returns the input unit of the Analog In connector (terminal block) on the rear panel
-        value = self.manager.query("VOLT:AINP:INP?")
-        return value
+    def __init__(self, address):
+        self.selected_channel = None
+        self.skipped_channel_selections = 0
+        super(PowerSupplyHMC804x, self).__init__(address)
 
-    @exception_handler
-    def set_source_voltage_ainput_mode(self, parameter='LIN'):
-        """Write"""
-        # [SOURce:]VOLTage:AINPut:MODE {LINear | STEP}
-        # Selects the mode of the Analog In connector (terminal block) on the rear panel
-        #  LINear: Output voltage linear to the input voltage
-        #  STEP: Reference value or zero depending on threshold
-        self.manager.write("VOLT:AINP:MODE " + str(parameter))
+    def invalidate_state(self):
+        # The channel selected on the instrument is unknown, next INST command is always sent
+        self.selected_channel = None
 
-    @exception_handler
-    def get_source_voltage_ainput_mode(self):
-        """Query"""
-        # [SOURce:]VOLTage:AINPut:MODE?
-        # Returns the mode of the Analog In connector (terminal block) on the rear panel
-        value = self.manager.query("VOLT:AINP:MODE?")
-        return value
+    def select_channel(self, channel):
+        # Sends INST only if the channel is not selected already, failures raise VisaIOError
+        if channel != self.selected_channel:
+            name = channel_name(channel)
+            if name != self.selected_channel:
+                self.manager.write_raw(b"INST " + str(channel).encode() + TERMINATION)
+                self.selected_channel = name
+                return
+        self.skipped_channel_selections += 1
 
     @exception_handler
-    def set_source_voltage_ainput_threshold(self, parameter='DEF'):
+    def set_arb_data(self, points):
         """Write"""
-        # [SOURce:]VOLTage:AINPut:THReshold {<Threshold>| MIN | MAX | DEF}
-        # Sets the threshold for the Analog In mode STEP
-        #  <Threshold> 0V to 10V (adjustable in 100mV steps)
-        #  MIN: 0.0E+00
-        #  MAX: 1.00E+01
-        #  DEF: 1.0E+00
-        self.manager.write("VOLT:AINP:THR " + str(parameter))
-
-    @exception_handler
-    def get_source_voltage_ainput_threshold(self):
+        # ARBitrary:DATA <Voltage>,<Current>,<Time>,<Interpolation>{,<Voltage>,<Current>,<Time>,<Interpolation>}
+        # Sets the ARB table, the whole table is sent in one message
+        #  points: (voltage, current, dwell time[, interpolation]) of each point, up to 512 points
+        #  <Time> 0.01s to 60s
+        #  <Interpolation> 0: step to the point, 1: ramp to the point
+        values = []
+        for point in points:
+            voltage, current, dwell = point[:3]
+            interpolation = point[3] if len(point) > 3 else 0
+            if not ARB_MIN_DWELL <= dwell <= ARB_MAX_DWELL:
+                return False, "Write", "ARB dwell time out of range (" + str(dwell) + " s)"
+            values.append(str(voltage) + "," + str(current) + "," + str(dwell) + "," + str(int(interpolation)))
+        if not values or len(values) > ARB_MAX_POINTS:
+            return False, "Write", "ARB table needs 1 to " + str(ARB_MAX_POINTS) + " points"
+        self.manager.write_raw(b"ARB:DATA " + ",".join(values).encode() + TERMINATION)
+
+    def upload_arb(self, points, channel='OUT1', repetitions=1):
+        # Clears the ARB table, sets it to points and transfers it to the channel in one message,
+        # returns the results of the commands sent; start it with arb_start(channel)
+        with self.batch() as transaction:
+            self.arb_clear()
+            self.set_arb_data(points)
+            self.set_arb_repetitions(repetitions)
+            self.arb_transfer(channel)
+        return transaction.results
+
+    @exception_handler
+    def snapshot(self):
         """Query"""
-        # [SOURce:]VOLTage:AINPut:THReshold?
-        # Returns the threshold of the Analog In mode STEP
-        value = self.manager.query("VOLT:AINP:THR?")
-        return value
-
-    @exception_handler
-    def set_source_voltage_ramp_state(self, parameter='0', channel='OUT1'):
+        # Setpoints, measured voltage, current and power, output states and protection trips of all
+        # channels, queried in as few messages as possible; the value of the result is a Snapshot
+        selected_channel = self.selected_channel
+        with self.batch() as transaction:
+            self.get_output_master_state()
+            for channel in range(1, self.channels + 1):
+                for name, method, selects_channel in SNAPSHOT_FIELDS:
+                    if selects_channel:
+                        getattr(self, method)("OUT" + str(channel))
+                    else:
+                        getattr(self, method)()
+            if selected_channel is not None:
+                self.set_output_channel(selected_channel)
+        results = transaction.results[:1 + self.channels * len(SNAPSHOT_FIELDS)]
+        for result in results:
+            if not result[0]:
+                return result
+        values = np.array([float(result.value) for result in results[1:]], dtype=np.float64)
+        return Snapshot(time.time(), bool(results[0].value), values.reshape(self.channels, len(SNAPSHOT_FIELDS)))
+
+    @exception_handler
+    def enable_protection_events(self):
         """Write"""
-        # [SOURce:]VOLTage:RAMP[:STATe] {OFF | ON | 0 | 1}
-        # Activates (1) or deactivates (0) the EasyRamp function for the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("VOLT:RAMP " + str(parameter))
-
-    @exception_handler
-    def get_source_voltage_ramp_state(self, channel='OUT1'):
+        # STATus:QUEStionable:INSTrument:ISUMmary<n>:ENABle, :INSTrument:ENABle, :ENABle, *SRE
+        # Routes OVP, OPP and fuse trips of all channels up to the questionable bit of the status
+        # byte and to service requests, in one message; events latched before are cleared
+        mask = str(PROTECTION_MASK)
+        commands = []
+        for channel in range(1, self.channels + 1):
+            register = "STAT:QUES:INST:ISUM" + str(channel)
+            commands += [register + ":PTR " + mask, register + ":NTR 0", register + ":ENAB " + mask]
+        commands += ["STAT:QUES:INST:ENAB " + str(sum(1 << channel for channel in range(1, self.channels + 1))),
+                     "STAT:QUES:ENAB " + str(QUES_INSTRUMENT)]
+        self.manager.write_raw(b"*CLS;" + ";:".join(commands).encode() + b";*SRE " +
+                               str(STB_QUESTIONABLE).encode() + TERMINATION)
+
+    @exception_handler
+    def protection_events(self):
         """Query"""
-        # [SOURce:]VOLTage:RAMP[:STATe]?
-        # Returns the EasyRamp function state of the previous selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("VOLT:RAMP?")
-        return value
+        # *STB? and, only if its questionable bit is set, the event registers down to the channels
+        # Returns the protection trips latched since the last call as (channel, "ovp" | "opp" | "fuse")
+        # pairs, an empty list if there are none; enable_protection_events() has to be sent before
+        if not int(self.manager.query("*STB?")) & STB_QUESTIONABLE:
+            return []
+        queries = ["STAT:QUES:EVEN?", "STAT:QUES:INST:EVEN?"]
+        queries += ["STAT:QUES:INST:ISUM" + str(channel) + ":EVEN?" for channel in range(1, self.channels + 1)]
+        responses = self.manager.query(";:".join(queries)).split(";")
+        events = []
+        for channel, response in enumerate(responses[2:], 1):
+            bits = int(response)
+            for bit, name in PROTECTION_EVENTS:
+                if bits & bit:
+                    events.append(("OUT" + str(channel), name))
+        return events
 
     @exception_handler
-    def set_source_voltage_ramp_duration(self, parameter='DEF'):
+    def set_output_channel(self, parameter='OUT1'):
         """Write"""
-        # [SOURce:]VOLTage:RAMP:DURation {<Duration>| MIN | MAX | DEF}
-        # Sets the duration of the voltage ramp
-        #  <Duration> 10ms to 10s
-        #  MIN: 1.00E-02 (VOLT:RAMP:DUR 0.01)
-        #  MAX: 1.000E+01 (VOLT:RAMP:DUR 10)
-        #  DEF: 1.00E-02 (VOLT:RAMP:DUR 0.01)
-        self.manager.write("VOLT:RAMP:DUR " + str(parameter))
+        # INSTrument[:SELect] {OUTPut1 | OUTPut2 | OUTPut3 | OUT1 | OUT2 | OUT3}
+        # Selects a channel, the command is not sent if the channel is already selected
+        self.select_channel(parameter)
 
     @exception_handler
-    def get_source_voltage_ramp_duration(self):
+    def get_output_channel(self):
         """Query"""
-        # [SOURce:]VOLTage:RAMP:DURation?
-        # Returns the duration of the voltage ramp
-        value = self.manager.query("VOLT:RAMP:DUR?")
+        # INSTrument[:SELect]?
+        # Returns the channel selection
+        value = self.manager.query("INST?")
+        self.selected_channel = channel_name(value)
         return value
 
-    @exception_handler
-    def set_source_voltage_level_immediate_amplitude(self, parameter='MIN', channel='OUT1'):
-        """Write"""
-        # [SOURce:]VOLTage[:LEVel][:IMMediate][:AMPLitude] {<Voltage>| MIN | MAX}}
-        # Sets the voltage value of the selected channel
-        #  <Voltage> 0.000V to 32.050V (adjustable in 1mV steps)
-        #  MIN 0.000E+00
-        #  MAX 3.2050E+01
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("VOLT " + str(parameter))
-
-    @exception_handler
-    def get_source_voltage_level_immediate_amplitude(self, channel='OUT1'):
-        """Query"""
-        # [SOURce:]VOLTage[:LEVel][:IMMediate][:AMPLitude]? [MIN | MAX]
-        # Returns the voltage value of the selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("VOLT?")
-        return value
 
-    @exception_handler
-    def vary_source_voltage_level_immediate_amplitude(self, parameter='UP', channel='OUT1'):
-        """Write"""
-        # [SOURce:]VOLTage[:LEVel][:IMMediate][:AMPLitude] {UP | DOWN}
-        # Increases (UP) resp. decreases (DOWN) the voltage value of the selected channel
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        self.manager.write("VOLT " + str(parameter))
+class PowerSupplyHMC8042(PowerSupplyHMC804x):
+    channels = 2
 
-    @exception_handler
-    def set_source_voltage_level_step_increment(self, parameter='DEF'):
-        """Write"""
-        # [SOURce:]VOLTage[:LEVel]:STEP[:INCRement) {<Numeric Value>| DEFault}
-        # Defines the voltage step size for the VOLT UP (VOLT DOWN) command
-        #  <Numeric Value> 0.000E+00 to 3.2050E+01 (adjustable in 1mV steps)
-        #  DEF: 1.000E+00
-        self.manager.write("VOLT:STEP " + str(parameter))
 
-    @exception_handler
-    def get_source_voltage_level_step_increment(self, channel='OUT1'):
-        """Query"""
-        # [SOURce:]VOLTage[:LEVel]:STEP[:INCRement)? [Default)
-        # Returns the voltage step size
-        ret = self.set_output_channel(channel)
-        if not ret[0]:
-            return ret
-        value = self.manager.query("VOLT:STEP?")
-        return value
+class PowerSupplyHMC8041(PowerSupplyHMC804x):
+    channels = 1
@@ -4,6 +4,8 @@ import time
 
 
 class PowerSupplyLowNoise:
+    # traffic.TrafficLog capturing the serial writes of ports opened from now on, None when not capturing
+    traffic_log = None
 
     def __init__(self, address):
         try:
@@ -14,6 +16,8 @@ class PowerSupplyLowNoise:
                 parity=PARITY_NONE,
                 stopbits=STOPBITS_ONE
             )
+            if self.traffic_log is not None:
+                self.ser = self.traffic_log.wrap(self.ser, address)
         except serial.SerialException:
             pass
 
@@ -0,0 +1,418 @@
+import bisect
+import collections
+import csv
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from driver import InstrumentResult
+
+# Position within the dwell time of an ARB sweep point at which the multimeter samples it
+ARB_SAMPLE_POSITION = 0.9
+
+# Power supply methods setting and reading back a quantity of a channel, and the multimeter function reading it
+SETPOINT_METHODS = {"voltage": "set_source_voltage_level_immediate_amplitude",
+                    "current": "set_source_current_level_immediate_amplitude"}
+READBACK_METHODS = {"voltage": "measure_scalar_voltage_dc", "current": "measure_scalar_current_dc"}
+MULTIMETER_FUNCTIONS = {"voltage": "VOLT:DC", "current": "CURR:DC"}
+
+# Failure text of a sweep whose readings ended before its setpoints did
+READINGS_ENDED = "Readings ended before the sweep"
+
+
+class SweepPoint:
+    # settle_time: seconds from sending the setpoint to the reading, settled: False if the
+    # adaptive settling criterion was not met before its timeout, channel: the swept channel,
+    # setpoints: all setpoints of the step if it sets several (sweep plans)
+    __slots__ = ("index", "setpoint", "reading", "timestamp", "settle_time", "settled", "channel", "setpoints")
+
+    def __init__(self, index, setpoint, reading, timestamp, settle_time=None, settled=True, channel=None,
+                 setpoints=None):
+        self.index = index
+        self.setpoint = setpoint
+        self.reading = reading
+        self.timestamp = timestamp
+        self.settle_time = settle_time
+        self.settled = settled
+        self.channel = channel
+        self.setpoints = setpoints
+
+    def __repr__(self):
+        return "SweepPoint(" + str(self.index) + ", " + str(self.setpoint) + ", " + str(self.reading) + ")"
+
+
+class Settling:
+    # Adaptive settling criterion replacing the fixed delay: after a setpoint the multimeter is read
+    # continuously until count consecutive readings lie within absolute + relative * |reading| of
+    # each other, for at most timeout seconds
+
+    def __init__(self, count=3, relative=1e-3, absolute=1e-7, timeout=5.0):
+        self.count = count
+        self.relative = relative
+        self.absolute = absolute
+        self.timeout = timeout
+
+    def settled(self, readings):
+        if len(readings) < self.count:
+            return False
+        low, high = min(readings), max(readings)
+        return high - low <= self.absolute + self.relative * max(abs(low), abs(high))
+
+
+class AdaptiveSweep:
+    # Setpoint plan refining a coarse grid where the curve needs it: after the grid from start to stop
+    # in coarse_step, intervals are halved where the reading changes by more than max_change of the
+    # whole reading range (slope) or a point deviates by more than max_deviation of it from the line
+    # through its neighbours (curvature), down to resolution or until max_points are measured.
+    # The engine passes it the measured points, as the next setpoints depend on them; in a
+    # multi-channel sweep only the points of channel are followed (the first measured if None)
+
+    def __init__(self, start, stop, coarse_step, resolution=0.001, max_points=200, max_change=0.05,
+                 max_deviation=0.01, channel=None):
+        self.start = start
+        self.stop = stop
+        self.coarse_step = coarse_step
+        self.resolution = resolution
+        self.max_points = max_points
+        self.max_change = max_change
+        self.max_deviation = max_deviation
+        self.channel = channel
+        self.setpoints = []
+        self.readings = []
+
+    def __call__(self, point):
+        if self.channel is None:
+            self.channel = point.channel
+        if point.channel != self.channel:
+            return
+        index = bisect.bisect(self.setpoints, point.setpoint)
+        self.setpoints.insert(index, point.setpoint)
+        self.readings.insert(index, point.reading)
+
+    def grid(self, value):
+        return round(round(value / self.resolution) * self.resolution, 6)
+
+    def coarse_grid(self):
+        count = int(round((self.stop - self.start) / self.coarse_step)) + 1
+        return [self.grid(self.start + index * self.coarse_step) for index in range(count)]
+
+    def refinements(self):
+        # Midpoints of the intervals to split, the most needed first
+        x, y = self.setpoints, self.readings
+        span = max(y) - min(y) if y else 0
+        if span <= 0:
+            return []
+        scores = {}
+        for index in range(len(x) - 1):
+            change = abs(y[index + 1] - y[index]) / span
+            if change > self.max_change:
+                scores[index] = max(scores.get(index, 0), change / self.max_change)
+        for index in range(1, len(x) - 1):
+            fraction = (x[index] - x[index - 1]) / (x[index + 1] - x[index - 1])
+            deviation = abs(y[index] - y[index - 1] - (y[index + 1] - y[index - 1]) * fraction) / span
+            if deviation > self.max_deviation:
+                for interval in (index - 1, index):
+                    scores[interval] = max(scores.get(interval, 0), deviation / self.max_deviation)
+        midpoints = []
+        for index in sorted(scores, key=scores.get, reverse=True):
+            midpoint = self.grid((x[index] + x[index + 1]) / 2)
+            if x[index] < midpoint < x[index + 1]:
+                midpoints.append(midpoint)
+        return midpoints
+
+    def __iter__(self):
+        planned = 0
+        for setpoint in self.coarse_grid():
+            if planned >= self.max_points:
+                return
+            planned += 1
+            yield setpoint
+        while planned < self.max_points:
+            midpoints = self.refinements()
+            if not midpoints:
+                return
+            for setpoint in midpoints[:self.max_points - planned]:
+                planned += 1
+                yield setpoint
+
+
+class CsvRecorder:
+    # Sweep consumer writing setpoint;reading;settle time rows, the file is flushed with every point so a
+    # cancelled or crashed sweep keeps the points measured so far. With channel set, only the points of
+    # that channel are written, so a multi-channel sweep gets a file per channel. Steps setting several
+    # setpoints (sweep plans) get a column for each of them instead of the setpoint column
+
+    def __init__(self, path, channel=None):
+        self.file = open(path, 'a', newline='')
+        self.writer = csv.writer(self.file, delimiter=';')
+        self.channel = channel
+
+    def __call__(self, point):
+        if self.channel is not None and point.channel != self.channel:
+            return
+        setpoints = list(point.setpoints) if point.setpoints is not None and len(point.setpoints) > 1 else \
+            [point.setpoint]
+        self.writer.writerow(setpoints + [point.reading, point.settle_time])
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class SweepEngine:
+    # Voltage sweep of one power supply channel with current readings of a multimeter, run on the
+    # calling thread (a worker thread in the app). Every measured point is passed to the consumers
+    # in order, consumers with a close method are closed when the sweep ends. cancel() stops the
+    # sweep from any thread within one step; the outputs are switched off in both cases
+    #  on_instrument: the power supply plays the sweep as ARB table, the host only takes readings
+    #  setpoints: list of setpoints or a plan iterated lazily; a callable plan (AdaptiveSweep) is
+    #   subscribed, so it gets the measured points
+    #  settling: Settling criterion read out after each setpoint instead of waiting delay seconds
+
+    def __init__(self, power_supply, multimeter, channel, setpoints, delay, on_instrument=False, settling=None):
+        self.power_supply = power_supply
+        self.multimeter = multimeter
+        self.channel = channel
+        self.setpoints = setpoints
+        self.delay = delay
+        self.on_instrument = on_instrument
+        self.settling = settling if not on_instrument else None
+        self.consumers = []
+        self.cancelled = threading.Event()
+        self.error = None
+        if callable(setpoints):
+            self.subscribe(setpoints)
+
+    def subscribe(self, consumer):
+        self.consumers.append(consumer)
+        return consumer
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def start_arb(self):
+        # Uploads the setpoints as ARB table and starts it, returns the failure text if any
+        res = self.power_supply.get_source_current_level_immediate_amplitude(self.channel)
+        if res[0] is not True:
+            return res[2]
+        current_limit = res.value
+        for res in self.power_supply.upload_arb([(setpoint, current_limit, self.delay) for setpoint in self.setpoints],
+                                                self.channel):
+            if res[0] is not True:
+                return res[2]
+        # Configured ahead, so the first reading is not delayed once the sweep runs
+        for res in (self.multimeter.configure('CURR:DC'), self.power_supply.arb_start(self.channel)):
+            if res[0] is not True:
+                return res[2]
+        return None
+
+    def settle(self, readings, started):
+        # Reads until the settling criterion is met, it times out or the sweep is cancelled;
+        # returns the last result and whether the readings settled
+        window = collections.deque(maxlen=self.settling.count)
+        while True:
+            res = next(readings, None)
+            if res is None:
+                return InstrumentResult(False, "Query", READINGS_ENDED), False
+            if res[0] is not True:
+                return res, False
+            window.append(res.value)
+            if self.settling.settled(window):
+                return res, True
+            if time.monotonic() - started >= self.settling.timeout or self.cancelled.is_set():
+                return res, False
+
+    def run(self):
+        # Returns True if all setpoints were measured, the failure text is kept in error otherwise
+        # The channel selected before is restored afterwards, unless it could not be queried
+        res = self.power_supply.get_output_channel()
+        previous_channel = res[2] if res[0] is True else None
+        self.power_supply.set_output_channel_state(1, self.channel)
+        self.power_supply.set_output_master_state(1, self.channel)
+        completed = False
+        try:
+            if self.on_instrument:
+                self.error = self.start_arb()
+                if self.error is not None:
+                    return False
+            started = time.monotonic()
+            count = len(self.setpoints) if isinstance(self.setpoints, list) and self.settling is None else None
+            readings = self.multimeter.acquire('CURR:DC', count=count, configured=self.on_instrument)
+            for index, setpoint in enumerate(self.setpoints):
+                settled = True
+                if self.on_instrument:
+                    set_at = started + index * self.delay
+                    wait = set_at + ARB_SAMPLE_POSITION * self.delay - time.monotonic()
+                else:
+                    res = self.power_supply.set_source_voltage_level_immediate_amplitude(setpoint, self.channel)
+                    if res[0] is not True:
+                        self.error = res[2]
+                        break
+                    set_at = time.monotonic()
+                    wait = self.delay if self.settling is None else 0
+                if self.cancelled.wait(max(wait, 0)):
+                    break
+                if self.settling is None:
+                    res = next(readings, None)
+                    if res is None:
+                        res = InstrumentResult(False, "Query", READINGS_ENDED)
+                else:
+                    res, settled = self.settle(readings, set_at)
+                    if self.cancelled.is_set():
+                        break
+                if res[0] is not True:
+                    self.error = res[2]
+                    break
+                point = SweepPoint(index, setpoint, res.value, res.timestamp, time.monotonic() - set_at, settled,
+                                   self.channel)
+                for consumer in self.consumers:
+                    consumer(point)
+            else:
+                completed = True
+        finally:
+            with self.power_supply.batch():
+                if self.on_instrument:
+                    self.power_supply.arb_stop(self.channel)
+                self.power_supply.set_output_channel_state(0, self.channel)
+                if previous_channel is not None:
+                    self.power_supply.set_output_channel(previous_channel)
+                self.power_supply.set_output_master_state(0, self.channel)
+            self.close_consumers()
+        return completed
+
+    def close_consumers(self):
+        for consumer in self.consumers:
+            close = getattr(consumer, "close", None)
+            if close is not None:
+                close()
+
+
+class MultiChannelSweepEngine(SweepEngine):
+    # Sweep of several channels of one power supply at once. Each step sets all channels in one
+    # batched message, then the channels are read concurrently: one thread per multimeter and one
+    # for the channels read back by the power supply itself, which are all queried in one message.
+    # A step takes about as long as a single channel one; the points carry their channel, so the
+    # consumers can keep a series per channel
+    #  lanes: (channel, multimeter[, quantity]) of each reading, multimeter None reads the quantity back from
+    #   the power supply; quantity "current" (default) or "voltage"
+    #  setpoints: values applied to all targets, or tuples of a value per target; a sweep plan
+    #   (sweep_plan.SweepPlan) is iterated lazily
+    #  targets: (channel, quantity) set by the setpoints, by default the targets of the plan or the
+    #   voltages of the lanes. Current setpoints need the voltage limit of the channel above the
+    #   voltage the load takes, so the channel regulates the current
+
+    def __init__(self, power_supply, lanes, setpoints, delay, settling=None, targets=None):
+        super(MultiChannelSweepEngine, self).__init__(power_supply, None, lanes[0][0], setpoints, delay,
+                                                      settling=settling)
+        self.lanes = [(lane[0], lane[1], lane[2] if len(lane) > 2 else "current") for lane in lanes]
+        if targets is None:
+            targets = getattr(setpoints, "targets", None) or [(lane[0], "voltage") for lane in self.lanes]
+        self.targets = list(targets)
+
+    def readers(self):
+        # (lane indices, generator of result lists) of each reading thread
+        readers = [([index], ([res] for res in multimeter.acquire(MULTIMETER_FUNCTIONS[quantity])))
+                   for index, (channel, multimeter, quantity) in enumerate(self.lanes) if multimeter is not None]
+        readback = [index for index, (channel, multimeter, quantity) in enumerate(self.lanes) if multimeter is None]
+        if readback:
+            readers.append((readback, self.readback([self.lanes[index] for index in readback])))
+        return readers
+
+    def readback(self, lanes):
+        while True:
+            with self.power_supply.batch() as transaction:
+                for channel, multimeter, quantity in lanes:
+                    getattr(self.power_supply, READBACK_METHODS[quantity])(channel)
+            yield transaction.results
+
+    def channels(self):
+        # Channels set or read by the sweep, each once
+        channels = []
+        for channel in [lane[0] for lane in self.lanes] + [target[0] for target in self.targets]:
+            if channel not in channels:
+                channels.append(channel)
+        return channels
+
+    def setpoint_position(self, channel):
+        # Position of the setpoint of the channel in the setpoint tuples, its voltage first; steps of a
+        # lane of a channel without setpoint are plotted over the innermost (last) setpoint
+        for quantity in ("voltage", "current"):
+            if (channel, quantity) in self.targets:
+                return self.targets.index((channel, quantity))
+        return len(self.targets) - 1
+
+    def read(self, readings, started):
+        # One list of readings, or with settling the lists until the readings of every channel settled;
+        # returns the last list and whether they settled
+        window = collections.deque(maxlen=self.settling.count if self.settling is not None else 1)
+        while True:
+            results = next(readings, None)
+            if results is None:
+                return [InstrumentResult(False, "Query", READINGS_ENDED)], False
+            for res in results:
+                if res[0] is not True:
+                    return results, False
+            if self.settling is None:
+                return results, True
+            window.append([res.value for res in results])
+            if all(self.settling.settled([row[column] for row in window]) for column in range(len(results))):
+                return results, True
+            if time.monotonic() - started >= self.settling.timeout or self.cancelled.is_set():
+                return results, False
+
+    def run(self):
+        # The channel selected before is restored afterwards, unless it could not be queried
+        res = self.power_supply.get_output_channel()
+        previous_channel = res[2] if res[0] is True else None
+        channels = self.channels()
+        with self.power_supply.batch():
+            for channel in channels:
+                self.power_supply.set_output_channel_state(1, channel)
+            # OUTP:MAST is not channel specific, it is sent with the channel selected last to skip an INST
+            self.power_supply.set_output_master_state(1, channels[-1])
+        completed = False
+        positions = [self.setpoint_position(channel) for channel, multimeter, quantity in self.lanes]
+        readers = self.readers()
+        executor = ThreadPoolExecutor(max_workers=len(readers))
+        try:
+            for index, setpoint in enumerate(self.setpoints):
+                # Tuples are kept with the points, a value applied to all targets is not
+                step = tuple(setpoint) if isinstance(setpoint, (tuple, list)) else None
+                values = step or (setpoint,) * len(self.targets)
+                with self.power_supply.batch() as transaction:
+                    for (channel, quantity), value in zip(self.targets, values):
+                        getattr(self.power_supply, SETPOINT_METHODS[quantity])(value, channel)
+                failed = [res for res in transaction.results if res[0] is not True]
+                if failed:
+                    self.error = failed[0][2]
+                    break
+                set_at = time.monotonic()
+                if self.cancelled.wait(self.delay if self.settling is None else 0):
+                    break
+                futures = [(lanes, executor.submit(self.read, readings, set_at)) for lanes, readings in readers]
+                points = {}
+                for lanes, future in futures:
+                    results, settled = future.result()
+                    for lane, res in zip(lanes, results):
+                        if res[0] is not True:
+                            self.error = res[2]
+                            continue
+                        points[lane] = SweepPoint(index, values[positions[lane]], res.value, res.timestamp,
+                                                  time.monotonic() - set_at, settled, self.lanes[lane][0], step)
+                if self.error is not None or self.cancelled.is_set():
+                    break
+                for lane in range(len(self.lanes)):
+                    for consumer in self.consumers:
+                        consumer(points[lane])
+            else:
+                completed = True
+        finally:
+            executor.shutdown()
+            with self.power_supply.batch():
+                for channel in channels:
+                    self.power_supply.set_output_channel_state(0, channel)
+                self.power_supply.set_output_master_state(0, channels[-1])
+                if previous_channel is not None:
+                    self.power_supply.set_output_channel(previous_channel)
+            self.close_consumers()
+        return completed
@@ -0,0 +1,237 @@
+import itertools
+import json
+import math
+
+# Quantities a plan can set on a power supply channel
+QUANTITIES = ("voltage", "current")
+
+
+class SweepPlan:
+    # Lazy sequence of setpoint tuples, one value per target (channel, quantity). Iterating a plan
+    # generates its steps one by one, so even nested plans never hold the whole grid in memory, and
+    # a plan can be iterated again. Plans are described by plain dicts (to_dict/plan_from_dict), so
+    # they can be saved to and loaded from JSON files
+    #  for setpoints in ProductPlan(LinearPlan('OUT2', 0, 5, 1), LinearPlan('OUT1', 0, 1, 0.01)):
+    #      setpoints  # (OUT2 voltage, OUT1 voltage)
+    kind = None
+
+    def __iter__(self):
+        return iter(())
+
+    def __len__(self):
+        return 0
+
+    @property
+    def targets(self):
+        return []
+
+    def reverse(self):
+        # The plan generating the same steps in reverse order
+        return self
+
+    def to_dict(self):
+        return {"type": self.kind}
+
+
+class AxisPlan(SweepPlan):
+    # Plan of one quantity of one channel, the values are generated by value(index)
+
+    def __init__(self, channel, quantity="voltage"):
+        if quantity not in QUANTITIES:
+            raise ValueError("Unknown quantity " + repr(quantity) + ", expected one of " + ", ".join(QUANTITIES))
+        self.channel = channel
+        self.quantity = quantity
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield (self.value(index),)
+
+    def value(self, index):
+        return None
+
+    @property
+    def targets(self):
+        return [(self.channel, self.quantity)]
+
+    def to_dict(self):
+        return {"type": self.kind, "channel": self.channel, "quantity": self.quantity}
+
+
+class LinearPlan(AxisPlan):
+    # From start to stop in steps of step, stop included if it lies on the grid; stop below start
+    # sweeps downwards
+    kind = "linear"
+
+    def __init__(self, channel, start, stop, step, quantity="voltage"):
+        super(LinearPlan, self).__init__(channel, quantity)
+        if step == 0:
+            raise ValueError("Step of a linear plan must not be 0")
+        self.start = start
+        self.stop = stop
+        self.step = abs(step) if stop >= start else -abs(step)
+
+    def __len__(self):
+        return int(math.floor((self.stop - self.start) / self.step + 1e-9)) + 1
+
+    def value(self, index):
+        # Adding 0.0 turns the -0.0 of values rounded to zero into 0.0
+        return round(self.start + index * self.step, 6) + 0.0
+
+    def reverse(self):
+        return LinearPlan(self.channel, self.value(len(self) - 1), self.start, self.step, self.quantity)
+
+    def to_dict(self):
+        result = super(LinearPlan, self).to_dict()
+        result.update(start=self.start, stop=self.stop, step=abs(self.step))
+        return result
+
+
+class LogPlan(AxisPlan):
+    # points values from start to stop, both included, spaced evenly on a logarithmic scale
+    kind = "log"
+
+    def __init__(self, channel, start, stop, points, quantity="voltage"):
+        super(LogPlan, self).__init__(channel, quantity)
+        if start * stop <= 0:
+            raise ValueError("Start and stop of a logarithmic plan must be non-zero and of the same sign")
+        if points < 1:
+            raise ValueError("Logarithmic plan needs at least one point")
+        self.start = start
+        self.stop = stop
+        self.points = int(points)
+
+    def __len__(self):
+        return self.points
+
+    def value(self, index):
+        if self.points == 1:
+            return self.start
+        return round(self.start * (self.stop / self.start) ** (index / (self.points - 1)), 6)
+
+    def reverse(self):
+        return LogPlan(self.channel, self.stop, self.start, self.points, self.quantity)
+
+    def to_dict(self):
+        result = super(LogPlan, self).to_dict()
+        result.update(start=self.start, stop=self.stop, points=self.points)
+        return result
+
+
+class ListPlan(AxisPlan):
+    # The given values in the given order
+    kind = "list"
+
+    def __init__(self, channel, values, quantity="voltage"):
+        super(ListPlan, self).__init__(channel, quantity)
+        self.values = list(values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def value(self, index):
+        return self.values[index]
+
+    def reverse(self):
+        return ListPlan(self.channel, self.values[::-1], self.quantity)
+
+    def to_dict(self):
+        result = super(ListPlan, self).to_dict()
+        result.update(values=self.values)
+        return result
+
+
+class ProductPlan(SweepPlan):
+    # Nested loops over the plans, the first one outermost: every step of a plan runs all steps of
+    # the plans after it. The inner plans are iterated again for each outer step instead of being stored
+    kind = "product"
+
+    def __init__(self, *plans):
+        if not plans:
+            raise ValueError("Product plan needs at least one plan")
+        self.plans = list(plans)
+
+    def __iter__(self):
+        return self.nest(0)
+
+    def nest(self, level):
+        if level == len(self.plans):
+            yield ()
+            return
+        for outer in self.plans[level]:
+            for inner in self.nest(level + 1):
+                yield outer + inner
+
+    def __len__(self):
+        count = 1
+        for plan in self.plans:
+            count *= len(plan)
+        return count
+
+    @property
+    def targets(self):
+        return [target for plan in self.plans for target in plan.targets]
+
+    def reverse(self):
+        return ProductPlan(*[plan.reverse() for plan in self.plans])
+
+    def to_dict(self):
+        return {"type": self.kind, "plans": [plan.to_dict() for plan in self.plans]}
+
+
+class BidirectionalPlan(SweepPlan):
+    # The plan forwards and backwards again, cycles times, e.g. for hysteresis loops. The turning
+    # points are not repeated, so every step changes the setpoints
+    kind = "bidirectional"
+
+    def __init__(self, plan, cycles=1):
+        if cycles < 1:
+            raise ValueError("Bidirectional plan needs at least one cycle")
+        self.plan = plan
+        self.cycles = int(cycles)
+
+    def __iter__(self):
+        backwards = self.plan.reverse()
+        for cycle in range(self.cycles):
+            yield from itertools.islice(self.plan, 1 if cycle else 0, None)
+            yield from itertools.islice(backwards, 1, None)
+
+    def __len__(self):
+        count = len(self.plan)
+        return self.cycles * (2 * count - 2) + 1 if count else 0
+
+    @property
+    def targets(self):
+        return self.plan.targets
+
+    def to_dict(self):
+        return {"type": self.kind, "plan": self.plan.to_dict(), "cycles": self.cycles}
+
+
+def plan_from_dict(description):
+    # Plan described by a dict of to_dict, raises ValueError for invalid descriptions
+    try:
+        kind = description["type"]
+        if kind == "product":
+            return ProductPlan(*[plan_from_dict(plan) for plan in description["plans"]])
+        if kind == "bidirectional":
+            return BidirectionalPlan(plan_from_dict(description["plan"]), description.get("cycles", 1))
+        arguments = {key: value for key, value in description.items() if key != "type"}
+        return PLAN_TYPES[kind](**arguments)
+    except (KeyError, TypeError) as error:
+        raise ValueError("Invalid sweep plan description: " + str(error))
+
+
+def save_plan(plan, path):
+    with open(path, "w") as plan_file:
+        json.dump(plan.to_dict(), plan_file, indent=2)
+
+
+def load_plan(path):
+    with open(path) as plan_file:
+        try:
+            return plan_from_dict(json.load(plan_file))
+        except json.JSONDecodeError as error:
+            raise ValueError(path + " is not a sweep plan: " + str(error))
+
+
+PLAN_TYPES = {plan.kind: plan for plan in (LinearPlan, LogPlan, ListPlan, ProductPlan, BidirectionalPlan)}
@@ -0,0 +1,62 @@
+import numpy as np
+
+from powersupply_HMC804x import SNAPSHOT_FIELDS
+
+
+class RingBuffer:
+    # Fixed-size store of timestamped samples, each sample is a row of width floats. When full,
+    # the oldest samples are overwritten; count keeps growing, so readers can ask for the samples
+    # appended since a count they saw before
+
+    def __init__(self, capacity, width):
+        self.capacity = capacity
+        self.width = width
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((capacity, width), dtype=np.float64)
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, timestamp, row):
+        index = self.count % self.capacity
+        self.timestamps[index] = timestamp
+        self.values[index] = row
+        self.count += 1
+
+    def since(self, count):
+        # Copies of the timestamps and rows appended after count samples, at most the whole buffer
+        start = max(count, self.count - self.capacity)
+        indices = np.arange(start, self.count) % self.capacity
+        return self.timestamps[indices], self.values[indices]
+
+    def data(self):
+        # All stored samples, oldest first
+        return self.since(0)
+
+    def clear(self):
+        self.count = 0
+
+
+def power_supply_sampler(power_supply):
+    # Samples a row of all snapshot fields of all channels, channel after channel
+    def sample():
+        result = power_supply.snapshot()
+        if not result[0]:
+            return False, result[2]
+        return True, result.value.values.ravel()
+    return sample, power_supply.channels * len(SNAPSHOT_FIELDS)
+
+
+def multimeter_sampler(multimeter):
+    # Samples READ? with the configuration of the instrument, so the selected function is kept
+    def sample():
+        result = multimeter.read()
+        if not result[0]:
+            return False, result[2]
+        # Responses other than a number (e.g. after a function change) fail the sample instead of the poller
+        try:
+            return True, (float(result.value),)
+        except (TypeError, ValueError):
+            return False, "Not a reading: " + str(result[2]).strip()
+    return sample, 1
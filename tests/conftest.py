@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+# The modules of the application are flat files in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emulator import Emulator  # noqa: E402
+from multimeter_HMC8012 import DigitalMultimeterHMC8012  # noqa: E402
+from powersupply_HMC804x import PowerSupplyHMC804x  # noqa: E402
+
+
+@pytest.fixture
+def emulator():
+    emulator = Emulator(seed=0, low_noise=False).start()
+    yield emulator
+    emulator.stop()
+
+
+@pytest.fixture
+def power_supply(emulator):
+    power_supply = PowerSupplyHMC804x(emulator.devices["HMC8043"])
+    yield power_supply
+    power_supply.close()
+
+
+@pytest.fixture
+def multimeter(emulator):
+    multimeter = DigitalMultimeterHMC8012(emulator.devices["HMC8012"])
+    yield multimeter
+    multimeter.close()
@@ -0,0 +1,30 @@
+import pytest
+
+# The Qt application is only importable with PyQt5 and the GUI dependencies installed
+pytest.importorskip("PyQt5")
+app = pytest.importorskip("app")
+
+
+def test_device_worker_coalesces_setpoint_writes(power_supply):
+    worker = app.DeviceWorker()
+    results = []
+    for value in (1.0, 1.5, 2.0):
+        worker.submit(lambda value=value: power_supply.set_source_voltage_level_immediate_amplitude(value, "OUT1"),
+                      results.append, key=("voltage", "OUT1"))
+    worker.submit(lambda: power_supply.get_source_voltage_level_immediate_amplitude("OUT1"), results.append)
+    assert worker.setpoints == 3 and worker.elided == 2
+    # Run on this thread, the queued calls are finished before the worker stops
+    worker.calls.put([None, None, None])
+    worker.run()
+    assert len(results) == 2
+    assert results[1].value == 2.0
+    assert power_supply.metrics.commands["VOLT"].count == 1
+
+
+def test_device_worker_passes_exceptions_to_done():
+    worker = app.DeviceWorker()
+    results = []
+    worker.submit(lambda: 1 / 0, results.append)
+    worker.calls.put([None, None, None])
+    worker.run()
+    assert isinstance(results[0], ZeroDivisionError)
@@ -0,0 +1,42 @@
+import asyncio
+
+from async_driver import AsyncDigitalMultimeterHMC8012, AsyncPowerSupplyHMC804x
+
+
+def test_async_drivers_overlap_calls_to_different_instruments(emulator):
+    async def main():
+        power_supply, multimeter = await asyncio.gather(AsyncPowerSupplyHMC804x.open(emulator.devices["HMC8043"]),
+                                                        AsyncDigitalMultimeterHMC8012.open(emulator.devices["HMC8012"]))
+        try:
+            written, measured = await asyncio.gather(
+                power_supply.set_source_voltage_level_immediate_amplitude(1.5, "OUT2"),
+                multimeter.measure_voltage_dc())
+            setpoint = await power_supply.get_source_voltage_level_immediate_amplitude("OUT2")
+            return written, measured, setpoint
+        finally:
+            await asyncio.gather(power_supply.close(), multimeter.close())
+
+    written, measured, setpoint = asyncio.run(main())
+    assert written[0] is True and measured[0] is True
+    assert setpoint.value == 1.5
+
+
+def test_async_helpers_and_generators(emulator):
+    async def main():
+        power_supply = await AsyncPowerSupplyHMC804x.open(emulator.devices["HMC8043"])
+        multimeter = await AsyncDigitalMultimeterHMC8012.open(emulator.devices["HMC8012"])
+        try:
+            uploaded = await power_supply.upload_arb([(1.0, 0.1, 0.01), (2.0, 0.1, 0.01)], "OUT1")
+            batched = await power_supply.batch([lambda driver: driver.get_output_channel(),
+                                                lambda driver: driver.tst()])
+            readings = [reading async for reading in multimeter.acquire("CURR:DC", count=3)]
+            return uploaded, batched, readings
+        finally:
+            await power_supply.close()
+            await multimeter.close()
+
+    uploaded, batched, readings = asyncio.run(main())
+    assert all(result[0] is True for result in uploaded)
+    assert [result.kind for result in batched] == ["Query", "Query"]
+    assert len(readings) == 3
+    assert all(reading[0] is True and reading.unit == "A" for reading in readings)
@@ -0,0 +1,24 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_benchmark_runs_against_the_emulator(tmp_path):
+    output = tmp_path / "benchmark.json"
+    completed = subprocess.run([sys.executable, "benchmark.py", "--repeat", "2", "--points", "5", "--exclude", "tst",
+                                "--output", str(output)], cwd=ROOT, capture_output=True, text=True, timeout=600)
+    assert completed.returncode == 0, completed.stderr
+    results = json.loads(output.read_text())
+    assert results["backend"] == "emulator"
+    assert results["sweep"]["points"] == 5
+    assert "snapshot" in results["methods"]["PowerSupplyHMC804x"]
+    # Methods needing arguments are called with those of METHOD_ARGUMENTS
+    assert results["methods"]["PowerSupplyHMC804x"]["set_arb_data"]["messages_per_call"] == 1
+    assert set(results["concurrent"]) == {"sequential", "overlapped"}
+    completed = subprocess.run([sys.executable, "benchmark.py", "--repeat", "2", "--points", "5", "--exclude", "tst",
+                                "--output", str(tmp_path / "again.json"), "--compare", str(output),
+                                "--threshold", "1000"], cwd=ROOT, capture_output=True, text=True, timeout=600)
+    assert completed.returncode == 0, completed.stdout + completed.stderr
@@ -0,0 +1,47 @@
+import socket
+import time
+
+from discovery import DeviceDiscovery, DiscoveryCache, ProbeResult
+
+
+def test_discovery_bounds_probes_of_silent_resources(emulator):
+    # A resource accepting connections without ever answering *IDN?
+    silent = socket.socket()
+    silent.bind(("127.0.0.1", 0))
+    silent.listen()
+    silent_resource = "TCPIP::127.0.0.1::" + str(silent.getsockname()[1]) + "::SOCKET"
+    found = []
+    try:
+        start = time.perf_counter()
+        results = DeviceDiscovery(probe_timeout=300).run(
+            found.append, resources=[silent_resource, emulator.devices["HMC8012"]],
+            known_resources=[emulator.devices["HMC8043"]])
+        elapsed = time.perf_counter() - start
+    finally:
+        silent.close()
+    models = {result.resource: result.model for result in results}
+    assert models == {emulator.devices["HMC8043"]: "HMC8043", emulator.devices["HMC8012"]: "HMC8012",
+                      silent_resource: None}
+    assert found == results
+    # The probes run at once, the silent one only costs its timeout
+    assert elapsed < 1.5
+    assert results[-1].resource == silent_resource and results[-1].error is not None
+
+
+def test_discovery_cache_round_trip(emulator, tmp_path):
+    path = str(tmp_path / "devices.json")
+    cache = DiscoveryCache(path)
+    emulator.register(cache)
+    cache.update(ProbeResult("TCPIP::192.0.2.1::5025::SOCKET", "HMC8043", 0.01))
+    cache.update(ProbeResult("TCPIP::192.0.2.1::5025::SOCKET", None, 0.5))
+    cache.save()
+    loaded = DiscoveryCache(path)
+    assert loaded.resources == {emulator.devices["HMC8043"]: "HMC8043", emulator.devices["HMC8012"]: "HMC8012"}
+    assert loaded.devices()["HMC8012"] == emulator.devices["HMC8012"]
+
+
+def test_discovery_cache_ignores_broken_files(tmp_path):
+    path = tmp_path / "devices.json"
+    path.write_text("{not json")
+    cache = DiscoveryCache(str(path))
+    assert cache.resources == {} and cache.serial_ports == {}
@@ -0,0 +1,95 @@
+from driver import LATENCY_BUCKETS, CommandStatistics, split_responses
+from emulator import Emulator
+from multimeter_HMC8012 import DigitalMultimeterHMC8012
+
+
+def inst_messages(driver):
+    return sum(statistics.count for mnemonic, statistics in driver.metrics.commands.items()
+               if mnemonic.split(";")[0] == "INST")
+
+
+def test_channel_selection_is_cached(emulator, power_supply):
+    power_supply.set_source_voltage_level_immediate_amplitude(1.5, "OUT2")
+    power_supply.set_source_current_level_immediate_amplitude(0.2, "OUT2")
+    power_supply.get_source_voltage_level_immediate_amplitude("OUT2")
+    assert inst_messages(power_supply) == 1
+    assert power_supply.skipped_channel_selections == 2
+    assert emulator.power_supply.selected == 1
+    assert power_supply.get_source_voltage_level_immediate_amplitude("OUT2").value == 1.5
+
+
+def test_channel_cache_is_dropped_with_instrument_state(emulator, power_supply):
+    power_supply.set_output_channel("OUT3")
+    power_supply.rst()
+    assert power_supply.selected_channel is None
+    power_supply.set_output_channel("OUT3")
+    assert inst_messages(power_supply) == 2
+    assert power_supply.get_output_channel().text == "OUTP3"
+
+
+def test_batch_results_are_split_per_call(power_supply):
+    with power_supply.batch() as transaction:
+        power_supply.set_source_voltage_level_immediate_amplitude(2.0, "OUT1")
+        power_supply.get_source_voltage_level_immediate_amplitude("OUT1")
+        power_supply.set_source_current_level_immediate_amplitude(0.5, "OUT2")
+        power_supply.get_source_current_level_immediate_amplitude("OUT2")
+    kinds = [result.kind for result in transaction.results]
+    assert kinds == ["Write", "Query", "Write", "Query"]
+    assert all(result[0] is True for result in transaction.results)
+    assert transaction.results[1].value == 2.0
+    assert transaction.results[3].value == 0.5
+
+
+def test_batch_splits_long_messages(power_supply):
+    with power_supply.batch(max_message_length=40) as transaction:
+        for channel in ("OUT1", "OUT2", "OUT3"):
+            power_supply.set_source_voltage_level_immediate_amplitude(1.0, channel)
+            power_supply.get_source_voltage_level_immediate_amplitude(channel)
+    assert [result.value for result in transaction.results[1::2]] == [1.0, 1.0, 1.0]
+    assert sum(statistics.count for statistics in power_supply.metrics.commands.values()) > 2
+
+
+
+def test_batch_entries_stand_for_their_results(power_supply):
+    with power_supply.batch() as transaction:
+        entry = power_supply.get_source_voltage_level_immediate_amplitude("OUT1")
+        assert entry[0] is None and entry.value is None
+    assert entry[0] is True
+    assert entry.value == transaction.results[0].value
+    assert tuple(entry) == tuple(transaction.results[0])
+
+
+def test_responses_are_split_outside_strings_and_blocks():
+    assert split_responses('1.0;"a;b";0') == ["1.0", '"a;b"', "0"]
+    assert split_responses('"say ""x;y""";1') == ['"say ""x;y"""', "1"]
+    assert split_responses("#13a;b;2") == ["#13a;b", "2"]
+    assert split_responses("1;#0a;b") == ["1", "#0a;b"]
+
+
+def test_latency_percentiles_are_bucket_edges():
+    statistics = CommandStatistics()
+    for duration in [0.001] * 90 + [0.1] * 10:
+        statistics.record(duration, True, 10, 5)
+    statistics.record(0.001, False, 10, 0)
+    assert LATENCY_BUCKETS[0] < 0.001 <= statistics.percentile(0.5) < 0.0015
+    assert 0.1 <= statistics.percentile(0.99) < 0.15
+    assert statistics.count == 101 and statistics.failures == 1
+    assert CommandStatistics().percentile(0.5) is None
+
+
+def test_metrics_record_the_latency_of_slow_commands():
+    emulator = Emulator(seed=0, low_noise=False, command_latency={"MEAS:CURR:DC": 0.02}).start()
+    try:
+        multimeter = DigitalMultimeterHMC8012(emulator.devices["HMC8012"])
+        for _ in range(5):
+            multimeter.measure_current_dc()
+        multimeter.get_adc_rate()
+        rows = {row["mnemonic"]: row for row in multimeter.metrics.summary()}
+        multimeter.close()
+    finally:
+        emulator.stop()
+    assert rows["MEAS:CURR:DC?"]["count"] == 5
+    assert rows["MEAS:CURR:DC?"]["p50"] >= 0.02
+    assert rows["SENS:ADCR?"]["p99"] < 0.02
+    assert rows["MEAS:CURR:DC?"]["error_rate"] == 0
+    assert rows["SENS:ADCR?"]["bytes_read"] > 0
@@ -0,0 +1,43 @@
+import time
+
+import numpy as np
+
+from multimeter_HMC8012 import parse_data_log
+
+
+def test_parse_data_log_takes_the_last_number_of_each_line():
+    data = b"Data log\r\nDate;Value\r\n0;1.5E-03\r\n1;-2.25E-03 A\r\n2;3\r\n"
+    readings = parse_data_log(data)
+    assert readings.dtype == np.float64
+    assert list(readings) == [1.5e-3, -2.25e-3, 3.0]
+
+
+def test_parse_data_log_of_empty_log():
+    assert len(parse_data_log("")) == 0
+
+
+def test_data_log_download(multimeter):
+    results = multimeter.start_data_log(interval=0.1, count=3)
+    assert all(result[0] is True for result in results)
+    time.sleep(0.45)
+    result = multimeter.download_data_log()
+    assert result[0] is True
+    assert isinstance(result.value, np.ndarray)
+    assert len(result.value) == 3
+
+
+def test_acquire_configures_once(multimeter):
+    readings = list(multimeter.acquire('CURR:DC', adc_rate='FAST', count=5))
+    assert len(readings) == 5
+    assert all(reading[0] is True and reading.unit == "A" for reading in readings)
+    counts = {mnemonic: statistics.count for mnemonic, statistics in multimeter.metrics.commands.items()}
+    assert counts["CONF:CURR:DC;:SENS:ADCR"] == 1
+    assert counts["READ?"] == 5
+    assert multimeter.get_adc_rate().text.strip() == "FAST"
+
+
+def test_acquire_of_a_configured_multimeter_only_reads(multimeter):
+    multimeter.configure('CURR:DC')
+    multimeter.metrics.reset()
+    assert len(list(multimeter.acquire('CURR:DC', count=2, configured=True))) == 2
+    assert set(multimeter.metrics.commands) == {"READ?"}
@@ -0,0 +1,56 @@
+import pytest
+
+from powersupply_HMC804x import SNAPSHOT_FIELDS
+
+
+def test_snapshot_parses_all_channels(power_supply):
+    power_supply.set_source_voltage_level_immediate_amplitude(1.25, "OUT1")
+    power_supply.set_source_current_level_immediate_amplitude(0.3, "OUT3")
+    power_supply.set_output_channel_state(1, "OUT3")
+    power_supply.set_output_channel("OUT2")
+    result = power_supply.snapshot()
+    assert result[0] is True
+    snapshot = result.value
+    assert snapshot.values.shape == (power_supply.channels, len(SNAPSHOT_FIELDS))
+    assert snapshot.field("voltage")[0] == 1.25
+    assert snapshot.channel(3)["current"] == 0.3
+    assert list(snapshot.field("output")) == [0, 0, 1]
+    assert snapshot.master is False
+    # The channel selected before the snapshot is selected again
+    assert power_supply.get_output_channel().text == "OUTP2"
+
+
+def test_arb_table_round_trip(power_supply):
+    points = [(1.0, 0.1, 0.5), (2.5, 0.2, 1.0, 1), (0.0, 0.1, 0.01)]
+    results = power_supply.upload_arb(points, "OUT2", repetitions=3)
+    assert all(result[0] is True for result in results)
+    values = [float(value) for value in power_supply.get_arb_data().text.split(",")]
+    assert values == [1.0, 0.1, 0.5, 0.0, 2.5, 0.2, 1.0, 1.0, 0.0, 0.1, 0.01, 0.0]
+    assert power_supply.get_arb_repetitions().value == 3
+
+
+@pytest.mark.parametrize("points", [[(1.0, 0.1, 0.001)], [(1.0, 0.1, 61)], []])
+def test_arb_table_out_of_range_is_not_sent(power_supply, points):
+    result = power_supply.set_arb_data(points)
+    assert result[0] is False
+    assert "ARB:DATA" not in power_supply.metrics.commands
+
+
+def test_protection_trips_are_reported_once(power_supply):
+    assert power_supply.enable_protection_events()[0] is True
+    assert power_supply.protection_events().value == []
+    with power_supply.batch():
+        power_supply.set_source_voltage_protection_mode("PROT", "OUT2")
+        power_supply.set_source_voltage_protection_level(2.0, "OUT2")
+        power_supply.set_source_voltage_protection_state(1, "OUT2")
+        power_supply.set_source_voltage_level_immediate_amplitude(3.0, "OUT2")
+        power_supply.set_output_channel_state(1, "OUT2")
+        power_supply.set_output_master_state(1, "OUT2")
+    assert power_supply.protection_events().value == [("OUT2", "ovp")]
+    # The event registers are cleared by reading them, the trip itself stays until it is cleared
+    assert power_supply.protection_events().value == []
+    assert power_supply.source_voltage_protection_trip("OUT2").value == 1
+
+
+def test_raw_sockets_have_no_service_requests(power_supply):
+    assert power_supply.enable_service_requests() is False
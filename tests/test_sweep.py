@@ -0,0 +1,92 @@
+from sweep import AdaptiveSweep, CsvRecorder, MultiChannelSweepEngine, Settling, SweepEngine, SweepPoint
+from sweep_plan import LinearPlan, ListPlan, ProductPlan
+
+
+def test_sweep_engine_measures_every_setpoint(power_supply, multimeter):
+    engine = SweepEngine(power_supply, multimeter, "OUT1", [0.5, 0.6, 0.7], 0.06)
+    points = []
+    engine.subscribe(points.append)
+    assert engine.run() is True
+    assert [point.setpoint for point in points] == [0.5, 0.6, 0.7]
+    assert points[0].reading < points[-1].reading
+    assert power_supply.get_output_master_state().value == 0
+
+
+def test_multi_channel_engine_runs_a_nested_plan(power_supply, multimeter, tmp_path):
+    plan = ProductPlan(ListPlan("OUT2", [1.0, 2.0]), LinearPlan("OUT1", 0.5, 0.7, 0.1))
+    engine = MultiChannelSweepEngine(power_supply, [("OUT1", multimeter), ("OUT2", None, "voltage")], plan, 0.06)
+    points = []
+    engine.subscribe(points.append)
+    path = tmp_path / "OUT1.csv"
+    engine.subscribe(CsvRecorder(str(path), "OUT1"))
+    assert engine.run() is True, engine.error
+    assert len(points) == 2 * len(plan)
+    first = [point for point in points if point.channel == "OUT1"]
+    assert [point.setpoints for point in first] == list(plan)
+    assert [point.setpoint for point in first] == [0.5, 0.6, 0.7] * 2
+    second = [point for point in points if point.channel == "OUT2"]
+    assert [point.setpoint for point in second] == [1.0] * 3 + [2.0] * 3
+    assert all(0 < point.reading <= point.setpoint + 1e-3 for point in second)
+    rows = path.read_text().splitlines()
+    assert len(rows) == len(plan)
+    assert rows[0].split(";")[:2] == ["1.0", "0.5"]
+    assert power_supply.get_output_master_state().value == 0
+
+
+def test_multi_channel_engine_cancel(power_supply, multimeter):
+    engine = MultiChannelSweepEngine(power_supply, [("OUT1", multimeter), ("OUT2", None)], [0.5] * 100, 0.05)
+    engine.subscribe(lambda point: engine.cancel())
+    assert engine.run() is False
+    assert engine.error is None
+
+
+def test_settling_criterion():
+    settling = Settling(count=3, relative=1e-2, absolute=1e-6)
+    assert settling.settled([1.0, 1.005, 0.999]) is True
+    assert settling.settled([1.0, 1.1, 1.0]) is False
+    assert settling.settled([1.0, 1.0]) is False
+    assert settling.settled([0.0, 5e-7, 0.0]) is True
+
+
+def test_sweep_engine_reads_until_settled(power_supply, multimeter):
+    engine = SweepEngine(power_supply, multimeter, "OUT1", [0.5, 1.0, 1.5], 0,
+                         settling=Settling(3, 1e-2, 1e-6, 2.0))
+    points = []
+    engine.subscribe(points.append)
+    assert engine.run() is True, engine.error
+    assert all(point.settled and point.settle_time < 2.0 for point in points)
+    assert multimeter.metrics.commands["READ?"].count >= 3 * len(points)
+
+
+def test_sweep_engine_settling_times_out(power_supply, multimeter):
+    # A negative tolerance is never met
+    engine = SweepEngine(power_supply, multimeter, "OUT1", [0.5, 1.0], 0, settling=Settling(3, 0, -1, 0.05))
+    points = []
+    engine.subscribe(points.append)
+    assert engine.run() is True, engine.error
+    assert len(points) == 2
+    assert all(not point.settled and point.settle_time >= 0.05 for point in points)
+
+
+def test_adaptive_sweep_keeps_straight_lines_coarse():
+    plan = AdaptiveSweep(0.0, 1.0, 0.25, resolution=0.01, max_change=0.3)
+    for index, setpoint in enumerate(plan):
+        plan(SweepPoint(index, setpoint, 2 * setpoint, 0.0, channel="OUT1"))
+        # Points of other channels of a multi-channel sweep are not followed
+        plan(SweepPoint(index, setpoint, setpoint ** 3, 0.0, channel="OUT2"))
+    assert plan.setpoints == [0.0, 0.25, 0.5, 0.75, 1.0]
+
+
+def test_sweep_engine_refines_the_knee(power_supply, multimeter):
+    plan = AdaptiveSweep(0.0, 2.0, 0.5, resolution=0.01, max_points=20)
+    engine = SweepEngine(power_supply, multimeter, "OUT1", plan, 0.02)
+    points = []
+    engine.subscribe(points.append)
+    assert engine.run() is True, engine.error
+    setpoints = [point.setpoint for point in points]
+    assert setpoints[:5] == [0.0, 0.5, 1.0, 1.5, 2.0]
+    assert len(setpoints) == 20 and len(set(setpoints)) == 20
+    assert all(abs(setpoint * 100 - round(setpoint * 100)) < 1e-6 for setpoint in setpoints)
+    # The current rises from zero to the current limit between 0.5 V and 1 V, most refinements go there
+    refined = setpoints[5:]
+    assert sum(0.5 < setpoint < 1.0 for setpoint in refined) > len(refined) / 2
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from sweep_plan import (BidirectionalPlan, LinearPlan, ListPlan, LogPlan, ProductPlan, load_plan, plan_from_dict,
+                        save_plan)
+
+
+def test_linear_plan_includes_stop_and_sweeps_down():
+    assert list(LinearPlan("OUT1", 0, 0.3, 0.1)) == [(0.0,), (0.1,), (0.2,), (0.3,)]
+    assert list(LinearPlan("OUT1", 1, 0, 0.5)) == [(1.0,), (0.5,), (0.0,)]
+
+
+def test_log_plan_spacing():
+    assert list(LogPlan("OUT1", 0.001, 1, 4)) == [(0.001,), (0.01,), (0.1,), (1.0,)]
+
+
+def test_product_plan_nests_the_later_plans():
+    plan = ProductPlan(ListPlan("OUT2", [1, 2]), LinearPlan("OUT1", 0, 0.1, 0.1, "current"))
+    assert plan.targets == [("OUT2", "voltage"), ("OUT1", "current")]
+    assert list(plan) == [(1, 0.0), (1, 0.1), (2, 0.0), (2, 0.1)]
+    assert len(plan) == 4
+
+
+def test_bidirectional_plan_does_not_repeat_turning_points():
+    plan = BidirectionalPlan(LinearPlan("OUT1", 0, 0.2, 0.1), cycles=2)
+    assert [setpoints[0] for setpoints in plan] == [0.0, 0.1, 0.2, 0.1, 0.0, 0.1, 0.2, 0.1, 0.0]
+    assert len(plan) == len(list(plan))
+
+
+def test_product_plan_is_generated_lazily():
+    axis = LinearPlan("OUT1", 0, 10, 0.001)
+    steps = iter(ProductPlan(axis, axis, axis))
+    assert next(steps) == (0.0, 0.0, 0.0)
+    assert next(steps) == (0.0, 0.0, 0.001)
+
+
+@pytest.mark.parametrize("plan", [
+    LinearPlan("OUT1", 0, 1, 0.25),
+    LogPlan("OUT2", 0.01, 1, 3, "current"),
+    ListPlan("OUT3", [0.5, 0.1, 0.9]),
+    BidirectionalPlan(ProductPlan(ListPlan("OUT2", [1, 2]), LinearPlan("OUT1", 0, 0.3, 0.1)), cycles=2),
+])
+def test_plan_serialization_round_trip(plan, tmp_path):
+    description = json.loads(json.dumps(plan.to_dict()))
+    assert plan_from_dict(description).to_dict() == plan.to_dict()
+    path = str(tmp_path / "plan.json")
+    save_plan(plan, path)
+    loaded = load_plan(path)
+    assert list(loaded) == list(plan)
+    assert loaded.targets == plan.targets
+
+
+@pytest.mark.parametrize("description", [{"type": "nope"}, {"type": "linear", "channel": "OUT1"}, {}])
+def test_invalid_plan_description(description):
+    with pytest.raises(ValueError):
+        plan_from_dict(description)
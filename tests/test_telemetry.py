@@ -0,0 +1,49 @@
+import numpy as np
+
+from driver import InstrumentResult
+from powersupply_HMC804x import SNAPSHOT_COLUMNS, SNAPSHOT_FIELDS
+from telemetry import RingBuffer, multimeter_sampler, power_supply_sampler
+
+
+def test_ring_buffer_overwrites_the_oldest_samples():
+    buffer = RingBuffer(4, 2)
+    for index in range(6):
+        buffer.append(float(index), (index, -index))
+    assert len(buffer) == 4 and buffer.count == 6
+    timestamps, values = buffer.data()
+    assert list(timestamps) == [2.0, 3.0, 4.0, 5.0]
+    assert values[:, 1].tolist() == [-2.0, -3.0, -4.0, -5.0]
+    timestamps, values = buffer.since(4)
+    assert list(timestamps) == [4.0, 5.0]
+    # Samples overwritten since the count seen are lost, the rest is returned
+    assert list(buffer.since(1)[0]) == [2.0, 3.0, 4.0, 5.0]
+    buffer.clear()
+    assert len(buffer) == 0 and len(buffer.data()[0]) == 0
+
+
+def test_power_supply_sampler_rows(power_supply):
+    power_supply.set_source_voltage_level_immediate_amplitude(2.5, "OUT2")
+    sample, width = power_supply_sampler(power_supply)
+    assert width == power_supply.channels * len(SNAPSHOT_FIELDS)
+    success, row = sample()
+    assert success is True
+    buffer = RingBuffer(8, width)
+    buffer.append(0.0, row)
+    values = buffer.data()[1].reshape(power_supply.channels, len(SNAPSHOT_FIELDS))
+    assert values[1, SNAPSHOT_COLUMNS["voltage"]] == 2.5
+
+
+def test_multimeter_sampler(multimeter):
+    sample, width = multimeter_sampler(multimeter)
+    success, row = sample()
+    assert success is True and width == len(row) == 1
+    assert np.isfinite(row[0])
+
+
+def test_multimeter_sampler_fails_on_non_numeric_readings():
+    class Multimeter:
+        def read(self):
+            return InstrumentResult(True, "Query", "OVERLOAD\n")
+
+    sample, width = multimeter_sampler(Multimeter())
+    assert sample() == (False, "Not a reading: OVERLOAD")
@@ -0,0 +1,37 @@
+from driver import InstrumentDriver
+from powersupply_HMC804x import PowerSupplyHMC804x
+from traffic import ReplayResourceManager, TrafficLog, capture, command_stream, diff_logs, round_trips
+
+
+def session(address):
+    power_supply = PowerSupplyHMC804x(address)
+    try:
+        power_supply.set_source_voltage_level_immediate_amplitude(1.5, "OUT2")
+        return power_supply.idn, power_supply.get_source_voltage_level_immediate_amplitude("OUT2").value
+    finally:
+        power_supply.close()
+
+
+def test_captured_traffic_replays_without_instrument(emulator, tmp_path):
+    path = str(tmp_path / "session.trc")
+    address = emulator.devices["HMC8043"]
+    log = TrafficLog(path)
+    capture(log)
+    try:
+        recorded = session(address)
+    finally:
+        capture(None)
+        log.close()
+    assert recorded == ("HMC8043", 1.5)
+    assert command_stream(path)[0] == address + ": *IDN?"
+    messages, responses = round_trips(path)[address]
+    assert messages >= 3 and responses == 2
+
+    emulator.stop()
+    InstrumentDriver.resource_manager = ReplayResourceManager(path)
+    try:
+        assert session(address) == recorded
+        assert InstrumentDriver.resource_manager.mismatches == []
+    finally:
+        InstrumentDriver.resource_manager = None
+    assert list(diff_logs(path, path)) == []
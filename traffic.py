@@ -0,0 +1,339 @@
+import argparse
+import difflib
+import struct
+import threading
+import time
+
+import pyvisa
+
+from driver import InstrumentDriver
+from powersupply_lowNoise import PowerSupplyLowNoise
+
+MAGIC = b"SCPITRC1"
+
+# Record header: kind, channel, nanoseconds since the session start, payload length
+RECORD = struct.Struct("<BHqI")
+
+SESSION = 0
+CHANNEL = 1
+WRITE = 2
+READ = 3
+WRITE_ERROR = 4
+READ_ERROR = 5
+
+KIND_NAMES = {SESSION: "session", CHANNEL: "channel", WRITE: "write", READ: "read", WRITE_ERROR: "write error",
+              READ_ERROR: "read error"}
+
+
+def message_bytes(message):
+    # Sent message without the write termination, as it is stored in the log
+    if isinstance(message, str):
+        message = message.encode()
+    return message.rstrip(b"\n")
+
+
+class TrafficLog:
+    # Append-only binary log of the messages exchanged with instruments. Every opening starts a
+    # new session, each instrument address gets a channel number announced by a CHANNEL record.
+    # Records are flushed as they are written, so the log survives a crash of the application
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.channels = {}
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.started = time.monotonic_ns()
+        self.record(0, SESSION, str(time.time()).encode())
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+    def record(self, channel, kind, payload):
+        with self.lock:
+            self.file.write(RECORD.pack(kind, channel, time.monotonic_ns() - self.started, len(payload)) + payload)
+            self.file.flush()
+
+    def channel(self, address):
+        with self.lock:
+            channel = self.channels.get(address)
+            if channel is not None:
+                return channel
+            channel = self.channels[address] = len(self.channels)
+        self.record(channel, CHANNEL, address.encode())
+        return channel
+
+    def wrap(self, resource, address):
+        # Returns the resource (PyVISA session or serial port) recording into this log
+        return RecordingResource(resource, self, self.channel(address))
+
+
+class RecordingResource:
+    # Forwards to a PyVISA session or serial port and records every sent message and response
+    __slots__ = ("resource", "log", "channel")
+
+    def __init__(self, resource, log, channel):
+        object.__setattr__(self, "resource", resource)
+        object.__setattr__(self, "log", log)
+        object.__setattr__(self, "channel", channel)
+
+    def __getattr__(self, name):
+        return getattr(self.resource, name)
+
+    def __setattr__(self, name, value):
+        if name in RecordingResource.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.resource, name, value)
+
+    def send(self, send, message):
+        self.log.record(self.channel, WRITE, message_bytes(message))
+        try:
+            return send(message)
+        except pyvisa.VisaIOError as error:
+            self.log.record(self.channel, WRITE_ERROR, str(error).encode())
+            raise
+
+    def write(self, message):
+        return self.send(self.resource.write, message)
+
+    def write_raw(self, message):
+        return self.send(self.resource.write_raw, message)
+
+    def receive(self, read, *args, **kwargs):
+        try:
+            response = read(*args, **kwargs)
+        except pyvisa.VisaIOError as error:
+            self.log.record(self.channel, READ_ERROR, str(error).encode())
+            raise
+        self.log.record(self.channel, READ, response.encode() if isinstance(response, str) else bytes(response))
+        return response
+
+    def read(self):
+        return self.receive(self.resource.read)
+
+    def read_binary_values(self, **kwargs):
+        # Recorded as the bytes of the block, so only byte containers (datatype 's') can be replayed
+        return self.receive(self.resource.read_binary_values, **kwargs)
+
+    def query(self, message):
+        self.write(message)
+        return self.read()
+
+
+class TrafficRecord:
+    __slots__ = ("session", "address", "kind", "timestamp", "payload")
+
+    def __init__(self, session, address, kind, timestamp, payload):
+        self.session = session
+        self.address = address
+        self.kind = kind
+        self.timestamp = timestamp
+        self.payload = payload
+
+    def __repr__(self):
+        return (str(self.session) + " " + format(self.timestamp / 1e9, ".6f") + " " + self.address + " " +
+                KIND_NAMES[self.kind] + " " + repr(self.payload))
+
+
+def read_log(path):
+    # Yields the records of a traffic log, sessions are numbered from 0
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(path + " is not a traffic log")
+        session = -1
+        channels = {}
+        while True:
+            header = file.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            kind, channel, timestamp, length = RECORD.unpack(header)
+            payload = file.read(length)
+            if len(payload) < length:
+                return
+            if kind == SESSION:
+                session += 1
+                channels = {}
+            elif kind == CHANNEL:
+                channels[channel] = payload.decode()
+            else:
+                yield TrafficRecord(session, channels.get(channel, ""), kind, timestamp, payload)
+
+
+def session_records(path, session=-1):
+    # Records of one session of the log, the last one by default
+    records = list(read_log(path))
+    if not records:
+        return []
+    sessions = sorted({record.session for record in records})
+    selected = sessions[session]
+    return [record for record in records if record.session == selected]
+
+
+def capture(log):
+    # Captures the traffic of all drivers opened from now on into log, None stops the capture
+    InstrumentDriver.traffic_log = log
+    PowerSupplyLowNoise.traffic_log = log
+
+
+class ReplayResource:
+    # Plays back the recorded responses of one instrument. Sent messages are matched with the
+    # recording in order; a message sent in a different order is answered with the response
+    # recorded for the same message and noted in the mismatches of the resource manager
+
+    def __init__(self, manager, address, records):
+        self.manager = manager
+        self.address = address
+        self.records = records
+        self.position = 0
+        self.pending = None
+        self.write_termination = "\n"
+        self.read_termination = None
+        self.timeout = None
+
+    def wait(self, record):
+        # Keeps the original timing when replaying at a finite speed
+        if self.manager.speed is None:
+            return
+        delay = self.manager.started + record.timestamp / 1e9 / self.manager.speed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def next_write(self, message):
+        for position in range(self.position, len(self.records)):
+            record = self.records[position]
+            if record.kind == WRITE:
+                if record.payload == message:
+                    self.position = position + 1
+                    return record
+                break
+        self.manager.mismatches.append((self.address, self.position, message))
+        return None
+
+    def write(self, message):
+        message = message_bytes(message)
+        record = self.next_write(message)
+        if record is not None:
+            self.wait(record)
+            if self.position < len(self.records) and self.records[self.position].kind == WRITE_ERROR:
+                self.position += 1
+                raise pyvisa.VisaIOError(pyvisa.constants.StatusCode.error_io)
+        self.pending = message, record is not None
+
+    def write_raw(self, message):
+        self.write(message)
+
+    def read(self):
+        return self.read_binary_values().decode()
+
+    def read_binary_values(self, **kwargs):
+        message, in_order = self.pending or (b"", False)
+        self.pending = None
+        if in_order and self.position < len(self.records) and self.records[self.position].kind in (READ, READ_ERROR):
+            record = self.records[self.position]
+            self.position += 1
+            self.wait(record)
+            if record.kind == READ_ERROR:
+                raise pyvisa.VisaIOError(pyvisa.constants.StatusCode.error_timeout)
+            return record.payload
+        response = self.manager.responses.get((self.address, message))
+        if response is None:
+            raise pyvisa.VisaIOError(pyvisa.constants.StatusCode.error_timeout)
+        return response
+
+    def query(self, message):
+        self.write(message)
+        return self.read()
+
+    def close(self):
+        pass
+
+
+class ReplayResourceManager:
+    # Resource manager answering drivers from a traffic log instead of instruments, e.g.:
+    #  InstrumentDriver.resource_manager = ReplayResourceManager("sweep.trc", speed=None)
+    #  power_supply = PowerSupplyHMC804x("TCPIP::192.168.0.2::5025::SOCKET")
+    #  ... run the sweep ...
+    #  InstrumentDriver.resource_manager.mismatches -> messages the recording does not contain
+    #  speed: 1 replays with the original timing, None as fast as possible
+
+    def __init__(self, path, session=-1, speed=None):
+        self.speed = speed
+        self.started = time.monotonic()
+        self.mismatches = []
+        self.streams = {}
+        self.responses = {}
+        last_message = {}
+        for record in session_records(path, session):
+            self.streams.setdefault(record.address, []).append(record)
+            if record.kind == WRITE:
+                last_message[record.address] = record.payload
+            elif record.kind == READ and record.address in last_message:
+                self.responses.setdefault((record.address, last_message[record.address]), record.payload)
+
+    def open_resource(self, address, **kwargs):
+        if address not in self.streams:
+            raise pyvisa.VisaIOError(pyvisa.constants.StatusCode.error_resource_not_found)
+        return ReplayResource(self, address, self.streams[address])
+
+    def list_resources(self, query="?*::INSTR"):
+        return tuple(self.streams)
+
+    def close(self):
+        pass
+
+
+def command_stream(path, session=-1):
+    # Sent messages of a session as "address: message" lines, the form compared by diff_logs
+    return [record.address + ": " + record.payload.decode("ascii", "replace")
+            for record in session_records(path, session) if record.kind == WRITE]
+
+
+def diff_logs(old_path, new_path, session=-1):
+    old = command_stream(old_path, session)
+    new = command_stream(new_path, session)
+    return difflib.unified_diff(old, new, old_path, new_path, lineterm="")
+
+
+def round_trips(path, session=-1):
+    # Number of sent messages and of responses per address
+    counts = {}
+    for record in session_records(path, session):
+        messages, responses = counts.get(record.address, (0, 0))
+        if record.kind == WRITE:
+            messages += 1
+        elif record.kind == READ:
+            responses += 1
+        counts[record.address] = messages, responses
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shows and compares SCPI traffic logs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    dump = commands.add_parser("dump", help="print the records of a log")
+    dump.add_argument("log")
+    diff = commands.add_parser("diff", help="compare the command streams of two logs")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    diff.add_argument("--session", type=int, default=-1, help="session of both logs, the last one by default")
+    options = parser.parse_args()
+
+    if options.command == "dump":
+        for record in read_log(options.log):
+            print(record)
+    else:
+        differences = list(diff_logs(options.old, options.new, options.session))
+        for line in differences:
+            print(line)
+        for name, path in (("old", options.old), ("new", options.new)):
+            for address, (messages, responses) in round_trips(path, options.session).items():
+                print(name + " " + address + ": " + str(messages) + " messages, " + str(responses) + " responses")
+        if differences:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()